@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash
-from flask_socketio import SocketIO
+from flask.json.provider import DefaultJSONProvider
+from flask_socketio import SocketIO, join_room
 from werkzeug.utils import secure_filename
 import os
 from datetime import datetime, timedelta
@@ -8,12 +9,26 @@ import uuid
 import json
 from xml_downloader_module import get_xml_downloader_instance
 from admin_auth import AdminAuth
-from product_manager import ProductManager
+from product_manager import ProductManager, slugify
+from product_store import products_file_path, load_products
+from product_record import ProductRecord
 from payment_manager import PaymentManager
 from backup_manager import BackupManager
+from xml_refresh import XmlRefreshJobs
+from price_update import PriceUpdateJobs
+
+class ProductJSONProvider(DefaultJSONProvider):
+    """Serializacja JSON rozszerzona o rekordy produktów (ProductRecord)"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ProductRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ProductJSONProvider(app)
 app.secret_key = 'sklep-internetowy-staly-klucz-sesji'  # Stały klucz sesji
 socketio = SocketIO(app, cors_allowed_origins="*", engineio_logger=True, socketio_logger=True)
 
@@ -32,6 +47,18 @@ product_manager = ProductManager()
 # Inicjalizacja menedżera płatności
 payment_manager = PaymentManager()
 
+# Odświeżanie produktów z XML w tle (postęp przez Socket.IO)
+# Postęp zadań w tle trafia tylko do zalogowanych administratorów (pokój ADMIN_ROOM)
+ADMIN_ROOM = 'admin'
+
+def emit_to_admins(event, data):
+    socketio.emit(event, data, to=ADMIN_ROOM)
+
+xml_refresh_jobs = XmlRefreshJobs(xml_downloader, product_manager, emit=emit_to_admins)
+price_update_jobs = PriceUpdateJobs(product_manager, emit=emit_to_admins)
+# Pobrany z harmonogramu plik XML parsuje ten sam proces (inne workery wczytują zapisane zmiany)
+xml_downloader.refresh_task = lambda: xml_refresh_jobs.start(requested_by='harmonogram')
+
 # Funkcja do wyróżnienia wyszukiwanego tekstu
 def highlight_text(text, query):
     """
@@ -89,17 +116,16 @@ backup_manager.start()  # Uruchom automatyczne tworzenie kopii zapasowych
 
 # Sprawdzenie integralności bazy danych produktów
 def check_products_db_integrity():
-    db_path = os.path.join('data', 'products.json')
+    db_path = products_file_path()
     if not os.path.exists(db_path):
         app.logger.warning(f"Plik bazy danych produktów nie istnieje: {db_path}")
         return False
         
     try:
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
-            available_count = sum(1 for p in products if p.get('available_for_sale'))
-            app.logger.info(f"Baza danych produktów zawiera {len(products)} produktów, w tym {available_count} dostępnych do sprzedaży")
-            return True
+        products = load_products(db_path)
+        available_count = sum(1 for p in products if p.get('available_for_sale'))
+        app.logger.info(f"Baza danych produktów zawiera {len(products)} produktów, w tym {available_count} dostępnych do sprzedaży")
+        return True
     except Exception as e:
         app.logger.error(f"Błąd podczas sprawdzania bazy danych produktów: {str(e)}")
         return False
@@ -147,6 +173,31 @@ def slugify_filter(text):
     """Convert text to slug format for use in URLs"""
     return slugify(text)
 
+# Opis produktu wczytywany na żądanie (rekordy produktów nie zawierają długich opisów)
+@app.template_filter('product_description')
+def product_description_filter(product):
+    """Return the product's HTML description"""
+    return product_manager.get_product_description(product)
+
+# Krótki fragment opisu zapisany w rekordzie - na listach produktów zamiast pełnego opisu
+@app.template_filter('product_description_snippet')
+def product_description_snippet_filter(product):
+    """Return a short plain-text snippet of the product's description"""
+    return product_manager.get_product_description_snippet(product)
+
+# Pełny opis jednego produktu - wczytywany przez panel dopiero przy otwarciu okna edycji
+@app.route('/admin/product-description/<product_id>', methods=['GET'])
+@admin_auth.login_required
+def admin_product_description(product_id):
+    product = product_manager.get_product_by_id(product_id)
+    if not product:
+        return jsonify({'success': False, 'message': 'Nie znaleziono produktu'}), 404
+    return jsonify({
+        'success': True,
+        'product_id': product['id'],
+        'description': product_manager.get_product_description(product)
+    })
+
 @app.route('/admin/products-xml', methods=['GET'])
 @admin_auth.login_required
 def admin_products_xml():
@@ -207,13 +258,20 @@ def add_products_from_list():
     list_id = int(data.get('list_id'))
     
     # Dodaj produkty z listy
-    products = product_manager.add_products_from_list(list_id)
-    
-    if products is not None:
+    results = product_manager.add_products_from_list(list_id)
+    
+    if results is not None:
+        published_ids = [result['id'] for result in results if result['success']]
+        failed = [{'id': result['id'], 'message': result['message']} for result in results if not result['success']]
+        message = f'Dodano {len(published_ids)} produktów do sklepu'
+        if failed:
+            message += f', nie udało się dodać {len(failed)}'
         return jsonify({
             'success': True, 
-            'message': f'Dodano {len(products)} produktów do sklepu',
-            'products_count': len(products)
+            'message': message,
+            'products_count': len(published_ids),
+            'published_ids': published_ids,
+            'failed': failed
         })
     else:
         return jsonify({
@@ -221,27 +279,33 @@ def add_products_from_list():
             'message': 'Wystąpił błąd podczas dodawania produktów'
         })
 
-# Endpoint do ręcznego odświeżenia produktów z XML
-@app.route('/admin/refresh-xml', methods=['GET'])
+# Endpoint do ręcznego odświeżenia produktów z XML - uruchamia odświeżanie w tle
+@app.route('/admin/refresh-xml', methods=['POST'])
 @admin_auth.login_required
 def refresh_xml():
     try:
-        xml_file = xml_downloader.download_xml()
-        if xml_file:
-            # Parsuj XML po pobraniu
-            if product_manager.parse_xml(xml_file):
-                return jsonify({
-                    'success': True, 
-                    'message': 'Plik XML został pobrany i sparsowany pomyślnie',
-                    'products_count': len(product_manager.get_all_products())
-                })
-            else:
-                return jsonify({'success': False, 'message': 'Plik XML został pobrany, ale wystąpił błąd podczas parsowania'})
-        else:
-            return jsonify({'success': False, 'message': 'Wystąpił błąd podczas pobierania XML'})
+        job, started = xml_refresh_jobs.start(requested_by=session.get('admin_username'))
+        return jsonify({
+            'success': True,
+            'job_id': job['job_id'],
+            'started': started,
+            'status': job['status'],
+            'status_url': url_for('refresh_xml_status', job_id=job['job_id']),
+            'message': 'Odświeżanie XML zostało uruchomione' if started else 'Odświeżanie XML już trwa'
+        }), 202
     except Exception as e:
         return jsonify({'success': False, 'message': f'Błąd: {str(e)}'})
 
+# Stan zadania odświeżania XML (postęp jest też wysyłany zdarzeniem 'xml_refresh_progress')
+@app.route('/admin/refresh-xml/status', defaults={'job_id': None})
+@app.route('/admin/refresh-xml/status/<job_id>')
+@admin_auth.login_required
+def refresh_xml_status(job_id):
+    job = xml_refresh_jobs.get(job_id) if job_id else xml_refresh_jobs.current()
+    if job is None:
+        return jsonify({'success': False, 'message': 'Nie znaleziono zadania odświeżania XML'}), 404
+    return jsonify(dict(job, success=job['status'] != 'error'))
+
 @app.route('/admin/update-product', methods=['POST'])
 @admin_auth.login_required
 def update_product():
@@ -306,18 +370,6 @@ def bulk_update_products():
         app.logger.info(f"Dane żądania: {data}")
         
         product_ids = data.get('product_ids', [])
-        price_data = data.get('price', {})
-        markup_data = data.get('markup', {})
-        vat = data.get('vat')
-        delivery_time = data.get('delivery_time')
-        delivery_cost_data = data.get('delivery_cost', {})
-        
-        app.logger.info(f"Liczba produktów do aktualizacji: {len(product_ids)}")
-        app.logger.info(f"Dane ceny: {price_data}")
-        app.logger.info(f"Dane narzutu: {markup_data}")
-        app.logger.info(f"VAT: {vat}")
-        app.logger.info(f"Czas dostawy: {delivery_time}")
-        app.logger.info(f"Dane kosztu dostawy: {delivery_cost_data}")
         
         if not product_ids:
             app.logger.error("Nie wybrano produktów do aktualizacji")
@@ -326,88 +378,38 @@ def bulk_update_products():
                 'message': 'Nie wybrano produktów do aktualizacji'
             })
         
-        # Licznik pomyślnie zaktualizowanych produktów
-        updated_count = 0
+        operations = {key: data[key] for key in ProductManager.BULK_UPDATE_FIELDS if key in data}
+        app.logger.info(f"Liczba produktów do aktualizacji: {len(product_ids)}, operacje: {operations}")
         
-        # Aktualizuj każdy produkt
-        for product_id in product_ids:
-            # Pobierz aktualny produkt
-            product = product_manager.get_product_by_id(product_id)
-            if not product:
-                app.logger.warning(f"Nie znaleziono produktu o ID: {product_id}")
-                continue
-                
-            # Przygotuj dane do aktualizacji
-            update_data = {}
-            
-            # Aktualizacja narzutu
-            if markup_data and markup_data.get('operation') and markup_data.get('value') is not None:
-                current_markup = product.get('markup_percent', 0)
-                operation = markup_data.get('operation')
-                value = float(markup_data.get('value', 0))
-                
-                if operation == 'add':
-                    update_data['markup_percent'] = current_markup + value
-                elif operation == 'subtract':
-                    update_data['markup_percent'] = max(0, current_markup - value)
-                elif operation == 'set':
-                    update_data['markup_percent'] = value
-            
-            # Aktualizacja ceny
-            if price_data and price_data.get('operation') and price_data.get('value') is not None:
-                current_price = product.get('price', 0)
-                operation = price_data.get('operation')
-                value = float(price_data.get('value', 0))
-                
-                if operation == 'add':
-                    update_data['price'] = current_price + value
-                elif operation == 'subtract':
-                    update_data['price'] = max(0, current_price - value)
-                elif operation == 'percent_increase':
-                    update_data['price'] = current_price * (1 + value / 100)
-                elif operation == 'percent_decrease':
-                    update_data['price'] = current_price * (1 - value / 100)
-                elif operation == 'set':
-                    update_data['price'] = value
-            
-            # Aktualizacja VAT
-            if vat is not None:
-                update_data['vat'] = int(vat)
-                
-            # Aktualizacja czasu dostawy
-            if delivery_time:
-                update_data['delivery_time'] = delivery_time
-                
-            # Aktualizacja kosztu dostawy
-            if delivery_cost_data and delivery_cost_data.get('operation') and delivery_cost_data.get('value') is not None:
-                operation = delivery_cost_data.get('operation')
-                value = float(delivery_cost_data.get('value', 0))
-                
-                if operation == 'set':
-                    update_data['delivery_cost'] = value                # Aktualizuj produkt jeśli są jakieś dane do aktualizacji
-                if update_data:
-                    success = product_manager.update_product(
-                        product_id=product_id,
-                        price=update_data.get('price'),
-                        vat=update_data.get('vat'),
-                        delivery_time=update_data.get('delivery_time'),
-                        delivery_cost=update_data.get('delivery_cost'),
-                        markup_percent=update_data.get('markup_percent'),
-                        available_for_sale=True  # Ensure that updated products remain available
-                    )
-                    
-                    if success:
-                        updated_count += 1
+        # Wszystkie zmiany w jednym przebiegu i jednym zapisie bazy danych;
+        # zaktualizowane produkty pozostają dostępne w sklepie
+        try:
+            result = product_manager.bulk_update_products(product_ids, operations, available_for_sale=True)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            })
         
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'message': 'Wystąpił błąd podczas zapisu zmian do bazy danych'
+            })
+        
+        updated_count = len(result['changes']) + len(result['unchanged'])
         if updated_count > 0:
             return jsonify({
                 'success': True,
-                'message': f'Zaktualizowano {updated_count} produktów'
+                'message': f'Zaktualizowano {updated_count} produktów',
+                'changes': result['changes'],
+                'not_found': result['not_found']
             })
         else:
             return jsonify({
                 'success': False,
-                'message': 'Nie udało się zaktualizować żadnego produktu'
+                'message': 'Nie udało się zaktualizować żadnego produktu',
+                'not_found': result['not_found']
             })
     
     except Exception as e:
@@ -420,21 +422,34 @@ def bulk_update_products():
 @app.route('/admin/update-prices-with-markup', methods=['POST'])
 @admin_auth.login_required
 def update_prices_with_markup():
-    """Aktualizuje ceny wszystkich produktów na podstawie cen z XML i zapisanych narzutów"""
+    """Uruchamia w tle aktualizację cen wszystkich produktów na podstawie cen z XML i zapisanych narzutów"""
     try:
-        updated_count, error_count = product_manager.update_all_prices_with_markup()
-        
+        job, started = price_update_jobs.start(requested_by=session.get('admin_username'))
         return jsonify({
             'success': True,
-            'message': f'Zaktualizowano ceny {updated_count} produktów, błędów: {error_count}'
-        })
+            'job_id': job['job_id'],
+            'started': started,
+            'status': job['status'],
+            'status_url': url_for('update_prices_status', job_id=job['job_id']),
+            'message': 'Aktualizacja cen została uruchomiona' if started else 'Aktualizacja cen już trwa'
+        }), 202
     except Exception as e:
-        app.logger.error(f"Błąd podczas aktualizacji cen z narzutem: {str(e)}")
+        app.logger.error(f"Błąd podczas uruchamiania aktualizacji cen z narzutem: {str(e)}")
         return jsonify({
             'success': False,
             'message': f'Wystąpił błąd: {str(e)}'
         })
 
+# Stan zadania aktualizacji cen (postęp jest też wysyłany zdarzeniem 'price_update_progress')
+@app.route('/admin/update-prices-with-markup/status', defaults={'job_id': None})
+@app.route('/admin/update-prices-with-markup/status/<job_id>')
+@admin_auth.login_required
+def update_prices_status(job_id):
+    job = price_update_jobs.get(job_id) if job_id else price_update_jobs.current()
+    if job is None:
+        return jsonify({'success': False, 'message': 'Nie znaleziono zadania aktualizacji cen'}), 404
+    return jsonify(dict(job, success=job['status'] != 'error'))
+
 @app.route('/admin/update-product-price-with-markup', methods=['POST'])
 @admin_auth.login_required
 def update_product_price_with_markup():
@@ -468,21 +483,41 @@ def update_product_price_with_markup():
             'message': f'Wystąpił błąd: {str(e)}'
         })
 
+@app.before_request
+def sync_product_catalog():
+    """Wczytuje zmiany katalogu zapisane przez inne procesy (inne workery, skrypty, pobieranie XML)"""
+    product_manager.sync_external_changes()
+
+@app.teardown_request
+def flush_product_changes(exc):
+    """Zapisuje zmiany produktów odłożone w trakcie żądania (tryb zapisu 'request')"""
+    if product_manager.durability == 'request':
+        product_manager.flush()
+
+# Pamięć podręczna danych wspólnych dla szablonów: (wersja, dane)
+_common_data_cache = {'version': None, 'data': None}
+
 @app.context_processor
 def inject_common_data():
     """Dodaje wspólne dane do wszystkich szablonów"""
-    # Pobierz hierarchiczną strukturę kategorii
-    main_categories = product_manager.get_main_categories()
-    category_tree = product_manager.get_category_tree()
-    categories = product_manager.get_categories()
-    featured_categories = product_manager.get_featured_categories()
+    # Dane są przeliczane tylko po zmianie katalogu lub pliku wyróżnionych kategorii
+    try:
+        featured_mtime = os.stat(product_manager.FEATURED_CATEGORIES_FILE).st_mtime_ns
+    except OSError:
+        featured_mtime = None
+    version = (product_manager.catalog_generation, featured_mtime)
+    
+    if _common_data_cache['version'] != version:
+        # Pobierz hierarchiczną strukturę kategorii
+        _common_data_cache['data'] = {
+            'main_categories': product_manager.get_main_categories(),
+            'category_tree': product_manager.get_category_tree(),
+            'categories': product_manager.get_categories(),
+            'featured_categories': product_manager.get_featured_categories()
+        }
+        _common_data_cache['version'] = version
     
-    return {
-        'main_categories': main_categories,
-        'category_tree': category_tree,
-        'categories': categories,
-        'featured_categories': featured_categories
-    }
+    return _common_data_cache['data']
 
 @app.route('/')
 def home():
@@ -525,13 +560,7 @@ def product(pid):
 @app.route('/produkt/<slug>')
 def product_by_slug(slug):
     # Znajdź produkt po slug (przyjaznej nazwie)
-    products = product_manager.get_all_products(include_unavailable=False)
-    found_product = None
-    for p in products:
-        product_slug = slugify(p.get('name', ''))
-        if product_slug == slug:
-            found_product = p
-            break
+    found_product = product_manager.get_product_by_slug(slug, include_unavailable=False)
     
     if not found_product:
         flash('Produkt nie został znaleziony lub nie jest dostępny do sprzedaży')
@@ -539,19 +568,6 @@ def product_by_slug(slug):
     
     return render_template('product.html', product=found_product)
 
-def slugify(text):
-    """Funkcja tworząca przyjazny URL ze tekstu"""
-    # Usunięcie znaków specjalnych, zamiana spacji na myślniki
-    import re
-    import unicodedata
-    
-    # Normalizacja znaków, zamiana polskich liter na standardowe
-    text = unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('utf-8')
-    text = re.sub(r'[^\w\s-]', '', text.lower())
-    # Zamiana białych znaków na myślnik
-    text = re.sub(r'[-\s]+', '-', text).strip('-_')
-    return text
-
 @app.route('/koszyk')
 def cart():
     cart = session.get('cart', [])
@@ -567,7 +583,7 @@ def add_to_cart(pid):
     cart = session.get('cart', [])
     product = product_manager.get_product_by_id(pid, include_unavailable=False)
     if product:
-        cart.append(product)
+        cart.append(product.to_dict())
         session['cart'] = cart
     return redirect(url_for('cart'))
 
@@ -597,7 +613,7 @@ def api_add_to_cart(pid):
     cart = session.get('cart', [])
     product = product_manager.get_product_by_id(pid, include_unavailable=False)
     if product:
-        cart.append(product)
+        cart.append(product.to_dict())
         session['cart'] = cart
         
         # Oblicz podsumy
@@ -878,18 +894,12 @@ def search_xml_products():
     page = int(request.args.get('page', 1))
     per_page = 20  # Produktów na stronę
     
-    # Wyszukaj produkty w XML
-    results = product_manager.search_xml_products(query, field)
+    # Wyszukaj produkty w XML (wyniki są buforowane - kolejne strony tylko wycinają fragment)
+    paged_results, total_results = product_manager.search_xml_products_page(query, field, page, per_page)
     
     # Oblicz dane do paginacji
-    total_results = len(results)
     total_pages = (total_results + per_page - 1) // per_page
     
-    # Wytnij odpowiedni fragment wyników
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paged_results = results[start_idx:end_idx]
-    
     return jsonify({
         'success': True,
         'products': paged_results,
@@ -977,12 +987,20 @@ def bulk_toggle_availability():
     success_count = 0
     failed_ids = []
     
-    for product_id in product_ids:
-        product = product_manager.toggle_product_availability(int(product_id), available)
-        if product:
-            success_count += 1
-        else:
-            failed_ids.append(product_id)
+    # Wszystkie zmiany są zapisywane jednym zapisem bazy danych
+    with product_manager.batch():
+        for product_id in product_ids:
+            product = product_manager.toggle_product_availability(int(product_id), available)
+            if product:
+                success_count += 1
+            else:
+                failed_ids.append(product_id)
+        
+        if success_count and not product_manager.flush():
+            return jsonify({
+                'success': False,
+                'message': 'Wystąpił błąd podczas zapisu zmian dostępności do bazy danych'
+            })
     
     if len(failed_ids) == 0:
         return jsonify({
@@ -1255,10 +1273,12 @@ def update_xml_config_route(): # Renamed to avoid conflict if 'update_xml_config
 @app.route('/admin/download_xml_now', methods=['POST'])
 @admin_auth.login_required
 def download_xml_now_route():
-    if xml_downloader.download_xml_file():
-        flash('Pobieranie XML zakończone sukcesem.', 'success')
+    # Pobranie i sparsowanie pliku w tle - żaden inny proces nie parsuje pobranego pliku
+    job, started = xml_refresh_jobs.start(requested_by=session.get('admin_username'))
+    if started:
+        flash('Uruchomiono pobieranie i przetwarzanie XML w tle.', 'success')
     else:
-        flash('Wystąpił błąd podczas pobierania XML.', 'danger')
+        flash('Pobieranie XML już trwa.', 'info')
     return redirect(url_for('admin_settings'))
 
 @app.route('/admin/change_password', methods=['POST'])
@@ -1356,6 +1376,12 @@ def generate_product_descriptions():
             'message': f'Wystąpił błąd: {str(e)}'
         })
 
+@socketio.on('connect')
+def handle_connect():
+    # Zalogowani administratorzy dostają postęp zadań w tle (odświeżanie XML, aktualizacja cen)
+    if session.get('admin_logged_in'):
+        join_room(ADMIN_ROOM)
+
 # Przykład emitowania powiadomienia o nowym produkcie (możesz wywołać to np. po dodaniu produktu z XML w przyszłości)
 @socketio.on('announce_new_product')
 def handle_new_product(data):
@@ -1512,26 +1538,6 @@ def admin_delete_user(username):
     
     return redirect(url_for('admin_users'))
 
-def slugify(text):
-    """Konwertuje tekst na przyjazny URL (slug)"""
-    # Zastąp polskie znaki
-    replacements = {
-        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
-        'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
-        'Ą': 'A', 'Ć': 'C', 'Ę': 'E', 'Ł': 'L', 'Ń': 'N',
-        'Ó': 'O', 'Ś': 'S', 'Ź': 'Z', 'Ż': 'Z'
-    }
-    for polish, latin in replacements.items():
-        text = text.replace(polish, latin)
-    
-    # Zamień spacje na myślniki, usuń znaki specjalne, zmień na małe litery
-    import re
-    text = re.sub(r'[^\w\s-]', '', text.lower())
-    text = re.sub(r'[\s_-]+', '-', text)
-    text = re.sub(r'^-+|-+$', '', text)
-    
-    return text
-
 @app.route('/search')
 def search():
     """Wyszukiwanie produktów"""
@@ -1547,14 +1553,16 @@ def search():
     # Pobranie wyników wyszukiwania - tylko produkty dostępne do sprzedaży
     products = product_manager.find_products(query, include_unavailable=False)
     
-    # Wyróżnij zapytanie w nazwach i opisach produktów
+    # Wyróżnij zapytanie w nazwach i opisach produktów - na płytkich kopiach, żeby wyróżnienia
+    # nie trafiły do rekordów katalogu (współdzielonych przez żądania i zapisywanych w magazynie)
     if query:
+        products = [product.copy() for product in products]
         for product in products:
             if 'name' in product:
                 product['highlighted_name'] = highlight_text(product['name'], query)
-            if 'description' in product:
-                # Skrócona wersja opisu dla wyników wyszukiwania (pierwsze 250 znaków)
-                short_desc = product['description'][:250] + ('...' if len(product['description']) > 250 else '')
+            # Krótki fragment opisu zapisany w rekordzie - bez wczytywania plików opisów
+            short_desc = product_manager.get_product_description_snippet(product)
+            if short_desc:
                 product['highlighted_description'] = highlight_text(short_desc, query)
     
     # Sortowanie wyników
@@ -1564,10 +1572,7 @@ def search():
         products.sort(key=lambda p: float(p.get('price', 0)), reverse=True)
     elif sort == 'name-asc':
         products.sort(key=lambda p: p.get('name', '').lower())
-    else:  # relevance (domyślnie)
-        # Najpierw te, które mają frazę w nazwie
-        if query:
-            products.sort(key=lambda p: query.lower() not in p.get('name', '').lower())
+    # relevance (domyślnie) - wyniki są już posortowane według trafności przez wyszukiwarkę
     
     # Statystyki wyszukiwania
     search_stats = {
@@ -1601,15 +1606,8 @@ def api_search():
         if not query or len(query) < 2:
             return jsonify([])
         
-        products = product_manager.find_products(query, include_unavailable=False)
-        
-        # Sortowanie wyników - domyślnie wg. trafności
-        # Najpierw te, które mają frazę w nazwie
-        if query:
-            products.sort(key=lambda p: query.lower() not in p.get('name', '').lower())
-        
-        # Ograniczenie wyników
-        products = products[:limit]
+        # Indeks podpowiedzi zwraca od razu najlepsze `limit` produktów
+        products = product_manager.suggest_products(query, limit=limit)
         
         # Przygotowanie wyników w formacie JSON
         results = []
@@ -0,0 +1,119 @@
+import uuid
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('background_jobs')
+
+
+class BackgroundJobs:
+    """
+    Długie operacje panelu administracyjnego uruchamiane jako zadania w tle.
+
+    Zadanie działa w osobnym wątku, więc żądanie, które je uruchomiło, kończy się od razu.
+    Postęp jest rozsyłany zdarzeniem EVENT (Flask-SocketIO) i dostępny przez get(job_id).
+    W danym momencie działa co najwyżej jedno zadanie - gdy zadanie już trwa, start() zwraca
+    trwające zadanie zamiast uruchamiać kolejne.
+
+    Klasy pochodne ustawiają EVENT, NAME i JOB_FIELDS oraz implementują _execute(job_id),
+    które kończy zadanie przez _finish().
+    """
+
+    EVENT = None
+    NAME = 'zadanie'
+    JOB_FIELDS = {} # Dodatkowe pola stanu zadania z wartościami początkowymi
+    HISTORY_SIZE = 20 # Liczba zakończonych zadań, których stan jest przechowywany
+
+    def __init__(self, emit=None):
+        """
+        Args:
+            emit (callable, optional): Funkcja emit(zdarzenie, dane) - np. wysyłająca do pokoju administratorów
+        """
+        self.emit = emit
+        self._jobs = {}
+        self._order = []
+        self._running_id = None
+        self._lock = threading.Lock()
+
+    def start(self, requested_by=None):
+        """
+        Uruchamia zadanie w tle.
+
+        Args:
+            requested_by (str, optional): Kto zlecił zadanie (do logów)
+
+        Returns:
+            tuple: (stan zadania, True jeśli uruchomiono nowe zadanie / False jeśli już trwało)
+        """
+        with self._lock:
+            if self._running_id is not None:
+                return dict(self._jobs[self._running_id]), False
+
+            job = {
+                'job_id': uuid.uuid4().hex,
+                'status': 'queued',
+                'stage': 'queued',
+                'progress': 0,
+                'message': f'{self.NAME.capitalize()} oczekuje na uruchomienie',
+                'requested_by': requested_by,
+                'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'finished_at': None
+            }
+            job.update(self.JOB_FIELDS)
+            self._jobs[job['job_id']] = job
+            self._order.append(job['job_id'])
+            self._running_id = job['job_id']
+
+            # Usuń najstarsze zakończone zadania
+            while len(self._order) > self.HISTORY_SIZE:
+                self._jobs.pop(self._order.pop(0), None)
+
+            snapshot = dict(job)
+
+        logger.info(f"Uruchomiono: {self.NAME} {job['job_id']} (zlecił: {requested_by})")
+        thread = threading.Thread(target=self._run, args=(job['job_id'],), daemon=True)
+        thread.start()
+        return snapshot, True
+
+    def get(self, job_id):
+        """Zwraca stan zadania lub None, jeśli zadanie jest nieznane"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def current(self):
+        """Zwraca stan trwającego lub ostatniego zadania (None, jeśli nie było żadnego)"""
+        with self._lock:
+            job_id = self._running_id or (self._order[-1] if self._order else None)
+            return dict(self._jobs[job_id]) if job_id else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            snapshot = dict(job)
+        if self.emit is not None and self.EVENT:
+            try:
+                self.emit(self.EVENT, snapshot)
+            except Exception as e:
+                logger.warning(f"Nie udało się wysłać postępu ({self.NAME}): {str(e)}")
+
+    def _run(self, job_id):
+        try:
+            self._execute(job_id)
+        except Exception as e:
+            logger.error(f"Błąd podczas wykonywania zadania ({self.NAME}) {job_id}: {str(e)}")
+            self._finish(job_id, 'error', f'Błąd: {str(e)}')
+
+    def _execute(self, job_id):
+        raise NotImplementedError
+
+    def _finish(self, job_id, status, message, **fields):
+        with self._lock:
+            if self._running_id == job_id:
+                self._running_id = None
+        self._update(job_id, status=status, stage=status, progress=100, message=message,
+                     finished_at=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), **fields)
+        logger.info(f"Zakończono: {self.NAME} {job_id}: {status} - {message}")
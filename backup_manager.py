@@ -3,6 +3,7 @@ import time
 import shutil
 import threading
 import logging
+from product_store import products_file_path
 
 # Konfiguracja logowania
 logging.basicConfig(
@@ -16,7 +17,7 @@ logger = logging.getLogger('backup_manager')
 class BackupManager:
     def __init__(self, interval_minutes=60):
         self.interval_minutes = interval_minutes
-        self.db_path = os.path.join('data', 'products.json')
+        self.db_path = products_file_path()
         self.backup_dir = os.path.join('data', 'backups')
         self.running = False
         self.thread = None
@@ -67,7 +68,7 @@ class BackupManager:
             
         # Format nazwy pliku kopii zapasowej: products_YYYYMMDD_HHMMSS.json
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        backup_filename = f"products_{timestamp}.json"
+        backup_filename = f"products_{timestamp}{os.path.splitext(self.db_path)[1]}"
         backup_path = os.path.join(self.backup_dir, backup_filename)
         
         try:
@@ -87,7 +88,7 @@ class BackupManager:
         """Usuwa stare kopie zapasowe, pozostawiając określoną liczbę najnowszych"""
         try:
             # Pobierz listę plików kopii zapasowych
-            backup_files = [f for f in os.listdir(self.backup_dir) if f.startswith("products_") and f.endswith(".json")]
+            backup_files = [f for f in os.listdir(self.backup_dir) if f.startswith("products_") and f.endswith(os.path.splitext(self.db_path)[1])]
             
             # Sortuj według daty modyfikacji (od najstarszych do najnowszych)
             backup_files.sort(key=lambda f: os.path.getmtime(os.path.join(self.backup_dir, f)))
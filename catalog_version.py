@@ -0,0 +1,175 @@
+"""
+Numer wersji katalogu produktów współdzielony przez procesy.
+
+Każdy proces, który zapisał zmiany w magazynie produktów (ProductManager.flush), zwiększa
+licznik w pliku data/catalog_version.json i dopisuje do niego krótki wpis o zmianie: ID
+zmienionych i usuniętych produktów lub znacznik pełnej zmiany katalogu. Nowy plik XML parsuje
+i zapisuje proces, który go pobrał - pozostałe widzą to jak każdą inną zapisaną zmianę.
+
+Pozostałe procesy sprawdzają przy każdym żądaniu tylko os.stat() tego pliku; gdy się zmienił,
+czytają wpisy nowsze od ostatnio widzianej generacji i wczytują ponownie tylko zmienione
+produkty (ProductManager.sync_external_changes). Gdy wpisów brakuje (dziennik jest krótki),
+katalog jest wczytywany w całości.
+
+Dostęp do pliku jest chroniony blokadą plikową (fcntl.flock) - na systemach bez fcntl
+blokada międzyprocesowa jest pomijana.
+
+Sam katalog nie jest współdzielony w pamięci - każdy proces trzyma własną listę produktów
+i indeksy, a ten plik służy tylko do przekazywania zmian. Wspólna migawka katalogu w pliku
+mapowanym do pamięci (mmap) nie zmniejszy zużycia pamięci, dopóki wszystkie trasy sklepu
+i panelu (lista produktów, wyszukiwanie, podpowiedzi, koszyk, zmiany w panelu) korzystają
+z ProductManager procesu - wymaga to przebudowy ścieżek odczytu i nie jest zrobione.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+logger = logging.getLogger('catalog_version')
+
+DEFAULT_VERSION_PATH = os.path.join('data', 'catalog_version.json')
+CHANGE_LOG_SIZE = 200       # Liczba ostatnich wpisów przechowywanych w pliku
+MAX_IDS_PER_CHANGE = 1000   # Większa zmiana jest zapisywana jako pełna (bez listy ID)
+
+
+class CatalogVersion:
+    """Plik z numerem generacji katalogu i dziennikiem ostatnich zmian"""
+
+    def __init__(self, path=DEFAULT_VERSION_PATH, check_interval=0.0):
+        """
+        Args:
+            path (str): Ścieżka pliku wersji
+            check_interval (float): Minimalny odstęp (w sekundach) między sprawdzeniami os.stat() w has_changed()
+        """
+        self.path = path
+        self.check_interval = check_interval
+        self._stat_key = None
+        self._checked_at = 0.0
+        self._write_lock = threading.Lock()
+        self._feed_lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self, suffix, thread_lock):
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path + suffix, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def feed_lock(self):
+        """Blokada międzyprocesowa na czas pobierania i parsowania pliku XML (robi to tylko jeden proces)"""
+        return self._file_lock('.feed.lock', self._feed_lock)
+
+    def _current_stat_key(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def read(self):
+        """
+        Odczytuje plik wersji.
+
+        Returns:
+            dict: {'generation': int, 'changes': [wpisy]} (generacja 0, gdy pliku nie ma)
+        """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            data.setdefault('changes', [])
+            return data
+        except FileNotFoundError:
+            return {'generation': 0, 'changes': []}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Nie udało się odczytać pliku wersji katalogu {self.path}: {e}")
+            return {'generation': 0, 'changes': []}
+
+    def has_changed(self):
+        """
+        Tanie sprawdzenie (os.stat), czy plik wersji zmienił się od poprzedniego wywołania.
+
+        Returns:
+            bool: True jeśli plik się zmienił (lub zniknął/pojawił się)
+        """
+        now = time.monotonic()
+        if self.check_interval and now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        stat_key = self._current_stat_key()
+        if stat_key == self._stat_key:
+            return False
+        self._stat_key = stat_key
+        return True
+
+    def bump(self, origin, changed_ids=(), deleted_ids=(), full=False):
+        """
+        Zwiększa numer generacji i dopisuje wpis o zmianie.
+
+        Args:
+            origin (str): Identyfikator procesu/obiektu, który wprowadził zmianę
+            changed_ids (iterable): ID zmienionych lub dodanych produktów
+            deleted_ids (iterable): ID usuniętych produktów
+            full (bool): Czy zmieniła się (potencjalnie) cała lista produktów
+
+        Returns:
+            int: Nowy numer generacji
+        """
+        changed_ids = sorted(str(product_id) for product_id in changed_ids)
+        deleted_ids = sorted(str(product_id) for product_id in deleted_ids)
+        if len(changed_ids) + len(deleted_ids) > MAX_IDS_PER_CHANGE:
+            full, changed_ids, deleted_ids = True, [], []
+
+        with self._file_lock('.lock', self._write_lock):
+            data = self.read()
+            generation = data.get('generation', 0) + 1
+            change = {'generation': generation, 'origin': origin, 'at': time.time()}
+            if full:
+                change['full'] = True
+            if changed_ids:
+                change['changed'] = changed_ids
+            if deleted_ids:
+                change['deleted'] = deleted_ids
+            changes = (data['changes'] + [change])[-CHANGE_LOG_SIZE:]
+
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'generation': generation, 'changes': changes}, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+        return generation
+
+    def changes_since(self, generation):
+        """
+        Zwraca wpisy nowsze od podanej generacji.
+
+        Args:
+            generation (int): Ostatnio widziana generacja
+
+        Returns:
+            tuple: (aktualna generacja, lista wpisów) - lista jest None, jeśli dziennik
+                nie sięga tak daleko wstecz (trzeba wczytać cały katalog)
+        """
+        data = self.read()
+        current = data.get('generation', 0)
+        if current <= generation:
+            return current, []
+        changes = [change for change in data['changes'] if change['generation'] > generation]
+        if not changes or changes[0]['generation'] != generation + 1:
+            return current, None
+        return current, changes
+
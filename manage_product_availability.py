@@ -4,11 +4,11 @@ Skrypt do bezpośredniego zarządzania dostępnością produktów w bazie danych
 """
 
 import os
-import json
 import sys
 import time
 import shutil
 import logging
+from product_store import products_file_path, load_products, save_products
 
 logging.basicConfig(
     level=logging.INFO,
@@ -21,7 +21,7 @@ def reset_all_products():
     """Ustawia wszystkie produkty jako niedostępne do sprzedaży"""
     try:
         # Ścieżka do pliku bazy danych produktów
-        db_path = os.path.join('data', 'products.json')
+        db_path = products_file_path()
         
         # Sprawdź czy plik istnieje
         if not os.path.exists(db_path):
@@ -34,16 +34,14 @@ def reset_all_products():
         logger.info(f"Utworzono kopię zapasową: {backup_path}")
         
         # Wczytaj produkty z bazy danych
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
+        products = load_products(db_path)
         
         # Resetuj dostępność wszystkich produktów
         for product in products:
             product['available_for_sale'] = False
         
         # Zapisz zmiany
-        with open(db_path, 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
+        save_products(products, db_path)
         
         logger.info(f"Zresetowano dostępność dla {len(products)} produktów")
         return True
@@ -56,7 +54,7 @@ def set_products_available_by_category(category, available=True):
     """Ustawia produkty z danej kategorii jako dostępne/niedostępne do sprzedaży"""
     try:
         # Ścieżka do pliku bazy danych produktów
-        db_path = os.path.join('data', 'products.json')
+        db_path = products_file_path()
         
         # Sprawdź czy plik istnieje
         if not os.path.exists(db_path):
@@ -64,8 +62,7 @@ def set_products_available_by_category(category, available=True):
             return 0
         
         # Wczytaj produkty z bazy danych
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
+        products = load_products(db_path)
         
         # Licznik zmienionych produktów
         count = 0
@@ -77,8 +74,7 @@ def set_products_available_by_category(category, available=True):
                 count += 1
         
         # Zapisz zmiany
-        with open(db_path, 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
+        save_products(products, db_path)
         
         status = "dostępne" if available else "niedostępne"
         logger.info(f"Ustawiono {count} produktów z kategorii '{category}' jako {status}")
@@ -92,7 +88,7 @@ def set_product_available_by_id(product_id, available=True):
     """Ustawia konkretny produkt jako dostępny/niedostępny do sprzedaży"""
     try:
         # Ścieżka do pliku bazy danych produktów
-        db_path = os.path.join('data', 'products.json')
+        db_path = products_file_path()
         
         # Sprawdź czy plik istnieje
         if not os.path.exists(db_path):
@@ -100,8 +96,7 @@ def set_product_available_by_id(product_id, available=True):
             return False
         
         # Wczytaj produkty z bazy danych
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
+        products = load_products(db_path)
         
         # Znajdź i zaktualizuj produkt
         for product in products:
@@ -109,8 +104,7 @@ def set_product_available_by_id(product_id, available=True):
                 product['available_for_sale'] = available
                 
                 # Zapisz zmiany
-                with open(db_path, 'w', encoding='utf-8') as f:
-                    json.dump(products, f, ensure_ascii=False, indent=2)
+                save_products(products, db_path)
                 
                 status = "dostępny" if available else "niedostępny"
                 logger.info(f"Produkt '{product.get('name')}' (ID: {product_id}) jest teraz {status}")
@@ -127,7 +121,7 @@ def count_available_products():
     """Zlicza liczbę produktów dostępnych do sprzedaży"""
     try:
         # Ścieżka do pliku bazy danych produktów
-        db_path = os.path.join('data', 'products.json')
+        db_path = products_file_path()
         
         # Sprawdź czy plik istnieje
         if not os.path.exists(db_path):
@@ -135,8 +129,7 @@ def count_available_products():
             return (0, 0)
         
         # Wczytaj produkty z bazy danych
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
+        products = load_products(db_path)
         
         # Zlicz produkty dostępne do sprzedaży
         available_count = sum(1 for p in products if p.get('available_for_sale', False))
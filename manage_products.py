@@ -28,7 +28,7 @@ def restore_products_with_descriptions():
     
     restored_count = 0
     for product in products:
-        if not product.get('available_for_sale', False) and product.get('description'):
+        if not product.get('available_for_sale', False) and (product.get('description') or product.get('description_blob')):
             product['available_for_sale'] = True
             restored_count += 1
     
@@ -46,9 +46,9 @@ def count_products():
     
     total = len(products)
     available = sum(1 for p in products if p.get('available_for_sale', False))
-    with_descriptions = sum(1 for p in products if p.get('description'))
-    available_with_descriptions = sum(1 for p in products if p.get('available_for_sale', False) and p.get('description'))
-    unavailable_with_descriptions = sum(1 for p in products if not p.get('available_for_sale', False) and p.get('description'))
+    with_descriptions = sum(1 for p in products if (p.get('description') or p.get('description_blob')))
+    available_with_descriptions = sum(1 for p in products if p.get('available_for_sale', False) and (p.get('description') or p.get('description_blob')))
+    unavailable_with_descriptions = sum(1 for p in products if not p.get('available_for_sale', False) and (p.get('description') or p.get('description_blob')))
     
     print("\n📊 Product Statistics:")
     print(f"  Total products: {total}")
@@ -116,7 +116,7 @@ def show_categories():
         if product.get('available_for_sale', False):
             categories[category]['available'] += 1
             
-        if product.get('description'):
+        if (product.get('description') or product.get('description_blob')):
             categories[category]['with_description'] += 1
     
     print("\n📁 Categories:")
@@ -0,0 +1,47 @@
+from background_jobs import BackgroundJobs
+
+
+class PriceUpdateJobs(BackgroundJobs):
+    """
+    Aktualizacja cen wszystkich produktów z bieżącego pliku XML i zapisanych narzutów
+    (ProductManager.update_all_prices_with_markup) jako zadanie w tle.
+
+    Postęp jest rozsyłany zdarzeniem 'price_update_progress'. Zadanie działa pod międzyprocesową
+    blokadą pliku XML, więc nie biegnie równocześnie z odświeżaniem XML ani z aktualizacją
+    cen w innym workerze.
+    """
+
+    EVENT = 'price_update_progress'
+    NAME = 'aktualizacja cen z narzutem'
+    JOB_FIELDS = {'updated_count': None, 'error_count': None}
+
+    def __init__(self, product_manager, emit=None):
+        """
+        Args:
+            product_manager (ProductManager): Menedżer produktów
+            emit (callable, optional): Funkcja emit(zdarzenie, dane) - np. wysyłająca do pokoju administratorów
+        """
+        super().__init__(emit)
+        self.product_manager = product_manager
+
+    def _execute(self, job_id):
+        self._update(job_id, status='running', stage='waiting', progress=0,
+                     message='Oczekiwanie na zakończenie innej operacji na pliku XML...')
+        with self.product_manager.catalog_version.feed_lock():
+            self.product_manager.sync_external_changes()
+
+            def report_progress(stage, processed, total):
+                if stage == 'read':
+                    percent = 5 + int(85 * min(processed, total) / total) if total else 5
+                    message = (f"Odczytano {processed} z {total} ofert" if total
+                               else f"Odczytano {processed} ofert")
+                    self._update(job_id, stage='read', progress=percent, message=message)
+
+            self._update(job_id, stage='read', progress=5, message='Odczytywanie cen z pliku XML...')
+            updated_count, error_count = self.product_manager.update_all_prices_with_markup(progress=report_progress)
+            if not self.product_manager.flush():
+                self._finish(job_id, 'error', 'Wystąpił błąd podczas zapisu cen do bazy danych')
+                return
+
+        self._finish(job_id, 'done', f'Zaktualizowano ceny {updated_count} produktów, błędów: {error_count}',
+                     updated_count=updated_count, error_count=error_count)
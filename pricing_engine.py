@@ -0,0 +1,259 @@
+"""
+Wyliczanie cen produktów: cena brutto z ceny netto i VAT oraz cena sprzedaży z ceny bazowej i narzutu.
+
+Wszystkie ceny w sklepie są zaokrąglane jedną regułą - do pełnych groszy, połówki w górę
+(od zera) według dziesiętnego zapisu liczby: 1.005 -> 1.01, 2.675 -> 2.68 (round_price,
+przez Decimal - zwykłe floor(x * 100 + 0.5) myli się dla liczb, których zapis binarny jest
+odrobinę mniejszy od połówki). Pojedyncze ceny liczą funkcje gross_price / sale_price /
+markup_from_price, a ceny wielu produktów naraz - PriceColumns: ceny bazowe, narzuty, ceny
+netto i stawki VAT są trzymane w kolumnach (tablice NumPy, a gdy NumPy nie jest zainstalowany -
+array('d')) i przeliczane jednym przebiegiem. Kolumny zaokrąglane są szybkim działaniem
+zmiennoprzecinkowym, a wartości bliskie połówki grosza - przez round_price, więc obie ścieżki
+dają identyczne wyniki.
+"""
+import math
+from array import array
+from decimal import Decimal, ROUND_HALF_UP
+
+try:
+    import numpy as np
+except ImportError: # NumPy jest opcjonalny
+    np = None
+
+DEFAULT_VAT_RATE = 23
+_CENT = Decimal('0.01')
+_HALF_CENT_TOLERANCE = 1e-6 # Wartości (w groszach) tak bliskie połówki są zaokrąglane przez Decimal
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def round_price(value):
+    """Zaokrągla cenę do pełnych groszy - połówki w górę (od zera) według zapisu dziesiętnego liczby"""
+    return float(Decimal(repr(float(value))).quantize(_CENT, rounding=ROUND_HALF_UP))
+
+
+def normalize_vat_rate(value):
+    """
+    Zwraca stawkę VAT jako liczbę całkowitą procentów ('23', '23.00', 23.0 -> 23).
+
+    Wszystkie ścieżki zapisujące pole 'vat' produktu używają tej funkcji, więc stawki
+    w rekordach mają jeden typ (int).
+
+    Raises:
+        ValueError: Gdy wartość nie jest liczbą lub jest ujemna
+    """
+    try:
+        rate = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Niepoprawna stawka VAT: {value}")
+    if math.isnan(rate) or rate < 0:
+        raise ValueError(f"Niepoprawna stawka VAT: {value}")
+    return int(rate)
+
+
+def gross_price(net_price, vat_rate=DEFAULT_VAT_RATE):
+    """
+    Oblicza cenę brutto.
+
+    Args:
+        net_price (float): Cena netto
+        vat_rate (float): Stawka VAT w procentach
+
+    Returns:
+        float: Cena brutto zaokrąglona do groszy
+    """
+    return round_price(_to_float(net_price) * (1 + _to_float(vat_rate, DEFAULT_VAT_RATE) / 100))
+
+
+def sale_price(base_price, markup_percent):
+    """
+    Oblicza cenę sprzedaży z ceny bazowej (brutto) i narzutu.
+
+    Args:
+        base_price (float): Cena bazowa brutto (original_price)
+        markup_percent (float): Narzut w procentach
+
+    Returns:
+        float: Cena sprzedaży zaokrąglona do groszy
+    """
+    return round_price(_to_float(base_price) * (1 + _to_float(markup_percent) / 100))
+
+
+def markup_from_price(price, base_price):
+    """
+    Oblicza narzut, przy którym cena bazowa daje podaną cenę sprzedaży.
+
+    Returns:
+        float: Narzut w procentach (0.0, gdy cena bazowa nie jest dodatnia)
+    """
+    base_price = _to_float(base_price)
+    if base_price <= 0:
+        return 0.0
+    return round_price((_to_float(price) / base_price - 1) * 100)
+
+
+# Operacje masowej zmiany wartości (ceny, narzutu, VAT, kosztu dostawy)
+OPERATIONS = ('add', 'subtract', 'percent_increase', 'percent_decrease', 'set')
+
+
+def apply_operation(value, operation, operand):
+    """
+    Zmienia wartość liczbową jedną z operacji OPERATIONS.
+
+    Wynik nie jest ujemny i jest zaokrąglony do groszy (setnych części).
+
+    Args:
+        value (float): Bieżąca wartość
+        operation (str): Operacja z OPERATIONS
+        operand (float): Wartość operacji (kwota, punkty procentowe lub procent zmiany)
+
+    Returns:
+        float: Nowa wartość
+    """
+    value = _to_float(value)
+    operand = float(operand)
+    if operation == 'add':
+        result = value + operand
+    elif operation == 'subtract':
+        result = value - operand
+    elif operation == 'percent_increase':
+        result = value * (1 + operand / 100)
+    elif operation == 'percent_decrease':
+        result = value * (1 - operand / 100)
+    elif operation == 'set':
+        result = operand
+    else:
+        raise ValueError(f"Nieznana operacja: {operation}")
+    return round_price(max(0.0, result))
+
+
+class PriceColumns:
+    """
+    Kolumny cen dla listy produktów, przeliczane jednym przebiegiem.
+
+    Przykład - przeliczenie cen sprzedaży całego katalogu z zapisanych narzutów:
+        changed = PriceColumns(products).apply_sale_prices()
+    """
+
+    def __init__(self, products, default_vat_rate=DEFAULT_VAT_RATE):
+        """
+        Args:
+            products (sequence): Produkty (słowniki lub ProductRecord)
+            default_vat_rate (float): Stawka VAT dla produktów bez pola 'vat'
+        """
+        self.products = products if isinstance(products, list) else list(products)
+        self.original_price = self._column('original_price')
+        self.markup_percent = self._column('markup_percent')
+        self.price_net_xml = self._column('price_net_xml')
+        self.vat = self._column('vat', default_vat_rate)
+        self.price = self._column('price')
+
+    def __len__(self):
+        return len(self.products)
+
+    def _column(self, field, default=0.0):
+        return self.as_column([_to_float(product.get(field), default) for product in self.products])
+
+    def as_column(self, values):
+        """Zamienia sekwencję liczb (lub jedną liczbę - ta sama wartość dla każdego produktu) na kolumnę"""
+        if isinstance(values, (int, float)):
+            values = [float(values)] * len(self.products)
+        if np is not None:
+            return np.asarray(values, dtype=np.float64)
+        return values if isinstance(values, array) else array('d', values)
+
+    @staticmethod
+    def _round(values):
+        # Tak samo jak round_price: wartości odległe od połówki grosza - działaniem na liczbach
+        # zmiennoprzecinkowych, a bliskie połówki (i ujemne) - przez round_price
+        if np is not None:
+            cents = values * 100
+            rounded = np.floor(cents + 0.5) / 100
+            ambiguous = np.flatnonzero((np.abs(cents - np.floor(cents) - 0.5) < _HALF_CENT_TOLERANCE) | (values < 0))
+            for position in ambiguous.tolist():
+                rounded[position] = round_price(values[position])
+            return rounded
+        rounded = array('d')
+        for value in values:
+            cents = value * 100
+            if value < 0 or abs(cents - math.floor(cents) - 0.5) < _HALF_CENT_TOLERANCE:
+                rounded.append(round_price(value))
+            else:
+                rounded.append(math.floor(cents + 0.5) / 100)
+        return rounded
+
+    def sale_prices(self, markups=None, base_prices=None):
+        """
+        Ceny sprzedaży: cena bazowa * (1 + narzut / 100), zaokrąglone do groszy.
+
+        Args:
+            markups (optional): Kolumna lub jedna wartość narzutu (domyślnie narzuty produktów)
+            base_prices (optional): Kolumna cen bazowych (domyślnie original_price produktów)
+
+        Returns:
+            Kolumna cen sprzedaży
+        """
+        markups = self.markup_percent if markups is None else self.as_column(markups)
+        base_prices = self.original_price if base_prices is None else self.as_column(base_prices)
+        if np is not None:
+            return self._round(base_prices * (1 + markups / 100))
+        return self._round([base * (1 + markup / 100) for base, markup in zip(base_prices, markups)])
+
+    def gross_prices(self, net_prices=None, vat_rates=None):
+        """
+        Ceny brutto: cena netto * (1 + VAT / 100), zaokrąglone do groszy.
+
+        Args:
+            net_prices (optional): Kolumna cen netto (domyślnie price_net_xml produktów)
+            vat_rates (optional): Kolumna lub jedna stawka VAT (domyślnie stawki produktów)
+
+        Returns:
+            Kolumna cen brutto
+        """
+        net_prices = self.price_net_xml if net_prices is None else self.as_column(net_prices)
+        vat_rates = self.vat if vat_rates is None else self.as_column(vat_rates)
+        if np is not None:
+            return self._round(net_prices * (1 + vat_rates / 100))
+        return self._round([net * (1 + vat / 100) for net, vat in zip(net_prices, vat_rates)])
+
+    def apply_sale_prices(self, markups=None, base_prices=None):
+        """
+        Zapisuje w produktach przeliczone ceny sprzedaży (oraz narzuty i ceny bazowe, jeśli podano).
+
+        Args:
+            markups (optional): Nowe narzuty (kolumna lub jedna wartość); domyślnie bez zmian
+            base_prices (optional): Nowe ceny bazowe (original_price); domyślnie bez zmian
+
+        Returns:
+            list: Produkty, w których zmieniła się cena sprzedaży, narzut lub cena bazowa
+        """
+        if markups is not None:
+            self.markup_percent = self.as_column(markups)
+        if base_prices is not None:
+            self.original_price = self.as_column(base_prices)
+        new_prices = self.sale_prices()
+        if np is not None:
+            changed_positions = np.flatnonzero(new_prices != self.price).tolist()
+        else:
+            changed_positions = [i for i, (new, old) in enumerate(zip(new_prices, self.price)) if new != old]
+
+        changed = set(changed_positions)
+        for field, values, given in (('markup_percent', self.markup_percent, markups),
+                                     ('original_price', self.original_price, base_prices)):
+            if given is None:
+                continue
+            for position, (product, value) in enumerate(zip(self.products, values.tolist())):
+                if product.get(field) != value:
+                    product[field] = value
+                    changed.add(position)
+
+        new_prices_list = new_prices.tolist()
+        for position in changed:
+            self.products[position]['price'] = new_prices_list[position]
+        self.price = new_prices
+        return [self.products[position] for position in sorted(changed)]
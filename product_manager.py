@@ -5,6 +5,49 @@ import os
 import json
 from datetime import datetime, timedelta # Dodano timedelta
 import threading # Dodano threading
+import hashlib
+import re
+import html
+import atexit
+from collections import OrderedDict
+from contextlib import contextmanager
+from search_index import SearchIndex, SuggestionIndex
+from xml_catalog import XmlCatalog
+from xml_offer_index import load_offer_index
+from product_store import create_product_store, DESCRIPTION_BLOB_MIN_SIZE
+from product_record import ProductRecord
+from catalog_version import CatalogVersion
+from pricing_engine import (PriceColumns, OPERATIONS, apply_operation, gross_price, sale_price, markup_from_price,
+                            normalize_vat_rate)
+
+def slugify(text):
+    """Konwertuje tekst na przyjazny URL (slug)"""
+    # Zastąp polskie znaki
+    replacements = {
+        'ą': 'a', 'ć': 'c', 'ę': 'e', 'ł': 'l', 'ń': 'n',
+        'ó': 'o', 'ś': 's', 'ź': 'z', 'ż': 'z',
+        'Ą': 'A', 'Ć': 'C', 'Ę': 'E', 'Ł': 'L', 'Ń': 'N',
+        'Ó': 'O', 'Ś': 'S', 'Ź': 'Z', 'Ż': 'Z'
+    }
+    for polish, latin in replacements.items():
+        text = text.replace(polish, latin)
+    
+    # Zamień spacje na myślniki, usuń znaki specjalne, zmień na małe litery
+    text = re.sub(r'[^\w\s-]', '', text.lower())
+    text = re.sub(r'[\s_-]+', '-', text)
+    text = re.sub(r'^-+|-+$', '', text)
+    
+    return text
+
+def description_snippet(description, length=250):
+    """Zwraca początek opisu produktu jako zwykły tekst (bez znaczników HTML) - do list i wyników wyszukiwania"""
+    text = html.unescape(re.sub(r'<[^>]*>', ' ', description or ''))
+    text = re.sub(r'\s+', ' ', text).strip()
+    if len(text) > length:
+        text = text[:length].rstrip() + '...'
+    return text
+
+_MISSING = object() # Brak pola w produkcie (patrz ProductManager._backup_fields)
 
 class ProductManager:
     """Klasa zarządzająca produktami - parsowanie XML i zapisywanie do bazy danych"""
@@ -14,10 +57,29 @@ class ProductManager:
     PRODUCT_LISTS_FILE = os.path.join('data', 'product_lists.json')
     FEATURED_CATEGORIES_FILE = os.path.join('data', 'featured_categories.json')
     DEFAULT_XML_PATH = os.path.join('data', 'products_latest.xml')
+    CATALOG_VERSION_FILE = os.path.join('data', 'catalog_version.json')
     VAT_RATE = 23  # Domyślna stawka VAT w procentach
+    
+    # Tryby trwałości zapisu (patrz _save_to_db)
+    DURABILITY_MODES = ('immediate', 'request', 'delayed')
+    DURABILITY_ENV_VAR = 'PRODUCT_STORE_DURABILITY'
+    DEFAULT_FLUSH_DELAY = 2.0 # Sekundy od pierwszej niezapisanej zmiany w trybie 'delayed'
+    DESCRIPTION_CACHE_SIZE = 128 # Liczba opisów produktów przechowywanych w pamięci (LRU)
 
-    def __init__(self, db_file=None, xml_path=None):
-        """Inicjalizacja menedżera produktów"""
+    def __init__(self, db_file=None, xml_path=None, storage_backend=None, durability=None, flush_delay=None,
+                 storage_format=None):
+        """
+        Inicjalizacja menedżera produktów
+        
+        Args:
+            storage_backend (str, optional): Magazyn produktów - 'json' lub 'sqlite'
+                (domyślnie zmienna środowiskowa PRODUCT_STORE_BACKEND, a gdy jej brak - 'json')
+            durability (str, optional): Tryb zapisu zmian - 'immediate', 'request' lub 'delayed'
+                (domyślnie zmienna środowiskowa PRODUCT_STORE_DURABILITY, a gdy jej brak - 'immediate')
+            flush_delay (float, optional): Opóźnienie zapisu w trybie 'delayed' (w sekundach)
+            storage_format (str, optional): Format pliku produktów - 'json' lub 'json-pretty'
+                (domyślnie zmienna środowiskowa PRODUCT_STORE_FORMAT, a gdy jej brak - 'json')
+        """
         # Konfiguracja logowania
         logging.basicConfig(
             level=logging.INFO,
@@ -30,121 +92,561 @@ class ProductManager:
         # Ścieżki do plików
         self.xml_path = os.path.join('data', 'products_latest.xml')
         self.db_path = os.path.join('data', 'products.json')
+        self.store = create_product_store(storage_backend, json_path=self.db_path, logger=self.logger,
+                                          storage_format=storage_format)
+        self.description_blobs = self.store.blobs
+        
+        # Opisy produktów nie są trzymane w rekordach - wczytywane na żądanie z pamięcią podręczną LRU
+        self._description_cache = OrderedDict()
+        self._description_cache_lock = threading.Lock()
         
         # Lista produktów
         self.products = []
+        self.last_xml_delta = None # Raport zmian z ostatniego parsowania XML
+        self.catalog_generation = 0 # Licznik zmian katalogu - rośnie przy każdej zmianie produktów
+        self._featured_categories_cache = None # (mtime, lista kategorii)
+        
+        # Indeksy do wyszukiwania produktów w czasie O(1)
+        self._products_by_id = {}
+        self._products_by_xml_id = {}
+        self._products_by_slug = {}
+        self._slug_collisions = {} # slug bazowy -> produkty, które dostały slug z sufiksem
+        
+        # Indeks kategorii: kategoria -> ID produktów (w kolejności katalogu) oraz gotowe drzewo
+        self._category_index = {}
+        self._category_tree = {}
+        self._main_categories = {}
+        self._leaf_categories = {}
+        
+        # Indeks pełnotekstowy (nazwa, producent, EAN, kategorie, opis)
+        self.search_index = SearchIndex()
+        
+        # Indeks podpowiedzi wyszukiwania - aktualizowany przyrostowo przy najbliższym zapytaniu:
+        # tylko produkty oznaczone jako zmienione, a po przebudowie indeksów - wszystkie
+        # (niezmienione produkty są pomijane bez ponownej tokenizacji)
+        self._suggestion_index = SuggestionIndex()
+        self._suggestion_stale_ids = set()
+        self._suggestion_full_sync = True
+        self._suggestion_lock = threading.Lock()
+        
+        # Katalog ofert z pliku XML (panel administracyjny) - budowany raz dla wersji pliku
+        self._xml_catalog = None
+        self._xml_catalog_lock = threading.Lock()
+        
+        # Indeks ofert XML (xml_id -> położenie oferty w pliku) dla get_product_from_xml
+        self._offer_index = None
+        self._offer_index_lock = threading.Lock()
         self.save_lock = threading.Lock() # Dodajemy blokadę
         
+        # ID produktów zmienionych/usuniętych od ostatniego zapisu (zapis pojedynczych wierszy w SQLite)
+        self._dirty_ids = set()
+        self._deleted_ids = set()
+        
+        # Grupowanie zapisów: zgłoszone zapisy są łączone i wykonywane jednym flush()
+        self.durability = (durability or os.environ.get(self.DURABILITY_ENV_VAR) or 'immediate').lower()
+        if self.durability not in self.DURABILITY_MODES:
+            raise ValueError(f"Nieznany tryb zapisu: {self.durability}")
+        self.flush_delay = self.DEFAULT_FLUSH_DELAY if flush_delay is None else float(flush_delay)
+        self._save_pending = False      # Zgłoszono zapis, którego jeszcze nie wykonano
+        self._full_save_pending = False # Zgłoszono zapis bez oznaczonych produktów - zapisz całą listę
+        self._pending_feed_digest = None # Skrót pliku XML do zapamiętania w magazynie po najbliższym zapisie
+        self._save_marks = threading.local() # Czy wątek oznaczył produkty od swojego ostatniego _save_to_db()
+        self._batch_depth = 0
+        self._flush_timer = None
+        self._pending_lock = threading.Lock()
+        if self.durability != 'immediate':
+            atexit.register(self.flush) # Nie zgub odłożonych zmian przy zamykaniu procesu
+        
+        # Wersja katalogu współdzielona z innymi procesami (catalog_version.py) - generacja
+        # widziana przy wczytaniu; późniejsze zmiany innych procesów wczytuje sync_external_changes()
+        self.catalog_version = CatalogVersion(self.CATALOG_VERSION_FILE)
+        self._instance_id = f"{os.getpid()}:{id(self):x}"
+        self._sync_lock = threading.Lock()
+        self.catalog_version.has_changed()
+        self._seen_version_generation = self.catalog_version.read().get('generation', 0)
+        
         # Próba załadowania istniejących produktów
         self._load_from_db()
+        self._rebuild_indexes()
     
     def _load_from_db(self):
-        """Ładuje produkty z lokalnej bazy danych JSON"""
-        try:
-            # Sprawdź główny plik bazy danych
-            if os.path.exists(self.db_path) and os.path.getsize(self.db_path) > 0:
-                try:
-                    with open(self.db_path, 'r', encoding='utf-8') as f:
-                        self.products = json.load(f)
-                    self.logger.info(f"Załadowano {len(self.products)} produktów z bazy danych")
-                    # Konwersja ID na stringi dla pewności, jeśli gdzieś były int
-                    for product in self.products:
-                        if 'id' in product and product['id'] is not None:
-                            product['id'] = str(product['id'])
-                    return
-                except json.JSONDecodeError:
-                    self.logger.error(f"Plik bazy danych jest uszkodzony: {self.db_path}")
-                    # Spróbuj użyć kopii zapasowej
+        """Ładuje produkty z magazynu produktów (plik JSON lub baza SQLite) jako rekordy ProductRecord"""
+        self.products = [ProductRecord.from_dict(product) for product in self.store.load()]
+        
+        # Długie opisy zapisane jeszcze w rekordach (starszy format pliku) - przenieś do plików opisów;
+        # produktom bez skrótu opisu (starszy format) uzupełnij go - zapisze się przy najbliższym zapisie
+        for product in self.products:
+            description = product.get('description')
+            if description and len(description) >= DESCRIPTION_BLOB_MIN_SIZE:
+                self._set_product_description(product, description)
+                self._mark_dirty(product['id'], explicit=False)
+            elif product.get('description_blob') and product.get('description_snippet') is None:
+                product['description_snippet'] = description_snippet(self.get_product_description(product, use_cache=False))
+                self._mark_dirty(product['id'], explicit=False)
+    
+    def _rebuild_indexes(self):
+        """Przebudowuje indeksy produktów (id, xml_id, slug, kategorie -> produkt)"""
+        self._products_by_id = {}
+        self._products_by_xml_id = {}
+        self._products_by_slug = {}
+        self._slug_collisions = {}
+        self._category_index = {}
+        self._category_tree = {}
+        self._main_categories = {}
+        self._leaf_categories = {}
+        for product in self.products:
+            self._index_product(product)
+        
+        # Indeks pełnotekstowy jest aktualizowany przyrostowo - usuń tylko produkty, których już nie ma
+        for doc_id in self.search_index.doc_ids() - self._products_by_id.keys():
+            self.search_index.remove(doc_id)
+        self._suggestion_full_sync = True
+        self._mark_catalog_changed()
+
+    def _mark_catalog_changed(self):
+        """Zwiększa licznik generacji katalogu (unieważnia dane wyliczone z produktów)"""
+        self.catalog_generation += 1
+
+    def _index_product(self, product):
+        """Dodaje produkt do indeksów i w razie potrzeby nadaje mu unikalny slug"""
+        if product.get('id') is not None:
+            self._products_by_id[str(product['id'])] = product
+            self.search_index.update(str(product['id']), lambda: self._search_fields(product),
+                                     source_key=self._search_key(product))
+        if product.get('xml_id'):
+            self._products_by_xml_id[str(product['xml_id'])] = product
+        
+        # Slug jest liczony raz i zapisywany w produkcie. Zapisany slug zostaje,
+        # dopóki nie koliduje z innym produktem (stabilne adresy URL).
+        slug = product.get('slug')
+        if not slug or slug in self._products_by_slug:
+            slug = self._unique_slug(product)
+            product['slug'] = slug
+            if product.get('id') is not None:
+                self._mark_dirty(product['id'], explicit=False)
+        self._products_by_slug[slug] = product
+        
+        base_slug = slugify(product.get('name') or '')
+        if base_slug and base_slug != slug:
+            self._slug_collisions.setdefault(base_slug, []).append(product)
+        
+        self._index_product_categories(product)
+
+    def _search_fields(self, product):
+        """Zwraca pola produktu indeksowane w wyszukiwarce pełnotekstowej"""
+        return {
+            'name': product.get('name') or '',
+            'producer': product.get('producer') or '',
+            'ean': product.get('EAN') or '',
+            'id': str(product.get('id') or ''),
+            'category': ' '.join([product.get('category') or ''] + list(product.get('category_path') or [])),
+            # Opis czytany z pliku z pominięciem pamięci podręcznej - indeksowanie nie wypiera z niej opisów
+            'description': self.get_product_description(product, use_cache=False)
+        }
+
+    def _search_key(self, product):
+        """Wersja pól indeksowanych w wyszukiwarce (opis reprezentowany przez skrót pliku opisu)"""
+        return (
+            product.get('name'), product.get('producer'), product.get('EAN'), str(product.get('id') or ''),
+            product.get('category'), tuple(product.get('category_path') or ()),
+            product.get('description_blob') or product.get('description') or ''
+        )
+
+    def get_product_description(self, product, use_cache=True):
+        """
+        Zwraca opis produktu (HTML), wczytując go na żądanie z pliku opisu.
+        
+        Args:
+            product (dict | str): Produkt lub jego ID
+            use_cache (bool): Czy korzystać z pamięci podręcznej opisów (LRU)
             
-            # Sprawdź kopię zapasową
-            backup_path = f"{self.db_path}.bak"
-            if os.path.exists(backup_path) and os.path.getsize(backup_path) > 0:
-                try:
-                    with open(backup_path, 'r', encoding='utf-8') as f:
-                        self.products = json.load(f)
-                    self.logger.warning(f"Załadowano {len(self.products)} produktów z kopii zapasowej")
-                    
-                    # Przywróć główny plik z kopii zapasowej
-                    import shutil
-                    shutil.copy2(backup_path, self.db_path)
-                    self.logger.info(f"Przywrócono główny plik bazy danych z kopii zapasowej")
-                    return
-                except json.JSONDecodeError:
-                    self.logger.error(f"Kopia zapasowa bazy danych jest uszkodzona: {backup_path}")
+        Returns:
+            str: Opis produktu lub pusty napis
+        """
+        if not isinstance(product, (ProductRecord, dict)):
+            product = self._products_by_id.get(str(product))
+            if product is None:
+                return ''
+        
+        digest = product.get('description_blob')
+        if not digest:
+            return product.get('description') or ''
+        
+        if use_cache:
+            with self._description_cache_lock:
+                description = self._description_cache.get(digest)
+                if description is not None:
+                    self._description_cache.move_to_end(digest)
+                    return description
+        
+        description = self.description_blobs.get(digest)
+        if description is None:
+            self.logger.warning(f"Brak pliku opisu {digest} produktu ID: {product.get('id')}")
+            return ''
+        
+        if use_cache:
+            with self._description_cache_lock:
+                self._description_cache[digest] = description
+                while len(self._description_cache) > self.DESCRIPTION_CACHE_SIZE:
+                    self._description_cache.popitem(last=False)
+        return description
+
+    def get_product_description_snippet(self, product):
+        """
+        Zwraca krótki fragment opisu produktu (zwykły tekst) bez wczytywania pliku opisu.
+        
+        Args:
+            product (dict): Produkt
             
-            # Jeśli nie udało się załadować z głównego pliku ani kopii zapasowej
-            self.products = []
-            self.logger.warning("Nie znaleziono pliku bazy danych lub pliki są uszkodzone. Utworzono pustą listę produktów.")
+        Returns:
+            str: Fragment opisu lub pusty napis
+        """
+        snippet = product.get('description_snippet')
+        if snippet is None and not product.get('description_blob'):
+            snippet = description_snippet(product.get('description'))
+        return snippet or ''
+
+    def _set_product_description(self, product, description):
+        """
+        Ustawia opis produktu - długi opis trafia do pliku opisu, a rekord zawiera tylko jego
+        skrót pliku i krótki fragment tekstu (description_snippet) dla list i wyszukiwarki.
+        """
+        description = description or ''
+        product['description_snippet'] = description_snippet(description)
+        if len(description) >= DESCRIPTION_BLOB_MIN_SIZE:
+            product.pop('description', None)
+            product['description_blob'] = self.description_blobs.put(description)
+        else:
+            product.pop('description_blob', None)
+            product['description'] = description
+
+    def _index_product_categories(self, product):
+        """Dodaje produkt do indeksu kategorii i do drzewa kategorii"""
+        product_id = str(product.get('id'))
+        category = product.get('category')
+        category_path = product.get('category_path') or []
+        
+        if category:
+            self._leaf_categories[category] = None
+        
+        # Produkt należy do swojej kategorii oraz do każdego poziomu ścieżki
+        for node in ([category] if category else []) + list(category_path):
+            self._category_index.setdefault(node, {})[product_id] = None
+        
+        if category_path:
+            self._main_categories[category_path[0]] = None
+            current_level = self._category_tree
+            for node in category_path:
+                current_level = current_level.setdefault(node, {})
+
+    def _unique_slug(self, product):
+        """Tworzy slug z nazwy produktu; przy kolizji dokleja ID produktu"""
+        base_slug = slugify(product.get('name') or '') or str(product.get('id'))
+        if base_slug not in self._products_by_slug:
+            return base_slug
+        
+        slug = f"{base_slug}-{product.get('id')}"
+        counter = 2
+        while slug in self._products_by_slug:
+            slug = f"{base_slug}-{product.get('id')}-{counter}"
+            counter += 1
+        return slug
+
+    def _mark_dirty(self, *product_ids, explicit=True):
+        """
+        Oznacza produkty jako zmienione - przy zapisie trafią do magazynu tylko one.
+        
+        Args:
+            explicit (bool): False dla zmian wprowadzanych przy okazji (np. nadany slug, migracja
+                opisu) - takie oznaczenie nie sprawia, że następne _save_to_db() wywołane przez
+                ten wątek bez oznaczeń zapisze tylko oznaczone produkty
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        self._dirty_ids.update(product_ids)
+        self._suggestion_stale_ids.update(product_ids)
+        if explicit:
+            self._save_marks.marked = True
+
+    def _mark_deleted(self, *product_ids):
+        """Oznacza produkty jako usunięte z katalogu"""
+        product_ids = [str(product_id) for product_id in product_ids]
+        self._deleted_ids.update(product_ids)
+        self._suggestion_stale_ids.update(product_ids)
+        self._save_marks.marked = True
+
+    def _save_to_db(self):
+        """
+        Zgłasza zapis produktów do magazynu produktów.
+        
+        W trybie 'immediate' (domyślnym) zapis jest wykonywany od razu, chyba że trwa
+        batch() - wtedy zapisy są łączone w jeden przy jego zakończeniu. W trybie
+        'request' zapis czeka na flush() wywoływane na końcu każdego żądania (app.py),
+        a w trybie 'delayed' - na zapis wykonywany flush_delay sekund po pierwszej zmianie.
+        
+        Zapis zgłoszony bez wcześniejszego _mark_dirty/_mark_deleted (w tym wątku) zapisuje
+        całą listę - także wtedy, gdy inne produkty są już oznaczone jako zmienione.
+        
+        Returns:
+            bool: Wynik zapisu lub True, jeśli zapis został odłożony
+        """
+        marked = getattr(self._save_marks, 'marked', False)
+        self._save_marks.marked = False
+        self._mark_catalog_changed()
+        with self._pending_lock:
+            if not marked:
+                self._full_save_pending = True
+                self._suggestion_full_sync = True # Nie wiadomo, które produkty się zmieniły
+            self._save_pending = True
+            deferred = self._batch_depth > 0 or self.durability != 'immediate'
+            if deferred and self.durability == 'delayed' and self._batch_depth == 0:
+                self._schedule_flush()
+        
+        if deferred:
+            return True
+        return self.flush()
+    
+    def flush(self):
+        """
+        Zapisuje do magazynu wszystkie odłożone zmiany (także w trakcie batch()).
+        
+        Jeśli produkty zostały oznaczone przez _mark_dirty/_mark_deleted, zapisywane są
+        tylko one (w bazie SQLite - pojedyncze wiersze). Bez oznaczeń, np. po zmianach
+        wprowadzonych przez skrypty serwisowe, zapisywana jest cała lista.
+        
+        Zapis odbywa się pod międzyprocesową blokadą magazynu (store.write_lock). Przed
+        przepisaniem całego pliku JSON wczytywane są zmiany innych procesów; zapis całej
+        listy bez oznaczeń (nie wiadomo, które produkty się zmieniły) nadpisuje je.
+        
+        Returns:
+            bool: True jeśli zapis się powiódł lub nie było nic do zapisania
+        """
+        # Blokada magazynu obejmuje też wpis w pliku wersji katalogu - proces, który zapisuje
+        # po nas, widzi już nasze zmiany w sync_external_changes()
+        with self.save_lock, self.store.write_lock():  # Używamy blokady dla bezpiecznego zapisu
+            with self._pending_lock:
+                merge_external = self.store.rewrites_all and self._save_pending and not self._full_save_pending
+            if merge_external:
+                # Plik JSON jest przepisywany w całości - najpierw wczytaj zmiany zapisane przez
+                # inne procesy, żeby ich nie nadpisać (niezapisane zmiany tego procesu zostają)
+                self.sync_external_changes()
+            
+            with self._pending_lock:
+                feed_digest, self._pending_feed_digest = self._pending_feed_digest, None
+                save_pending = self._save_pending
+                if save_pending:
+                    if self._flush_timer is not None:
+                        self._flush_timer.cancel()
+                        self._flush_timer = None
+                    changed_ids, self._dirty_ids = self._dirty_ids, set()
+                    deleted_ids, self._deleted_ids = self._deleted_ids, set()
+                    full_save = self._full_save_pending or not (changed_ids or deleted_ids)
+                    self._save_pending = False
+                    self._full_save_pending = False
+            
+            if not save_pending:
+                # Nic do zapisania - magazyn już odpowiada wczytanemu plikowi XML
+                if feed_digest:
+                    self.store.set_feed_digest(feed_digest)
+                return True
             
+            if full_save:
+                saved = self.store.save(self.products)
+            else:
+                saved = self.store.save(self.products, changed_ids, deleted_ids)
+            
+            if not saved:
+                # Zapis się nie powiódł - zachowaj zmiany do następnej próby
+                with self._pending_lock:
+                    self._dirty_ids |= changed_ids
+                    self._deleted_ids |= deleted_ids
+                    self._save_pending = True
+                    self._full_save_pending = self._full_save_pending or full_save
+                    self._pending_feed_digest = self._pending_feed_digest or feed_digest
+            else:
+                self._notify_catalog_saved(changed_ids, deleted_ids, full_save)
+                if feed_digest:
+                    self.store.set_feed_digest(feed_digest)
+            return saved
+    
+    def _notify_catalog_saved(self, changed_ids, deleted_ids, full_save):
+        """Informuje inne procesy o zapisanych zmianach (plik wersji katalogu)"""
+        try:
+            self.catalog_version.bump(self._instance_id, changed_ids, deleted_ids, full=full_save)
         except Exception as e:
-            self.logger.error(f"Błąd podczas ładowania produktów z bazy danych: {str(e)}")
-            self.products = []
+            self.logger.error(f"Błąd podczas zapisu wersji katalogu: {str(e)}")
     
-    def _save_to_db(self):
-        """Zapisuje produkty do lokalnej bazy danych JSON"""
-        with self.save_lock:  # Używamy blokady dla bezpiecznego zapisu
+    # Pola, których zmiana wymaga przebudowy indeksów (slug, kategorie, wyszukiwarka)
+    REINDEX_FIELDS = ('xml_id', 'slug', 'name', 'producer', 'EAN', 'category', 'category_path',
+                      'description', 'description_blob')
+
+    def sync_external_changes(self):
+        """
+        Wczytuje zmiany katalogu zapisane przez inne procesy (inne workery, skrypty, pobieranie XML).
+        
+        Wywoływane na początku każdego żądania (app.py). Gdy plik wersji katalogu się nie
+        zmienił, kosztuje jedno os.stat(). W przeciwnym razie wczytywane są ponownie tylko
+        produkty zmienione przez inne procesy; cały katalog - gdy zmiana była pełna lub
+        dziennik zmian nie sięga ostatnio widzianej generacji. Nowy plik XML parsuje i zapisuje
+        proces, który go pobrał (XmlRefreshJobs, xml_downloader.py) - tutaj wczytywane są tylko
+        zapisane przez niego zmiany, więc żądanie nigdy nie czeka na parsowanie.
+        Niezapisane zmiany tego procesu nie są nadpisywane.
+        
+        Returns:
+            bool: True jeśli katalog został zaktualizowany
+        """
+        if not self.catalog_version.has_changed():
+            return False
+        
+        with self._sync_lock:
             try:
-                self.logger.info(f"Rozpoczynam zapis {len(self.products)} produktów do bazy danych")
-                # Najpierw zapisujemy do pliku tymczasowego
-                temp_db_path = f"{self.db_path}.tmp"
-                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-                
-                # Sprawdź uprawnienia do katalogu
-                data_dir = os.path.dirname(self.db_path)
-                try:
-                    perm_test_file = os.path.join(data_dir, 'perm_test.txt')
-                    with open(perm_test_file, 'w') as f:
-                        f.write('test')
-                    os.remove(perm_test_file)
-                    self.logger.info(f"Uprawnienia do zapisu w katalogu {data_dir} są poprawne")
-                except Exception as e:
-                    self.logger.error(f"Brak uprawnień do zapisu w katalogu {data_dir}: {str(e)}")
+                generation, changes = self.catalog_version.changes_since(self._seen_version_generation)
+                if changes is not None:
+                    changes = [change for change in changes if change.get('origin') != self._instance_id]
+                self._seen_version_generation = generation
+                if changes == []:
                     return False
                 
-                self.logger.info(f"Zapisuję do pliku tymczasowego: {temp_db_path}")
-                with open(temp_db_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.products, f, ensure_ascii=False, indent=2)
-                
-                # Sprawdzamy czy plik tymczasowy został prawidłowo utworzony
-                if not os.path.exists(temp_db_path) or os.path.getsize(temp_db_path) == 0:
-                    self.logger.error(f"Nie udało się utworzyć pliku tymczasowego: {temp_db_path}")
-                    return False
-                
-                # Tworzymy kopię zapasową aktualnego pliku, jeśli istnieje
-                if os.path.exists(self.db_path):
-                    backup_path = f"{self.db_path}.bak"
-                    try:
-                        self.logger.info(f"Tworzę kopię zapasową: {backup_path}")
-                        os.replace(self.db_path, backup_path)
-                    except Exception as e:
-                        self.logger.warning(f"Nie udało się utworzyć kopii zapasowej: {str(e)}")
-                
-                # Przemianowujemy plik tymczasowy na właściwy
-                self.logger.info(f"Zastępuję plik bazy danych: {self.db_path}")
-                os.replace(temp_db_path, self.db_path)
-                
-                self.logger.info(f"Zapisano {len(self.products)} produktów do bazy danych")
-                
-                # Dodatkowa weryfikacja zapisu
-                if not os.path.exists(self.db_path):
-                    self.logger.error(f"Plik bazy danych nie został utworzony: {self.db_path}")
-                    return False
-                    
-                file_size = os.path.getsize(self.db_path)
-                if file_size == 0:
-                    self.logger.error(f"Plik bazy danych jest pusty: {self.db_path}")
-                    return False
-                
-                self.logger.info(f"Zapis zakończony sukcesem, rozmiar pliku: {file_size} bajtów")
+                if changes is None or any(change.get('full') for change in changes):
+                    self.logger.info(f"Katalog zmieniony przez inny proces - wczytuję ponownie wszystkie produkty (generacja {generation})")
+                    self._reload_from_store()
+                else:
+                    changed_ids, deleted_ids = set(), set()
+                    for change in changes:
+                        for product_id in change.get('changed', ()):
+                            changed_ids.add(product_id)
+                            deleted_ids.discard(product_id)
+                        for product_id in change.get('deleted', ()):
+                            deleted_ids.add(product_id)
+                            changed_ids.discard(product_id)
+                    if changed_ids or deleted_ids:
+                        self.logger.info(f"Katalog zmieniony przez inny proces - wczytuję {len(changed_ids)} zmienionych, "
+                                         f"usuwam {len(deleted_ids)} produktów (generacja {generation})")
+                        self._apply_external_changes(changed_ids, deleted_ids)
                 return True
             except Exception as e:
-                self.logger.error(f"Błąd podczas zapisywania produktów do bazy danych: {str(e)}")
-                import traceback
-                self.logger.error(traceback.format_exc())
+                self.logger.error(f"Błąd podczas wczytywania zmian katalogu z innych procesów: {str(e)}")
                 return False
+
+    def _pending_ids(self):
+        with self._pending_lock:
+            return self._dirty_ids | self._deleted_ids
+
+    def _reload_from_store(self):
+        """Wczytuje ponownie cały katalog z magazynu, zachowując niezapisane zmiany tego procesu"""
+        pending_ids = self._pending_ids()
+        local_products = {product_id: self._products_by_id[product_id]
+                          for product_id in pending_ids if product_id in self._products_by_id}
+        
+        self._load_from_db()
+        if pending_ids:
+            products = []
+            for product in self.products:
+                product_id = str(product.get('id'))
+                if product_id in local_products:
+                    products.append(local_products.pop(product_id))
+                elif product_id not in pending_ids: # Produkty usunięte w tym procesie pomijamy
+                    products.append(product)
+            products.extend(local_products.values()) # Produkty dodane w tym procesie
+            self.products = products
+        self._rebuild_indexes()
+
+    def _apply_external_changes(self, changed_ids, deleted_ids):
+        """Wczytuje z magazynu tylko produkty zmienione przez inne procesy i aktualizuje je w miejscu"""
+        pending_ids = self._pending_ids()
+        changed_ids = set(changed_ids) - pending_ids
+        deleted_ids = set(deleted_ids) - pending_ids
+        
+        records = self.store.load_ids(changed_ids) if changed_ids else {}
+        # Produktów, których nie ma już w magazynie, usunięto w międzyczasie
+        deleted_ids |= changed_ids - records.keys()
+        needs_reindex = bool(deleted_ids & self._products_by_id.keys())
+        
+        for product_id, data in records.items():
+            fresh = ProductRecord.from_dict(data)
+            product = self._products_by_id.get(product_id)
+            if product is None:
+                self.products.append(fresh)
+                needs_reindex = True
+                continue
+            if any(product.get(field) != fresh.get(field) for field in self.REINDEX_FIELDS):
+                needs_reindex = True
+            # Aktualizacja w miejscu - odwołania do produktu (indeksy, listy) pozostają ważne
+            for key in [key for key in product if key not in fresh]:
+                del product[key]
+            product.update(fresh)
+        
+        if deleted_ids:
+            self.products = [product for product in self.products if str(product.get('id')) not in deleted_ids]
+        self._suggestion_stale_ids.update(records.keys() | deleted_ids)
+        if needs_reindex:
+            self._rebuild_indexes()
+        else:
+            self._mark_catalog_changed()
+
+    @contextmanager
+    def batch(self):
+        """
+        Łączy wszystkie zapisy wykonane w bloku with w jeden.
+        
+        Po wyjściu z najbardziej zewnętrznego bloku zmiany są zapisywane (w trybie
+        'delayed' - planowane do zapisu). Wynik zapisu można sprawdzić, wywołując
+        flush() jeszcze wewnątrz bloku.
+        
+        Przykład:
+            with product_manager.batch():
+                for product_id in product_ids:
+                    product_manager.toggle_product_availability(product_id, True)
+                saved = product_manager.flush()
+        """
+        with self._pending_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._pending_lock:
+                self._batch_depth -= 1
+                outermost = self._batch_depth == 0
+                if outermost and self.durability == 'delayed' and self._save_pending:
+                    self._schedule_flush()
+            if outermost and self.durability != 'delayed':
+                self.flush()
+    
+    def _schedule_flush(self):
+        """Planuje zapis odłożonych zmian (tryb 'delayed'); wywoływane z blokadą _pending_lock"""
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.flush_delay, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
     
-    def parse_xml(self, xml_path=None):
-        """Parsuje plik XML i aktualizuje listę produktów"""
+    # Pola produktu pochodzące z XML - nadpisywane przy każdej aktualizacji pliku
+    XML_SOURCED_FIELDS = ('uuid', 'name', 'EAN', 'producer', 'url', 'category', 'category_path',
+                          'price_net_xml', 'original_price', 'regular_price', 'vat', 'stock')
+
+    PARSE_PROGRESS_INTERVAL = 500 # Co ile ofert parse_xml zgłasza postęp
+
+    def parse_xml(self, xml_path=None, force=False, progress=None):
+        """
+        Parsuje plik XML i scala zmiany z listą produktów (według xml_id).
+        
+        Nowe oferty są dodawane, oferty usunięte z pliku - usuwane, a w istniejących
+        produktach aktualizowane są tylko pola pochodzące z XML. Pola edytowane ręcznie
+        (dostępność, opis, narzut, dostawa itp.) pozostają bez zmian. Baza danych jest
+        zapisywana tylko wtedy, gdy coś się zmieniło. Raport zmian trafia do self.last_xml_delta.
+        
+        Jeśli skrót SHA-256 pliku jest taki sam jak skrót zapamiętany w magazynie produktów
+        (plik, który odzwierciedla zawartość magazynu), parsowanie jest pomijane (chyba że
+        force=True). Podmieniony magazyn (np. przywrócona kopia zapasowa) nie ma ważnego
+        skrótu, więc plik jest wtedy parsowany ponownie.
+        
+        Args:
+            xml_path (str, optional): Ścieżka do pliku XML (domyślnie najnowszy plik)
+            force (bool): Czy parsować plik nawet wtedy, gdy się nie zmienił
+            progress (callable, optional): Wywoływana co PARSE_PROGRESS_INTERVAL ofert
+                z liczbą przetworzonych dotąd ofert
+        
+        Returns:
+            bool: True jeśli parsowanie się powiodło, False w przeciwnym razie
+        """
         if xml_path is None:
             xml_path = self.xml_path
             
@@ -153,165 +655,93 @@ class ProductManager:
             return False
             
         try:
-            tree = ET.parse(xml_path)
-            root = tree.getroot()
+            feed_digest = self._file_sha256(xml_path)
+            if not force and self.products and feed_digest == self.store.feed_digest():
+                self.last_xml_delta = self._new_xml_delta()
+                self.logger.info(f"Plik XML {xml_path} nie zmienił się od ostatniego wczytania - pomijam parsowanie.")
+                return True
             
-            new_products = []
+            existing_products_map = self._products_by_xml_id
+            delta = self._new_xml_delta()
+            added_products = []
             parsed_xml_ids = set()
+            matched_products = [] # Istniejące produkty, których oferty są w pliku
+            updated_xml_ids = set()
+            needs_reindex = False
 
-            for product_elem in root.findall('.//offer'):
-                product = {}
-                
-                # Bezpośrednie mapowanie pól
-                xml_id = self._safe_get_xml_value(product_elem, 'id')
-                if not xml_id:
-                    self.logger.warning("Pominięto produkt w XML bez ID.")
+            # Strumieniowe parsowanie - każda oferta jest zamieniana na słownik i od razu zwalniana
+            for offer_number, product_elem in enumerate(self._iter_xml_offers(xml_path), 1):
+                if progress is not None and offer_number % self.PARSE_PROGRESS_INTERVAL == 0:
+                    progress(offer_number)
+                product = self._product_from_offer(product_elem)
+                if product is None:
                     continue
                 
+                xml_id = product['xml_id']
                 if xml_id in parsed_xml_ids:
                     self.logger.warning(f"Zduplikowany XML ID {xml_id} w pliku. Pomijam kolejne wystąpienie.")
                     continue
                 parsed_xml_ids.add(xml_id)
 
-                product['xml_id'] = xml_id # Zapisujemy ID z XML
-                product['id'] = xml_id # Używamy XML ID jako głównego ID produktu dla uproszczenia
-                                       # Jeśli potrzebne są osobne ID, trzeba będzie to dostosować
-
-                product['uuid'] = self._safe_get_xml_value(product_elem, 'uuid')
-                product['name'] = self._safe_get_xml_value(product_elem, 'name')
-                product['EAN'] = self._safe_get_xml_value(product_elem, 'EAN')
-                product['producer'] = self._safe_get_xml_value(product_elem, 'producer')
-                product['url'] = self._safe_get_xml_value(product_elem, 'url')
-                
-                # Obsługa obrazów produktu
-                product['images'] = []
-                pictures_elem = product_elem.find('pictures')
-                if pictures_elem is not None:
-                    for pic_elem in pictures_elem.findall('picture'):
-                        if pic_elem.text and pic_elem.text.strip():
-                            product['images'].append(pic_elem.text.strip())
-                
-                # Ustaw pierwszy obraz jako główny
-                if product['images']:
-                    product['image'] = product['images'][0]
-                else:
-                    product['image'] = None
-                
-                # Domyślnie produkty NIE są dostępne do sprzedaży po zaimportowaniu z XML
-                # (dostępność musi być włączona ręcznie lub przez skrypt)
-                product['available_for_sale'] = False
-                
-                # Obsługa kategorii - podział na hierarchię
-                category_text = self._safe_get_xml_value(product_elem, 'category')
-                if category_text:
-                    # Zamień encje HTML na znaki
-                    category_text = category_text.replace('&amp;gt;', '>').replace('&gt;', '>')
-                    # Podziel na poszczególne poziomy kategorii
-                    categories = [cat.strip() for cat in category_text.split('>') if cat.strip()]
-                    product['category'] = categories[-1] if categories else "Bez kategorii"
-                    product['category_path'] = categories if categories else ["Bez kategorii"]
-                else:
-                    product['category'] = "Bez kategorii"
-                    product['category_path'] = ["Bez kategorii"]
-                
-                # Obsługa cen - ceny z XML są NETTO, doliczamy VAT
-                try:
-                    price_net_xml = float(self._safe_get_xml_value(product_elem, 'price', '0'))
-                    discounted_price_net_xml = float(self._safe_get_xml_value(product_elem, 'discounted_price', '0'))
-                    
-                    if discounted_price_net_xml == 0:
-                        discounted_price_net_xml = price_net_xml
-
-                    product['price_net_xml'] = price_net_xml # Cena netto z XML
-                    
-                    # Obliczamy ceny brutto
-                    price_gross_xml = self._calculate_gross_price(price_net_xml)
-                    discounted_price_gross_xml = self._calculate_gross_price(discounted_price_net_xml)
-
-                    # Używamy discounted_price jako głównej ceny brutto, price jest teraz ceną "przed rabatem"
-                    product['price'] = discounted_price_gross_xml # Cena brutto po rabacie
-                    product['original_price'] = discounted_price_gross_xml # Cena bazowa do narzutów
-                    product['regular_price'] = price_gross_xml # Regularna cena (przed rabatem)
-                    
-                    # Domyślny narzut sklepu to 0% przy pierwszym parsowaniu
-                    product['markup_percent'] = 0.0
-
-                except ValueError as e:
-                    self.logger.error(f"Błąd konwersji ceny dla produktu XML ID {xml_id}: {e}")
-                    product['price_net_xml'] = 0.0
-                    product['price'] = 0.0
-                    product['discounted_price'] = 0.0
-                    product['original_price'] = 0.0
-                    product['markup_percent'] = 0.0
-
-                # VAT - pobieramy z XML jeśli jest, inaczej domyślny
-                vat_xml = self._safe_get_xml_value(product_elem, 'tax')
-                try:
-                    product['vat'] = int(vat_xml) if vat_xml else self.VAT_RATE
-                except ValueError:
-                    product['vat'] = self.VAT_RATE
-                
-                # Stan magazynowy
-                try:
-                    product['stock'] = int(self._safe_get_xml_value(product_elem, 'stock', '0'))
-                except ValueError:
-                    product['stock'] = 0
-                
-                # Tylko produkty dostępne na magazynie (lub z ujemnym stanem, jeśli tak ma być)
-                # Na razie dodajemy wszystkie, filtrowanie może być później
-                new_products.append(product)
-            
-            # Zachowaj dostępność produktów, opisy i narzuty z poprzedniej wersji
-            restored_count = 0
-            preserved_descriptions = 0
-            preserved_markups = 0
-            
-            if hasattr(self, 'products') and self.products:
-                existing_products_map = {str(p.get('xml_id')): p for p in self.products if p.get('xml_id')}
+                existing_product = existing_products_map.get(xml_id)
+                if existing_product is None:
+                    # Tylko produkty dostępne na magazynie (lub z ujemnym stanem, jeśli tak ma być)
+                    # Na razie dodajemy wszystkie, filtrowanie może być później
+                    added_products.append(product)
+                    delta['added'].append(xml_id)
+                    continue
                 
-                for new_product in new_products:
-                    xml_id = str(new_product.get('xml_id'))
-                    existing_product = existing_products_map.get(xml_id)
-                    
-                    if existing_product:
-                        # Zachowaj status dostępności
-                        if existing_product.get('available_for_sale', False):
-                            new_product['available_for_sale'] = True
-                            restored_count += 1
-                        
-                        # Zachowaj opis produktu
-                        if 'description' in existing_product and existing_product['description']:
-                            new_product['description'] = existing_product['description']
-                            preserved_descriptions += 1
-                            
-                        # Zachowaj narzut sklepu i zaktualizuj cenę, jeśli narzut istnieje
-                        if 'markup_percent' in existing_product and existing_product['markup_percent'] is not None:
-                            markup_percent = float(existing_product['markup_percent'])
-                            new_product['markup_percent'] = markup_percent
-                            
-                            # Cena bazowa do narzutu to cena brutto z XML (czyli new_product['original_price'])
-                            base_gross_price_for_markup = new_product['original_price'] 
-                            
-                            final_price_with_markup = round(base_gross_price_for_markup * (1 + markup_percent / 100), 2)
-                            new_product['price'] = final_price_with_markup
-                            # discounted_price również powinno być przeliczone jeśli jest równe cenie bazowej
-                            if new_product['discounted_price'] == base_gross_price_for_markup : # Porównujemy z ceną brutto z XML
-                                new_product['discounted_price'] = final_price_with_markup
-                            preserved_markups +=1
-                        
-                        # Zachowaj inne istotne pola, które mogły być ręcznie edytowane
-                        for field in ['delivery_time', 'delivery_cost', 'custom_name', 'custom_category', 'images', 'image']: # Dodaj inne pola wg potrzeb
-                            if field in existing_product and existing_product[field] is not None:
-                                new_product[field] = existing_product[field]
+                matched_products.append(existing_product)
+                changed_fields = self._merge_xml_product(existing_product, product)
+                if changed_fields & {'name', 'category', 'category_path', 'producer', 'EAN'}:
+                    needs_reindex = True
+                if changed_fields:
+                    delta['updated'].append(xml_id)
+                    updated_xml_ids.add(xml_id)
+                    for field in ('stock', 'name'):
+                        if field in changed_fields:
+                            delta[f'{field}_changed'].append(xml_id)
+            
+            # Ceny sprzedaży (cena bazowa z XML + zapisany narzut) - jednym przebiegiem dla całego pliku
+            for product in self._reprice_products(matched_products):
+                xml_id = str(product['xml_id'])
+                if xml_id not in updated_xml_ids:
+                    delta['updated'].append(xml_id)
+                    updated_xml_ids.add(xml_id)
+                delta['price_changed'].append(xml_id)
+            
+            # Produkty z XML, których nie ma już w pliku, są usuwane.
+            # Produkty dodane ręcznie (bez xml_id) zostają nietknięte.
+            delta['removed'] = [xml_id for xml_id in existing_products_map if xml_id not in parsed_xml_ids]
+            self._mark_deleted(*(existing_products_map[xml_id]['id'] for xml_id in delta['removed']))
+            self._mark_dirty(*(existing_products_map[xml_id]['id'] for xml_id in delta['updated']))
+            if delta['removed']:
+                self.products = [p for p in self.products
+                                 if not p.get('xml_id') or str(p.get('xml_id')) in parsed_xml_ids]
+            
+            if added_products:
+                self.products.extend(added_products)
+                self._assign_internal_ids() # Przypisz unikalne ID wewnętrzne jeśli XML ID nie wystarczą
+                self._mark_dirty(*(product['id'] for product in added_products))
+            
+            if added_products or delta['removed'] or needs_reindex:
+                self._rebuild_indexes()
+            
+            self.last_xml_delta = delta
+            
+            if delta['added'] or delta['removed'] or delta['updated']:
+                self._save_to_db()
+            else:
+                self.logger.info("Brak zmian w ofertach XML - pomijam zapis bazy danych.")
             
-            self.products = new_products
-            self._assign_internal_ids() # Przypisz unikalne ID wewnętrzne jeśli XML ID nie wystarczą
-            self._save_to_db()
+            # Skrót trafia do magazynu dopiero, gdy magazyn odpowiada zawartości pliku
+            self._remember_feed_digest(feed_digest)
             
-            self.logger.info(f"Pomyślnie sparsowano plik XML {xml_path}, znaleziono {len(new_products)} produktów.")
-            self.logger.info(f"Przywrócono dostępność dla {restored_count} produktów.")
-            self.logger.info(f"Zachowano opisy dla {preserved_descriptions} produktów.")
-            self.logger.info(f"Zachowano i zastosowano narzuty dla {preserved_markups} produktów.")
+            self.logger.info(f"Pomyślnie sparsowano plik XML {xml_path}, znaleziono {len(parsed_xml_ids)} produktów.")
+            self.logger.info(f"Dodano {len(delta['added'])}, usunięto {len(delta['removed'])}, "
+                             f"zaktualizowano {len(delta['updated'])} produktów "
+                             f"(cena: {len(delta['price_changed'])}, stan: {len(delta['stock_changed'])}, "
+                             f"nazwa: {len(delta['name_changed'])}).")
             return True
             
         except ET.ParseError as e:
@@ -321,6 +751,208 @@ class ProductManager:
             self.logger.error(f"Nieoczekiwany błąd podczas parsowania pliku XML {xml_path}: {str(e)}")
             return False
 
+    @staticmethod
+    def _new_xml_delta():
+        """Zwraca pusty raport zmian z parsowania XML"""
+        return {
+            'added': [],
+            'removed': [],
+            'updated': [],
+            'price_changed': [],
+            'stock_changed': [],
+            'name_changed': []
+        }
+
+    @staticmethod
+    def _file_sha256(path, chunk_size=1024 * 1024):
+        """Oblicza skrót SHA-256 pliku, czytając go porcjami"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _remember_feed_digest(self, feed_digest):
+        """
+        Zapamiętuje w magazynie skrót wczytanego pliku XML - od razu, jeśli nie ma
+        niezapisanych zmian, a w przeciwnym razie po najbliższym udanym zapisie (flush).
+        """
+        with self._pending_lock:
+            self._pending_feed_digest = feed_digest
+            if self._save_pending:
+                return
+            self._pending_feed_digest = None
+        self.store.set_feed_digest(feed_digest)
+
+    def _merge_xml_product(self, existing_product, xml_product):
+        """
+        Przenosi pola pochodzące z XML do istniejącego produktu.
+        
+        Dostępność, opis, narzut, dane dostawy i zdjęcia pozostają bez zmian,
+        a cena sprzedaży jest przeliczana z ceny bazowej i zapisanego narzutu.
+        
+        Args:
+            existing_product (dict): Produkt z bazy danych (modyfikowany w miejscu)
+            xml_product (dict): Produkt zbudowany z aktualnej oferty XML
+            
+        Returns:
+            set: Nazwy zmienionych pól (pusty zbiór, jeśli produkt się nie zmienił)
+        """
+        changed_fields = set()
+        
+        for field in self.XML_SOURCED_FIELDS:
+            if field in xml_product and existing_product.get(field) != xml_product[field]:
+                existing_product[field] = xml_product[field]
+                changed_fields.add(field)
+        
+        # Zmiana nazwy oznacza nowy slug - zostanie nadany przy przebudowie indeksów
+        if 'name' in changed_fields:
+            existing_product.pop('slug', None)
+        
+        # Zdjęcia bierzemy z XML tylko wtedy, gdy produkt jeszcze ich nie ma
+        for field in ('images', 'image'):
+            if existing_product.get(field) is None and xml_product.get(field) is not None:
+                existing_product[field] = xml_product[field]
+                changed_fields.add(field)
+        
+        # Cena sprzedaży (original_price z XML + zapisany narzut) jest przeliczana dla wszystkich
+        # produktów naraz w parse_xml (_reprice_products)
+        return changed_fields
+
+    def _iter_xml_offers(self, xml_path):
+        """
+        Strumieniowo iteruje po elementach <offer> pliku XML (ET.iterparse).
+        
+        Każdy element jest usuwany z drzewa zaraz po przetworzeniu przez wywołującego,
+        dzięki czemu zużycie pamięci nie zależy od rozmiaru pliku.
+        
+        Args:
+            xml_path (str): Ścieżka do pliku XML
+            
+        Yields:
+            xml.etree.ElementTree.Element: Kompletny element <offer>
+        """
+        parents = []
+        for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+            
+            parents.pop()
+            if elem.tag != 'offer':
+                continue
+            
+            yield elem
+            
+            # Zwolnij przetworzoną ofertę - wyczyść ją i odepnij od rodzica
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+    def _product_from_offer(self, product_elem):
+        """
+        Zamienia element <offer> z XML na rekord produktu.
+        
+        Args:
+            product_elem (xml.etree.ElementTree.Element): Element <offer>
+            
+        Returns:
+            ProductRecord: Rekord produktu lub None, jeśli oferta nie ma ID
+        """
+        product = ProductRecord()
+        
+        # Bezpośrednie mapowanie pól
+        xml_id = self._safe_get_xml_value(product_elem, 'id')
+        if not xml_id:
+            self.logger.warning("Pominięto produkt w XML bez ID.")
+            return None
+
+        product['xml_id'] = xml_id # Zapisujemy ID z XML
+        product['id'] = xml_id # Używamy XML ID jako głównego ID produktu dla uproszczenia
+                               # Jeśli potrzebne są osobne ID, trzeba będzie to dostosować
+
+        product['uuid'] = self._safe_get_xml_value(product_elem, 'uuid')
+        product['name'] = self._safe_get_xml_value(product_elem, 'name')
+        product['EAN'] = self._safe_get_xml_value(product_elem, 'EAN')
+        product['producer'] = self._safe_get_xml_value(product_elem, 'producer')
+        product['url'] = self._safe_get_xml_value(product_elem, 'url')
+        
+        # Obsługa obrazów produktu
+        product['images'] = []
+        pictures_elem = product_elem.find('pictures')
+        if pictures_elem is not None:
+            for pic_elem in pictures_elem.findall('picture'):
+                if pic_elem.text and pic_elem.text.strip():
+                    product['images'].append(pic_elem.text.strip())
+        
+        # Ustaw pierwszy obraz jako główny
+        if product['images']:
+            product['image'] = product['images'][0]
+        else:
+            product['image'] = None
+        
+        # Domyślnie produkty NIE są dostępne do sprzedaży po zaimportowaniu z XML
+        # (dostępność musi być włączona ręcznie lub przez skrypt)
+        product['available_for_sale'] = False
+        
+        # Obsługa kategorii - podział na hierarchię
+        category_text = self._safe_get_xml_value(product_elem, 'category')
+        if category_text:
+            # Zamień encje HTML na znaki
+            category_text = category_text.replace('&amp;gt;', '>').replace('&gt;', '>')
+            # Podziel na poszczególne poziomy kategorii
+            categories = [cat.strip() for cat in category_text.split('>') if cat.strip()]
+            product['category'] = categories[-1] if categories else "Bez kategorii"
+            product['category_path'] = categories if categories else ["Bez kategorii"]
+        else:
+            product['category'] = "Bez kategorii"
+            product['category_path'] = ["Bez kategorii"]
+        
+        # VAT - pobieramy z XML jeśli jest, inaczej domyślny
+        vat_xml = self._safe_get_xml_value(product_elem, 'tax')
+        try:
+            product['vat'] = normalize_vat_rate(vat_xml) if vat_xml else self.VAT_RATE
+        except ValueError:
+            product['vat'] = self.VAT_RATE
+        
+        # Obsługa cen - ceny z XML są NETTO, doliczamy VAT (stawka z oferty)
+        try:
+            price_net_xml = float(self._safe_get_xml_value(product_elem, 'price', '0'))
+            discounted_price_net_xml = float(self._safe_get_xml_value(product_elem, 'discounted_price', '0'))
+            
+            if discounted_price_net_xml == 0:
+                discounted_price_net_xml = price_net_xml
+
+            product['price_net_xml'] = price_net_xml # Cena netto z XML
+            
+            # Obliczamy ceny brutto
+            price_gross_xml = self._calculate_gross_price(price_net_xml, product['vat'])
+            discounted_price_gross_xml = self._calculate_gross_price(discounted_price_net_xml, product['vat'])
+
+            # Używamy discounted_price jako głównej ceny brutto, price jest teraz ceną "przed rabatem"
+            product['price'] = discounted_price_gross_xml # Cena brutto po rabacie
+            product['original_price'] = discounted_price_gross_xml # Cena bazowa do narzutów
+            product['regular_price'] = price_gross_xml # Regularna cena (przed rabatem)
+            
+            # Domyślny narzut sklepu to 0% przy pierwszym parsowaniu
+            product['markup_percent'] = 0.0
+
+        except ValueError as e:
+            self.logger.error(f"Błąd konwersji ceny dla produktu XML ID {xml_id}: {e}")
+            product['price_net_xml'] = 0.0
+            product['price'] = 0.0
+            product['discounted_price'] = 0.0
+            product['original_price'] = 0.0
+            product['markup_percent'] = 0.0
+
+        # Stan magazynowy
+        try:
+            product['stock'] = int(self._safe_get_xml_value(product_elem, 'stock', '0'))
+        except ValueError:
+            product['stock'] = 0
+        
+        return product
+
     def _assign_internal_ids(self):
         """Przypisuje unikalne ID wewnętrzne, jeśli 'id' nie jest jeszcze unikalne lub nie istnieje."""
         # Jeśli używamy xml_id jako 'id', ta funkcja może nie być potrzebna
@@ -346,15 +978,29 @@ class ProductManager:
             self.logger.warning(f"Błąd podczas pobierania wartości XML dla tagu '{tag}': {e}")
         return default_value
 
-    def _calculate_gross_price(self, net_price):
-        """Oblicza cenę brutto na podstawie ceny netto i stawki VAT."""
+    def _calculate_gross_price(self, net_price, vat_rate=None):
+        """Oblicza cenę brutto na podstawie ceny netto i stawki VAT (domyślnie VAT_RATE)."""
         try:
-            vat_multiplier = 1 + (self.VAT_RATE / 100)
-            gross_price = round(float(net_price) * vat_multiplier, 2)
-            return gross_price
+            return gross_price(net_price, self.VAT_RATE if vat_rate is None else vat_rate)
         except Exception as e:
             self.logger.error(f"Błąd podczas obliczania ceny brutto: {e}")
             return 0.0
+
+    def _reprice_products(self, products, markups=None, base_prices=None):
+        """
+        Przelicza ceny sprzedaży produktów jednym przebiegiem (pricing_engine.PriceColumns).
+        
+        Args:
+            products (list): Produkty do przeliczenia
+            markups (optional): Nowe narzuty - lista lub jedna wartość dla wszystkich (domyślnie zapisane narzuty)
+            base_prices (optional): Nowe ceny bazowe brutto (domyślnie original_price produktów)
+            
+        Returns:
+            list: Produkty, w których zmieniła się cena, narzut lub cena bazowa
+        """
+        if not products:
+            return []
+        return PriceColumns(products, default_vat_rate=self.VAT_RATE).apply_sale_prices(markups, base_prices)
     
     def update_product(self, product_id, price=None, markup_percent=None, vat=None, delivery_time=None, delivery_cost=None, available_for_sale=None):
         """
@@ -377,11 +1023,7 @@ class ProductManager:
             self.logger.info(f"Parametry aktualizacji: price={price}, markup_percent={markup_percent}, vat={vat}, delivery_time={delivery_time}, delivery_cost={delivery_cost}, available_for_sale={available_for_sale}")
             
             # Znajdź produkt
-            product = None
-            for p in self.products:
-                if str(p.get('id')) == str(product_id):
-                    product = p
-                    break
+            product = self._products_by_id.get(str(product_id))
             
             if not product:
                 self.logger.error(f"Nie znaleziono produktu o ID {product_id}")
@@ -392,7 +1034,7 @@ class ProductManager:
                 product['available_for_sale'] = available_for_sale
             
             if vat is not None:
-                product['vat'] = float(vat)
+                product['vat'] = normalize_vat_rate(vat)
             
             if delivery_time is not None:
                 product['delivery_time'] = delivery_time
@@ -403,36 +1045,200 @@ class ProductManager:
             # Logika aktualizacji ceny
             if markup_percent is not None:
                 product['markup_percent'] = float(markup_percent)
-                original_price = product.get('original_price', 0)
-                product['price'] = round(original_price * (1 + float(markup_percent) / 100), 2)
+                product['price'] = sale_price(product.get('original_price', 0), markup_percent)
             elif price is not None:
                 product['price'] = float(price)
                 # Oblicz nowy narzut na podstawie podanej ceny
-                original_price = product.get('original_price')
-                if original_price and original_price > 0:
-                    product['markup_percent'] = round(((float(price) / original_price) - 1) * 100, 2)
+                product['markup_percent'] = markup_from_price(price, product.get('original_price'))
+            
+            # Aktualizuj datę modyfikacji
+            product['last_modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Zapisz zmiany
+            self._mark_dirty(product['id'])
+            self.logger.info(f"Próba zapisu produktu {product.get('name')} (ID: {product_id}) do bazy danych")
+            save_result = self._save_to_db()
+            if save_result:
+                self.logger.info(f"Produkt {product.get('name')} (ID: {product_id}) został zaktualizowany")
+                return True
+            else:
+                self.logger.error(f"Nie udało się zapisać produktu {product.get('name')} (ID: {product_id}) do bazy danych")
+                return False
+        
+        except Exception as e:
+            self.logger.error(f"Błąd podczas aktualizacji produktu (ID: {product_id}): {str(e)}")
+            import traceback
+            self.logger.error(traceback.format_exc())
+            return False
+        
+    # Pola zmieniane przez bulk_update_products - klucz operacji -> pole produktu
+    BULK_UPDATE_FIELDS = {
+        'price': 'price',
+        'markup': 'markup_percent',
+        'vat': 'vat',
+        'delivery_cost': 'delivery_cost',
+        'delivery_time': 'delivery_time',
+    }
+    BULK_SET_ONLY_FIELDS = ('vat', 'delivery_time') # Pola, dla których jedyną operacją jest 'set'
+
+    def _parse_bulk_operations(self, operations):
+        """
+        Sprawdza operacje bulk_update_products i sprowadza je do postaci {klucz: (operacja, wartość)}.
+        
+        Raises:
+            ValueError: Nieznany klucz, nieznana operacja lub niepoprawna wartość
+        """
+        parsed = {}
+        for key, descriptor in (operations or {}).items():
+            if key not in self.BULK_UPDATE_FIELDS:
+                raise ValueError(f"Nieobsługiwane pole masowej aktualizacji: {key}")
+            if isinstance(descriptor, dict):
+                operation, value = descriptor.get('operation'), descriptor.get('value')
+            else:
+                operation, value = 'set', descriptor
+            # Pusty opis operacji (np. niewypełnione pole formularza) jest pomijany
+            if not operation or value is None or value == '':
+                continue
+            
+            if key in self.BULK_SET_ONLY_FIELDS and operation != 'set':
+                raise ValueError(f"Pole {key} można tylko ustawić (operacja: {operation})")
+            if key == 'delivery_time':
+                parsed[key] = (operation, str(value))
+                continue
+            if key == 'vat':
+                # Stawka VAT jest liczbą całkowitą (jak w update_product i przy parsowaniu XML)
+                parsed[key] = (operation, normalize_vat_rate(value))
+                continue
+            if operation not in OPERATIONS:
+                raise ValueError(f"Nieznana operacja dla pola {key}: {operation}")
+            try:
+                parsed[key] = (operation, float(value))
+            except (TypeError, ValueError):
+                raise ValueError(f"Niepoprawna wartość dla pola {key}: {value}")
+        return parsed
+
+    def bulk_update_products(self, product_ids, operations, available_for_sale=None):
+        """
+        Zmienia wiele produktów naraz jednymi operacjami i zapisuje zmiany jednym zapisem bazy danych.
+        
+        Operacje są podawane jako {klucz: {'operation': operacja, 'value': wartość}} (sama
+        wartość oznacza 'set'). Klucze: 'price', 'markup', 'delivery_cost' (operacje add,
+        subtract, percent_increase, percent_decrease, set) oraz 'vat' (liczba całkowita)
+        i 'delivery_time' (tylko set).
+        Tak jak w update_product: zmiana narzutu przelicza cenę z ceny bazowej, a zmiana ceny
+        (bez zmiany narzutu) - narzut.
+        
+        Przykład:
+            product_manager.bulk_update_products(['1', '2'], {
+                'markup': {'operation': 'add', 'value': 5},
+                'delivery_time': '3 dni'
+            })
+        
+        Args:
+            product_ids (iterable): ID produktów
+            operations (dict): Operacje do wykonania
+            available_for_sale (bool, optional): Nowa dostępność produktów (None - bez zmian)
+            
+        Returns:
+            dict: {'success': wynik zapisu, 'changes': {ID: {pole: {'old': stara, 'new': nowa}}},
+                'unchanged': [ID produktów bez zmian], 'not_found': [nieznane ID]}
+            
+        Raises:
+            ValueError: Niepoprawne operacje (żaden produkt nie jest wtedy zmieniany)
+        """
+        parsed = self._parse_bulk_operations(operations)
+        result = {'success': True, 'changes': {}, 'unchanged': [], 'not_found': []}
+        
+        products = []
+        seen = set()
+        for product_id in product_ids:
+            product = self._products_by_id.get(str(product_id))
+            if not product:
+                result['not_found'].append(str(product_id))
+            elif product['id'] not in seen:
+                seen.add(product['id'])
+                products.append(product)
+        
+        # Stan sprzed zmian - przywracany, jeśli zapis się nie powiedzie
+        backup = self._backup_fields(products, tuple(self.BULK_UPDATE_FIELDS.values()) +
+                                     ('available_for_sale', 'last_modified'))
+        modified_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for product in products:
+            new_values = {}
+            for key, (operation, value) in parsed.items():
+                field = self.BULK_UPDATE_FIELDS[key]
+                if key in self.BULK_SET_ONLY_FIELDS:
+                    new_values[field] = value
                 else:
-                    product['markup_percent'] = 0.0
+                    new_values[field] = apply_operation(product.get(field, 0), operation, value)
+            
+            # Logika ceny jak w update_product - narzut ma pierwszeństwo przed ceną
+            if 'markup' in parsed:
+                new_values['price'] = sale_price(product.get('original_price', 0), new_values['markup_percent'])
+            elif 'price' in parsed:
+                new_values['markup_percent'] = markup_from_price(new_values['price'], product.get('original_price'))
+            if available_for_sale is not None:
+                new_values['available_for_sale'] = bool(available_for_sale)
+            
+            diff = {}
+            for field, new_value in new_values.items():
+                old_value = product.get(field)
+                if old_value != new_value:
+                    diff[field] = {'old': old_value, 'new': new_value}
+                    product[field] = new_value
+            
+            if diff:
+                product['last_modified'] = modified_at
+                result['changes'][product['id']] = diff
+            else:
+                result['unchanged'].append(product['id'])
+        
+        if result['changes']:
+            self._mark_dirty(*result['changes'])
+            result['success'] = self._save_to_db()
+            if not result['success']:
+                self._restore_fields(backup)
+                self.logger.error(f"Nie udało się zapisać masowej aktualizacji {len(result['changes'])} produktów")
+        
+        self.logger.info(f"Masowa aktualizacja produktów: zmienione {len(result['changes'])}, "
+                         f"bez zmian {len(result['unchanged'])}, nieznalezione {len(result['not_found'])}, "
+                         f"operacje: {parsed}")
+        return result
+
+    def toggle_product_availability(self, product_id, available=None):
+        """
+        Zmienia dostępność produktu w sklepie.
+        
+        Args:
+            product_id (str): ID produktu
+            available (bool, optional): Nowa dostępność; None przełącza na stan przeciwny
+            
+        Returns:
+            dict: Zaktualizowany produkt lub None w przypadku błędu
+        """
+        try:
+            product = self._products_by_id.get(str(product_id))
+            if not product:
+                self.logger.error(f"Nie znaleziono produktu o ID {product_id}")
+                return None
             
-            # Aktualizuj datę modyfikacji
+            if available is None:
+                available = not product.get('available_for_sale', False)
+            product['available_for_sale'] = bool(available)
             product['last_modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
-            # Zapisz zmiany
-            self.logger.info(f"Próba zapisu produktu {product.get('name')} (ID: {product_id}) do bazy danych")
-            save_result = self._save_to_db()
-            if save_result:
-                self.logger.info(f"Produkt {product.get('name')} (ID: {product_id}) został zaktualizowany")
-                return True
-            else:
-                self.logger.error(f"Nie udało się zapisać produktu {product.get('name')} (ID: {product_id}) do bazy danych")
-                return False
+            self._mark_dirty(product['id'])
+            if not self._save_to_db():
+                self.logger.error(f"Nie udało się zapisać dostępności produktu ID: {product_id}")
+                return None
+            
+            self.logger.info(f"Produkt {product.get('name')} (ID: {product_id}) - dostępność: {product['available_for_sale']}")
+            return product
         
         except Exception as e:
-            self.logger.error(f"Błąd podczas aktualizacji produktu (ID: {product_id}): {str(e)}")
-            import traceback
-            self.logger.error(traceback.format_exc())
-            return False
-        
+            self.logger.error(f"Błąd podczas zmiany dostępności produktu (ID: {product_id}): {str(e)}")
+            return None
+    
     def update_product_description(self, product_id, description):
         """
         Aktualizuje opis produktu w bazie danych.
@@ -446,23 +1252,22 @@ class ProductManager:
         """
         try:
             # Znajdź produkt
-            product = None
-            for p in self.products:
-                if str(p.get('id')) == str(product_id):
-                    product = p
-                    break
+            product = self._products_by_id.get(str(product_id))
             
             if not product:
                 self.logger.error(f"Nie znaleziono produktu o ID {product_id}")
                 return False
             
             # Aktualizuj opis
-            product['description'] = description
+            self._set_product_description(product, description)
+            self.search_index.update(str(product['id']), lambda: self._search_fields(product),
+                                     source_key=self._search_key(product))
             
             # Aktualizuj datę modyfikacji
             product['last_modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
             # Zapisz zmiany
+            self._mark_dirty(product['id'])
             self._save_to_db()
             self.logger.info(f"Opis produktu {product.get('name')} (ID: {product_id}) został zaktualizowany")
             return True
@@ -475,6 +1280,9 @@ class ProductManager:
         """
         Pobiera dane produktu bezpośrednio z pliku XML na podstawie ID.
         
+        Oferta jest odczytywana przez indeks ofert (xml_id -> położenie w pliku),
+        więc parsowany jest tylko jej fragment, a nie cały dokument.
+        
         Args:
             product_id (str): ID produktu do znalezienia
             
@@ -485,61 +1293,23 @@ class ProductManager:
             if not os.path.exists(self.xml_path):
                 self.logger.error(f"Plik XML nie istnieje: {self.xml_path}")
                 return None
-                
-            tree = ET.parse(self.xml_path)
-            root = tree.getroot()
-            
-            # Znajdź produkt po ID
-            for product_elem in root.findall('.//offer'):
-                xml_id = self._safe_get_xml_value(product_elem, 'id')
-                if xml_id and str(xml_id) == str(product_id):
-                    # Mapuj dane z XML do słownika
-                    product = {
-                        'xml_id': xml_id,
-                        'id': xml_id,
-                        'name': self._safe_get_xml_value(product_elem, 'name'),
-                        'EAN': self._safe_get_xml_value(product_elem, 'EAN'),
-                        'producer': self._safe_get_xml_value(product_elem, 'producer'),
-                        'url': self._safe_get_xml_value(product_elem, 'url'),
-                        'category': self._safe_get_xml_value(product_elem, 'category'),
-                    }
-                    
-                    # Pobierz obrazy produktu
-                    product['images'] = []
-                    pictures_elem = product_elem.find('pictures')
-                    if pictures_elem is not None:
-                        for pic_elem in pictures_elem.findall('picture'):
-                            if pic_elem.text and pic_elem.text.strip():
-                                product['images'].append(pic_elem.text.strip())
-                    
-                    # Ustaw pierwszy obraz jako główny
-                    if product['images']:
-                        product['image'] = product['images'][0]
-                    else:
-                        product['image'] = None
-                    
-                    try:
-                        price_net_xml = float(self._safe_get_xml_value(product_elem, 'price', '0'))
-                        discounted_price_net_xml = float(self._safe_get_xml_value(product_elem, 'discounted_price', '0'))
-                        
-                        if discounted_price_net_xml == 0:
-                            discounted_price_net_xml = price_net_xml
-                            
-                        product['price'] = self._calculate_gross_price(discounted_price_net_xml)
-                        product['regular_price'] = self._calculate_gross_price(price_net_xml)
-                    except ValueError:
-                        product['price'] = 0.0
-                        product['regular_price'] = 0.0
-                        
-                    try:
-                        product['stock'] = int(self._safe_get_xml_value(product_elem, 'stock', '0'))
-                    except ValueError:
-                        product['stock'] = 0
-                        
-                    return product
             
-            self.logger.warning(f"Produkt o ID {product_id} nie został znaleziony w XML")
-            return None
+            product_elem = None
+            offer_index = self._get_offer_index()
+            if offer_index is not None:
+                product_elem = offer_index.read_offer(product_id)
+            else:
+                # Brak indeksu - przeszukaj plik strumieniowo
+                for elem in self._iter_xml_offers(self.xml_path):
+                    xml_id = self._safe_get_xml_value(elem, 'id')
+                    if xml_id and str(xml_id) == str(product_id):
+                        product_elem = elem
+                        break
+            
+            if product_elem is None:
+                self.logger.warning(f"Produkt o ID {product_id} nie został znaleziony w XML")
+                return None
+            return self._xml_offer_to_product(product_elem)
             
         except ET.ParseError as e:
             self.logger.error(f"Błąd parsowania XML ({self.xml_path}): {e}")
@@ -548,6 +1318,231 @@ class ProductManager:
             self.logger.error(f"Nieoczekiwany błąd podczas pobierania produktu z XML (ID: {product_id}): {str(e)}")
             return None
     
+    def _get_offer_index(self):
+        """
+        Zwraca indeks ofert pliku XML (plik .idx budowany przy pobieraniu XML).
+        
+        Jeśli indeksu brak lub nie pasuje do bieżącego pliku XML, jest budowany ponownie.
+        
+        Returns:
+            OfferIndex: Indeks ofert lub None, jeśli nie udało się go zbudować
+        """
+        offer_index = self._offer_index
+        if offer_index is not None and offer_index.is_current():
+            return offer_index
+        
+        with self._offer_index_lock:
+            offer_index = self._offer_index
+            if offer_index is None or not offer_index.is_current():
+                try:
+                    new_index = load_offer_index(self.xml_path)
+                except Exception as e:
+                    self.logger.error(f"Błąd podczas budowania indeksu ofert XML: {e}")
+                    return None
+                if offer_index is not None:
+                    offer_index.close()
+                self._offer_index = offer_index = new_index
+        return offer_index
+    
+    def _xml_offer_to_product(self, product_elem):
+        """Mapuje element <offer> na słownik produktu zwracany przez get_product_from_xml"""
+        xml_id = self._safe_get_xml_value(product_elem, 'id')
+        product = {
+            'xml_id': xml_id,
+            'id': xml_id,
+            'name': self._safe_get_xml_value(product_elem, 'name'),
+            'EAN': self._safe_get_xml_value(product_elem, 'EAN'),
+            'producer': self._safe_get_xml_value(product_elem, 'producer'),
+            'url': self._safe_get_xml_value(product_elem, 'url'),
+            'category': self._safe_get_xml_value(product_elem, 'category'),
+        }
+        
+        # Pobierz obrazy produktu
+        product['images'] = []
+        pictures_elem = product_elem.find('pictures')
+        if pictures_elem is not None:
+            for pic_elem in pictures_elem.findall('picture'):
+                if pic_elem.text and pic_elem.text.strip():
+                    product['images'].append(pic_elem.text.strip())
+        
+        # Ustaw pierwszy obraz jako główny
+        if product['images']:
+            product['image'] = product['images'][0]
+        else:
+            product['image'] = None
+        
+        try:
+            vat_rate = normalize_vat_rate(self._safe_get_xml_value(product_elem, 'tax') or self.VAT_RATE)
+        except ValueError:
+            vat_rate = self.VAT_RATE
+        
+        try:
+            price_net_xml = float(self._safe_get_xml_value(product_elem, 'price', '0'))
+            discounted_price_net_xml = float(self._safe_get_xml_value(product_elem, 'discounted_price', '0'))
+            
+            if discounted_price_net_xml == 0:
+                discounted_price_net_xml = price_net_xml
+                
+            product['price'] = self._calculate_gross_price(discounted_price_net_xml, vat_rate)
+            product['regular_price'] = self._calculate_gross_price(price_net_xml, vat_rate)
+        except ValueError:
+            product['price'] = 0.0
+            product['regular_price'] = 0.0
+            
+        try:
+            product['stock'] = int(self._safe_get_xml_value(product_elem, 'stock', '0'))
+        except ValueError:
+            product['stock'] = 0
+            
+        return product
+    
+    def _offer_net_prices(self, product_elem):
+        """Zwraca (cena netto, cena netto po rabacie) oferty XML; brak rabatu = cena netto"""
+        price_net_xml = float(self._safe_get_xml_value(product_elem, 'price', '0'))
+        discounted_price_net_xml = float(self._safe_get_xml_value(product_elem, 'discounted_price', '0'))
+        return price_net_xml, discounted_price_net_xml or price_net_xml
+
+    def _read_feed_prices(self, xml_ids, progress=None):
+        """
+        Odczytuje ceny netto ofert z bieżącego pliku XML - każdą ofertę jeden raz.
+        
+        Niewiele ofert jest odczytywanych przez indeks ofert (tylko ich fragmenty pliku),
+        a większa część pliku - jednym strumieniowym przebiegiem.
+        
+        Args:
+            xml_ids (iterable): ID ofert
+            progress (callable, optional): progress(przetworzone, wszystkie) przy przebiegu strumieniowym
+            
+        Returns:
+            dict: xml_id -> (cena netto, cena netto po rabacie); oferty, których nie ma
+                w pliku lub mają niepoprawną cenę, są pomijane
+        """
+        wanted = set(str(xml_id) for xml_id in xml_ids)
+        prices = {}
+        if not wanted or not os.path.exists(self.xml_path):
+            return prices
+        
+        offer_index = self._get_offer_index()
+        if offer_index is not None and len(wanted) <= len(offer_index) // 4:
+            for xml_id in wanted:
+                try:
+                    product_elem = offer_index.read_offer(xml_id)
+                    if product_elem is not None:
+                        prices[xml_id] = self._offer_net_prices(product_elem)
+                except (ET.ParseError, ValueError) as e:
+                    self.logger.error(f"Błąd odczytu ceny oferty XML ID {xml_id}: {e}")
+            return prices
+        
+        total = len(offer_index) if offer_index is not None else None
+        for offer_number, product_elem in enumerate(self._iter_xml_offers(self.xml_path), 1):
+            if progress is not None and offer_number % self.PARSE_PROGRESS_INTERVAL == 0:
+                progress(offer_number, total)
+            xml_id = self._safe_get_xml_value(product_elem, 'id')
+            if xml_id in wanted and xml_id not in prices:
+                try:
+                    prices[xml_id] = self._offer_net_prices(product_elem)
+                except ValueError as e:
+                    self.logger.error(f"Błąd odczytu ceny oferty XML ID {xml_id}: {e}")
+        return prices
+
+    def _reprice_from_feed(self, products, progress=None, markup_percent=None):
+        """
+        Ustawia ceny produktów z bieżącego pliku XML: ceny netto i bazowe brutto z oferty,
+        cena sprzedaży = cena bazowa + narzut. Wszystko jest liczone jednym przebiegiem
+        (PriceColumns); zapis do bazy danych należy do wywołującego (_save_to_db).
+        
+        Args:
+            products (list): Produkty z xml_id
+            progress (callable, optional): Przekazywana do _read_feed_prices
+            markup_percent (float, optional): Nowy narzut dla wszystkich produktów (domyślnie zapisane narzuty)
+            
+        Returns:
+            tuple: (zmienione produkty, liczba produktów, których cen nie udało się odczytać z XML)
+        """
+        feed_prices = self._read_feed_prices((product['xml_id'] for product in products), progress)
+        # Oferty bez ceny (0) nie zmieniają cen produktów
+        matched = [product for product in products
+                   if feed_prices.get(str(product['xml_id']), (0, 0))[1] > 0]
+        errors = len(products) - len(matched)
+        if not matched:
+            return [], errors
+        
+        net_prices = [feed_prices[str(product['xml_id'])][0] for product in matched]
+        discounted_net_prices = [feed_prices[str(product['xml_id'])][1] for product in matched]
+        columns = PriceColumns(matched, default_vat_rate=self.VAT_RATE)
+        # Stawki VAT produktów (kolumna 'vat'; domyślnie VAT_RATE)
+        base_prices = columns.gross_prices(net_prices=discounted_net_prices)
+        regular_prices = columns.gross_prices(net_prices=net_prices).tolist()
+        
+        changed = {id(product): product
+                   for product in columns.apply_sale_prices(markups=markup_percent, base_prices=base_prices)}
+        for product, net_price, regular_price in zip(matched, net_prices, regular_prices):
+            if product.get('price_net_xml') != net_price or product.get('regular_price') != regular_price:
+                product['price_net_xml'] = net_price
+                product['regular_price'] = regular_price
+                changed[id(product)] = product
+        
+        changed = list(changed.values())
+        if changed:
+            modified_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for product in changed:
+                product['last_modified'] = modified_at
+            self._mark_dirty(*(product['id'] for product in changed))
+        return changed, errors
+
+    def update_all_prices_with_markup(self, progress=None):
+        """
+        Aktualizuje ceny wszystkich produktów z XML na podstawie bieżącego pliku XML i zapisanych narzutów.
+        
+        Ceny ofert są odczytywane z pliku jeden raz, ceny sprzedaży przeliczane jednym
+        przebiegiem, a zmiany zapisywane jednym zapisem bazy danych.
+        
+        Args:
+            progress (callable, optional): progress(etap, przetworzone, wszystkie) - etapy
+                'read' (odczyt pliku XML) i 'done'
+            
+        Returns:
+            tuple: (liczba produktów ze zmienioną ceną, liczba produktów, których ceny nie udało się odczytać)
+        """
+        products = [product for product in self.products if product.get('xml_id')]
+        read_progress = (lambda done, total: progress('read', done, total)) if progress else None
+        
+        changed, errors = self._reprice_from_feed(products, read_progress)
+        if changed and not self._save_to_db():
+            raise IOError("Nie udało się zapisać zmian cen do bazy danych")
+        
+        if progress is not None:
+            progress('done', len(products), len(products))
+        self.logger.info(f"Zaktualizowano ceny {len(changed)} z {len(products)} produktów z XML, błędów: {errors}")
+        return len(changed), errors
+
+    def update_price_with_markup(self, product_id):
+        """
+        Aktualizuje cenę produktu na podstawie ceny z bieżącego pliku XML i zapisanego narzutu.
+        
+        Args:
+            product_id (str): ID produktu (lub ID z XML)
+            
+        Returns:
+            bool: True jeśli cena została odczytana z XML i zapisana, False w przeciwnym razie
+        """
+        try:
+            product = self._products_by_id.get(str(product_id)) or self._products_by_xml_id.get(str(product_id))
+            if not product or not product.get('xml_id'):
+                self.logger.error(f"Nie znaleziono produktu z XML o ID {product_id}")
+                return False
+            
+            changed, errors = self._reprice_from_feed([product])
+            if errors:
+                self.logger.error(f"Nie znaleziono ceny produktu {product_id} w pliku XML")
+                return False
+            if changed:
+                return self._save_to_db()
+            return True
+        except Exception as e:
+            self.logger.error(f"Błąd podczas aktualizacji ceny produktu {product_id} z narzutem: {str(e)}")
+            return False
+
     def get_product_lists(self):
         """
         Zwraca listy produktów zapisane w pliku JSON.
@@ -660,40 +1655,30 @@ class ProductManager:
                         else:
                             product_lists[i][key] = value
                     
-                    # Zapisz zaktualizowaną listę do pliku
-                    with open(self.PRODUCT_LISTS_FILE, 'w', encoding='utf-8') as f:
-                        json.dump(product_lists, f, ensure_ascii=False, indent=2)
-                    
                     # Aktualizuj produkty już wystawione w sklepie, jeśli zmieniono narzut
                     if 'markup_percent' in data:
                         new_markup = float(data['markup_percent'])
-                        product_ids = product_lists[i].get('products_ids', [])
+                        products = [self._products_by_id[str(product_id)]
+                                    for product_id in product_lists[i].get('products_ids', [])
+                                    if str(product_id) in self._products_by_id]
+                        products = [product for product in products if product.get('xml_id')]
                         
-                        # Aktualizuj każdy produkt z listy
-                        for product_id in product_ids:
-                            # Sprawdź czy produkt jest już wystawiony w sklepie
-                            existing_product = next((p for p in self.products if str(p.get('id')) == str(product_id)), None)
-                            
-                            if existing_product:
-                                # Pobierz aktualną cenę z XML
-                                xml_product = self.get_product_from_xml(product_id)
-                                if xml_product:
-                                    # Oblicz nową cenę z nowym narzutem
-                                    base_price = xml_product.get('price', 0)
-                                    if base_price > 0:
-                                        new_price = base_price * (1 + new_markup / 100)
-                                        
-                                        # Aktualizuj produkt w sklepie
-                                        self.update_product(
-                                            product_id=product_id,
-                                            price=new_price,
-                                            markup_percent=new_markup
-                                        )
-                                        
-                                        self.logger.info(f"Zaktualizowano cenę produktu {product_id} na {new_price:.2f} zł (narzut: {new_markup}%)")
+                        # Ceny z XML odczytane jednym przebiegiem, nowe ceny wyliczone w pamięci, jeden zapis
+                        backup = self._backup_fields(products, ('price', 'markup_percent', 'price_net_xml',
+                                                                'regular_price', 'last_modified'))
+                        changed, errors = self._reprice_from_feed(products, markup_percent=new_markup)
+                        if changed and not self._save_to_db():
+                            # Lista nie jest zapisywana - narzut listy zgadza się z cenami w magazynie
+                            self._restore_fields(backup)
+                            self.logger.error(f"Nie udało się zapisać cen produktów z listy ID: {list_id}")
+                            return None
                         
-                        # Zapisz zmiany w produktach
-                        self._save_to_db()
+                        self.logger.info(f"Zaktualizowano ceny {len(changed)} produktów z listy ID: {list_id} "
+                                         f"(narzut: {new_markup}%, bez ceny w XML: {errors})")
+                    
+                    # Zapisz zaktualizowaną listę do pliku
+                    with open(self.PRODUCT_LISTS_FILE, 'w', encoding='utf-8') as f:
+                        json.dump(product_lists, f, ensure_ascii=False, indent=2)
                     
                     self.logger.info(f"Zaktualizowano listę produktów ID: {list_id}")
                     return product_lists[i]
@@ -750,7 +1735,7 @@ class ProductManager:
         result = []
         for product_id in product_ids:
             # Szukaj produktu najpierw w bazie danych
-            product = next((p for p in self.products if str(p.get('id')) == str(product_id)), None)
+            product = self._products_by_id.get(str(product_id))
             
             if product:
                 # Sprawdź, czy produkt jest już w sklepie
@@ -785,12 +1770,9 @@ class ProductManager:
         Returns:
             dict: Znaleziony produkt lub None
         """
-        product_id_str = str(product_id)
-        for product in self.products:
-            if str(product.get('id')) == product_id_str:
-                if include_unavailable or product.get('available_for_sale', False):
-                    return product
-                break
+        product = self._products_by_id.get(str(product_id))
+        if product and (include_unavailable or product.get('available_for_sale', False)):
+            return product
         return None
     
     def get_product_by_slug(self, slug, include_unavailable=True):
@@ -804,14 +1786,14 @@ class ProductManager:
         Returns:
             dict: Znaleziony produkt lub None
         """
-        from app import slugify
+        product = self._products_by_slug.get(slug)
+        if product and (include_unavailable or product.get('available_for_sale', False)):
+            return product
         
-        for product in self.products:
-            product_slug = slugify(product.get('name', ''))
-            if product_slug == slug:
-                if include_unavailable or product.get('available_for_sale', False):
-                    return product
-                break
+        # Stare adresy mogą wskazywać slug bazowy produktu, który przy kolizji dostał sufiks
+        for candidate in self._slug_collisions.get(slug, []):
+            if include_unavailable or candidate.get('available_for_sale', False):
+                return candidate
         return None
     
     def get_products_by_category(self, category, include_unavailable=False):
@@ -825,48 +1807,42 @@ class ProductManager:
         Returns:
             list: Lista produktów z danej kategorii
         """
-        # Przeszukaj zarówno po głównej kategorii jak i po ścieżce kategorii
+        # Indeks obejmuje zarówno główną kategorię, jak i ścieżkę kategorii
         products = []
-        for p in self.products:
-            is_in_category = (p.get('category') == category or 
-                            (p.get('category_path') and category in p.get('category_path')))
-            
-            if is_in_category and (include_unavailable or p.get('available_for_sale', False)):
+        for product_id in self._category_index.get(category, ()):
+            p = self._products_by_id.get(product_id)
+            if p and (include_unavailable or p.get('available_for_sale', False)):
                 products.append(p)
                 
         return products
     
+    def get_category_counts(self):
+        """
+        Zwraca liczbę produktów (wszystkich, także niedostępnych) w każdej kategorii
+        
+        Returns:
+            dict: Słownik {kategoria: liczba produktów}
+        """
+        return {category: len(product_ids) for category, product_ids in self._category_index.items()}
+    
     def get_categories(self):
         """Zwraca listę unikalnych kategorii"""
-        return list(set(p.get('category') for p in self.products if p.get('category')))
+        return list(self._leaf_categories)
     
     def get_category_tree(self):
         """
         Zwraca hierarchiczną strukturę kategorii w formie drzewa
         
+        Drzewo jest budowane przy przebudowie indeksów, a nie przy każdym wywołaniu.
+        Zwracana jest kopia - zmiany wprowadzone przez wywołującego nie psują indeksu
+        (app.py pobiera drzewo raz na generację katalogu).
+        
         Returns:
             dict: Struktura drzewa kategorii
         """
-        category_tree = {}
-        
-        for product in self.products:
-            # Pobierz ścieżkę kategorii
-            category_path = product.get('category_path', [])
-            
-            if not category_path:
-                continue
-                
-            # Buduj drzewo kategorii
-            current_level = category_tree
-            for i, category in enumerate(category_path):
-                if category not in current_level:
-                    # Jeśli to ostatni element ścieżki, ustaw wartość na pustą listę
-                    current_level[category] = {} if i < len(category_path) - 1 else {}
-                
-                # Przejdź do następnego poziomu
-                current_level = current_level[category]
-        
-        return category_tree
+        def copy_level(level):
+            return {node: copy_level(children) for node, children in level.items()}
+        return copy_level(self._category_tree)
     
     def get_main_categories(self):
         """
@@ -875,13 +1851,7 @@ class ProductManager:
         Returns:
             list: Lista głównych kategorii
         """
-        categories = set()
-        for product in self.products:
-            category_path = product.get('category_path', [])
-            if category_path and len(category_path) > 0:
-                categories.add(category_path[0])
-        
-        return list(categories)
+        return list(self._main_categories)
         
     def get_featured_categories(self):
         """
@@ -891,12 +1861,16 @@ class ProductManager:
             list: Lista wyróżnionych kategorii
         """
         # Sprawdź czy istnieje plik konfiguracyjny
-        config_path = os.path.join('data', 'featured_categories.json')
+        config_path = self.FEATURED_CATEGORIES_FILE
         
         try:
             if os.path.exists(config_path):
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                # Plik jest czytany ponownie tylko po zmianie (mtime)
+                mtime = os.stat(config_path).st_mtime_ns
+                if self._featured_categories_cache is None or self._featured_categories_cache[0] != mtime:
+                    with open(config_path, 'r', encoding='utf-8') as f:
+                        self._featured_categories_cache = (mtime, json.load(f))
+                return self._featured_categories_cache[1]
             else:
                 # Jeśli brak konfiguracji, domyślnie zwracamy pierwsze 4 kategorie
                 return self.get_main_categories()[:4]
@@ -914,7 +1888,7 @@ class ProductManager:
         Returns:
             bool: True jeśli operacja zakończyła się powodzeniem, False w przeciwnym razie
         """
-        config_path = os.path.join('data', 'featured_categories.json')
+        config_path = self.FEATURED_CATEGORIES_FILE
         
         try:
             # Ogranicz liczbę kategorii do 6
@@ -1039,7 +2013,7 @@ class ProductManager:
             new_product_id = self._get_next_id()
             self.logger.info(f"Attempting to add new product with proposed ID: {new_product_id}")
 
-            vat_rate = float(product_data.get('vat', self.VAT_RATE))
+            vat_rate = normalize_vat_rate(product_data.get('vat', self.VAT_RATE))
             
             # Podstawowe informacje o produkcie
             final_product_info = {
@@ -1087,15 +2061,12 @@ class ProductManager:
                     markup_percent = float(markup_percent)
                     final_product_info['markup_percent'] = markup_percent
                     # Cena sprzedaży brutto = cena bazowa brutto * (1 + marża/100)
-                    final_product_info['price'] = round(base_gross_price * (1 + markup_percent / 100), 2)
+                    final_product_info['price'] = sale_price(base_gross_price, markup_percent)
                 elif final_gross_price_direct is not None:
                     # Podano cenę sprzedaży brutto i cenę netto zakupu, obliczamy marżę
                     final_gross_price_direct = float(final_gross_price_direct)
                     final_product_info['price'] = final_gross_price_direct
-                    if base_gross_price > 0:
-                        final_product_info['markup_percent'] = round(((final_gross_price_direct / base_gross_price) - 1) * 100, 2)
-                    else:
-                        final_product_info['markup_percent'] = 0.0 # Marża 0, jeśli cena bazowa 0
+                    final_product_info['markup_percent'] = markup_from_price(final_gross_price_direct, base_gross_price)
                 else:
                     # Podano tylko cenę netto zakupu, marża 0%
                     final_product_info['markup_percent'] = 0.0
@@ -1128,7 +2099,11 @@ class ProductManager:
                  final_product_info['price_net_xml'] = None
 
 
+            final_product_info = ProductRecord.from_dict(final_product_info)
+            self._set_product_description(final_product_info, final_product_info.get('description'))
             self.products.append(final_product_info)
+            self._index_product(final_product_info)
+            self._mark_dirty(final_product_info['id'])
             if self._save_to_db():
                 self.logger.info(f"Pomyślnie dodano nowy produkt ID: {final_product_info['id']}, Nazwa: {final_product_info.get('name')}")
                 return final_product_info
@@ -1136,6 +2111,7 @@ class ProductManager:
                 self.logger.error(f"Nie udało się zapisać bazy danych po dodaniu produktu ID: {final_product_info['id']}")
                 # Potencjalnie usuń produkt z self.products, jeśli zapis się nie powiódł, aby uniknąć niespójności
                 self.products = [p for p in self.products if p.get('id') != final_product_info['id']]
+                self._rebuild_indexes()
                 return None
 
         except Exception as e:
@@ -1164,6 +2140,119 @@ class ProductManager:
         
         return str(max_id_num + 1)
         
+    def _backup_fields(self, products, fields):
+        """
+        Zapamiętuje pola produktów przed zmianą wielu produktów naraz (patrz _restore_fields).
+        
+        Returns:
+            tuple: (ID produktów oczekujących już na zapis, [(produkt, {pole: wartość})])
+        """
+        return self._pending_ids(), [
+            (product, {field: product.get(field, _MISSING) for field in fields}) for product in products
+        ]
+
+    def _restore_fields(self, backup):
+        """
+        Przywraca pola zapamiętane przez _backup_fields po nieudanym zapisie i wycofuje oznaczenia
+        produktów do zapisu - zmiany nie trafią do magazynu przy kolejnym zapisie.
+        """
+        pending_before, products = backup
+        restored_ids = set()
+        for product, values in products:
+            for field, value in values.items():
+                if value is _MISSING:
+                    product.pop(field, None)
+                else:
+                    product[field] = value
+            restored_ids.add(str(product['id']))
+        with self._pending_lock:
+            self._dirty_ids -= restored_ids - pending_before
+        self._mark_catalog_changed()
+
+    def publish_products(self, items, available_for_sale=True):
+        """
+        Wystawia (lub wycofuje) wiele produktów naraz z podanymi narzutami.
+        
+        Produkty są wyszukiwane przez indeksy (ID lub ID z XML), ceny sprzedaży liczone
+        jednym przebiegiem w pamięci, a zmiany zapisywane jednym zapisem bazy danych.
+        
+        Args:
+            items (iterable): Pary (ID produktu lub ID z XML, narzut procentowy)
+            available_for_sale (bool): Czy produkty mają być dostępne do sprzedaży
+            
+        Returns:
+            list: Wynik dla każdej pary, w kolejności: {'id': ID, 'success': bool,
+                'product': produkt lub None, 'message': opis błędu lub None}
+        """
+        results = []
+        products = []
+        markups = []
+        seen = {}
+        for product_id, markup_percent in items:
+            result = {'id': str(product_id), 'success': False, 'product': None, 'message': None}
+            results.append(result)
+            product = self._products_by_id.get(str(product_id)) or self._products_by_xml_id.get(str(product_id))
+            if not product:
+                result['message'] = f"Nie znaleziono produktu o ID {product_id} w bazie danych"
+                self.logger.error(result['message'])
+                continue
+            try:
+                markup_percent = float(markup_percent)
+            except (TypeError, ValueError):
+                result['message'] = f"Niepoprawny narzut produktu {product_id}: {markup_percent}"
+                self.logger.error(result['message'])
+                continue
+            
+            result['product'] = product
+            # Ten sam produkt podany kilka razy - obowiązuje ostatni narzut
+            if id(product) in seen:
+                markups[seen[id(product)]] = markup_percent
+            else:
+                seen[id(product)] = len(products)
+                products.append(product)
+                markups.append(markup_percent)
+        
+        if not products:
+            return results
+        
+        # Stan sprzed zmian - przywracany, jeśli zapis się nie powiedzie
+        backup = self._backup_fields(products, ('price', 'markup_percent', 'available_for_sale', 'last_modified'))
+        changed = {}
+        try:
+            columns = PriceColumns(products, default_vat_rate=self.VAT_RATE)
+            changed = {id(product): product for product in columns.apply_sale_prices(markups=markups)}
+            for product in products:
+                if product.get('available_for_sale') != available_for_sale:
+                    product['available_for_sale'] = available_for_sale
+                    changed[id(product)] = product
+            
+            if changed:
+                modified_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                for product in changed.values():
+                    product['last_modified'] = modified_at
+                self._mark_dirty(*(product['id'] for product in changed.values()))
+                saved = self._save_to_db()
+            else:
+                saved = True
+            error_message = None if saved else "Błąd podczas zapisywania produktów"
+        except Exception as e:
+            saved = False
+            error_message = f"Błąd podczas wystawiania produktów: {str(e)}"
+        
+        for result in results:
+            if result['product'] is not None:
+                result['success'] = saved
+                result['message'] = error_message
+                if not saved:
+                    result['product'] = None
+        if not saved:
+            self._restore_fields(backup)
+            self.logger.error(error_message)
+        else:
+            self.logger.info(f"Wystawiono {len(products)} produktów (dostępność: {available_for_sale}), "
+                             f"zmienionych: {len(changed)}")
+        return results
+    
     def add_product_from_xml(self, product_id, markup_percent=0, available_for_sale=True):
         """
         Dodaje produkt z pliku XML do sklepu z określonymi parametrami.
@@ -1177,36 +2266,11 @@ class ProductManager:
             dict: Zaktualizowany produkt lub None w przypadku błędu
         """
         try:
-            # Szukaj produktu w bazie danych
-            product = None
-            for p in self.products:
-                if str(p.get('id')) == str(product_id) or str(p.get('xml_id')) == str(product_id):
-                    product = p
-                    break
-            
-            if not product:
-                self.logger.error(f"Nie znaleziono produktu o ID {product_id} w bazie danych")
-                return None
-            
-            # Aktualizuj produkt
-            product['available_for_sale'] = available_for_sale
-            product['markup_percent'] = float(markup_percent)
-            
-            # Oblicz nową cenę sprzedaży z uwzględnieniem narzutu
-            original_price = product.get('original_price', 0)
-            product['price'] = round(original_price * (1 + markup_percent / 100), 2)
-            
-            # Aktualizacja daty modyfikacji
-            product['last_modified'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Zapisz zmiany
-            if self._save_to_db():
-                self.logger.info(f"Produkt {product.get('name')} (ID: {product_id}) został zaktualizowany. "
+            result = self.publish_products([(product_id, markup_percent)], available_for_sale)[0]
+            if result['success']:
+                self.logger.info(f"Produkt {result['product'].get('name')} (ID: {product_id}) został zaktualizowany. "
                                f"Dostępność: {available_for_sale}, Narzut: {markup_percent}%")
-                return product
-            else:
-                self.logger.error(f"Błąd podczas zapisywania produktu ID: {product_id}")
-                return None
+            return result['product']
                 
         except Exception as e:
             self.logger.error(f"Błąd podczas dodawania produktu z XML (ID: {product_id}): {str(e)}")
@@ -1214,42 +2278,39 @@ class ProductManager:
             
     def add_products_from_list(self, list_id):
         """
-        Dodaje wszystkie produkty z danej listy do sklepu.
+        Dodaje wszystkie produkty z danej listy do sklepu (jednym zapisem bazy danych).
         
         Args:
             list_id (int): ID listy produktów
             
         Returns:
-            list: Lista zaktualizowanych produktów lub pusta lista w przypadku błędu
+            list: Wyniki dla produktów listy (jak w publish_products) lub None w przypadku błędu
         """
         try:
             # Pobierz listę produktów
             product_list = self.get_product_list(list_id)
             if not product_list:
                 self.logger.error(f"Nie znaleziono listy produktów o ID {list_id}")
-                return []
+                return None
             
             # Pobierz parametry listy
             markup_percent = product_list.get('markup_percent', 0)
             product_ids = product_list.get('products_ids', [])
             product_markups = product_list.get('product_markups', {})
             
-            updated_products = []
-            for product_id in product_ids:
-                # Jeśli dla produktu zdefiniowano indywidualny narzut, użyj go
-                individual_markup = product_markups.get(str(product_id), markup_percent)
-                
-                # Zaktualizuj produkt
-                updated_product = self.add_product_from_xml(product_id, individual_markup, True)
-                if updated_product:
-                    updated_products.append(updated_product)
+            # Jeśli dla produktu zdefiniowano indywidualny narzut, użyj go
+            results = self.publish_products(
+                ((product_id, product_markups.get(str(product_id), markup_percent)) for product_id in product_ids),
+                available_for_sale=True
+            )
             
-            self.logger.info(f"Dodano {len(updated_products)} produktów z listy ID: {list_id}")
-            return updated_products
+            published_count = sum(1 for result in results if result['success'])
+            self.logger.info(f"Dodano {published_count} z {len(results)} produktów z listy ID: {list_id}")
+            return results
             
         except Exception as e:
             self.logger.error(f"Błąd podczas dodawania produktów z listy (ID: {list_id}): {str(e)}")
-            return []
+            return None
     
     def get_published_products(self):
         """
@@ -1279,92 +2340,105 @@ class ProductManager:
             self.logger.error(f"Error getting last update time: {str(e)}")
             return None
     
+    def _get_xml_catalog(self):
+        """
+        Zwraca katalog ofert z pliku XML, parsując plik tylko raz dla każdej jego wersji.
+        
+        Returns:
+            XmlCatalog: Katalog ofert lub None, jeśli plik XML nie istnieje
+        """
+        try:
+            stat = os.stat(self.xml_path)
+        except OSError:
+            self.logger.error(f"Plik XML nie istnieje: {self.xml_path}")
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        
+        catalog = self._xml_catalog
+        if catalog is not None and catalog.version == version:
+            return catalog
+        
+        with self._xml_catalog_lock:
+            catalog = self._xml_catalog
+            if catalog is None or catalog.version != version:
+                started = time.time()
+                catalog = XmlCatalog(
+                    (self._xml_catalog_record(elem) for elem in self._iter_xml_offers(self.xml_path)
+                     if self._safe_get_xml_value(elem, 'id')),
+                    version=version,
+                    # Opisy nie są trzymane w pamięci - wyszukiwanie w opisach czyta je z pliku
+                    external_fields={'description': self._iter_xml_descriptions}
+                )
+                self._xml_catalog = catalog
+                self.logger.info(f"Zbudowano katalog XML: {len(catalog)} ofert w {time.time() - started:.2f}s")
+        return catalog
+
+    def _iter_xml_descriptions(self):
+        """Zwraca pary (xml_id, opis) ofert z pliku XML (czytanego strumieniowo)"""
+        for elem in self._iter_xml_offers(self.xml_path):
+            yield self._safe_get_xml_value(elem, 'id'), self._safe_get_xml_value(elem, 'description', '')
+    
+    def _xml_catalog_record(self, product_elem):
+        """
+        Zamienia element <offer> na rekord katalogu XML - tylko dane wyświetlane na liście
+        wyników wyszukiwarki w panelu (bez opisu i listy zdjęć, czytanych przez get_product_from_xml).
+        """
+        xml_id = self._safe_get_xml_value(product_elem, 'id')
+        ean = self._safe_get_xml_value(product_elem, 'EAN') or self._safe_get_xml_value(product_elem, 'ean', '')
+        
+        try:
+            price = float(self._safe_get_xml_value(product_elem, 'price', 0) or 0)
+        except ValueError:
+            price = 0.0
+        try:
+            stock = int(self._safe_get_xml_value(product_elem, 'stock', 0) or 0)
+        except ValueError:
+            stock = 0
+        
+        # Tylko główny obraz
+        image = None
+        pictures_elem = product_elem.find('pictures')
+        if pictures_elem is not None:
+            for pic in pictures_elem.findall('picture'):
+                if pic.text and pic.text.strip():
+                    image = pic.text.strip()
+                    break
+        
+        return {
+            'xml_id': xml_id,
+            'id': xml_id,
+            'name': self._safe_get_xml_value(product_elem, 'name', ''),
+            'category': self._safe_get_xml_value(product_elem, 'category', ''),
+            'price': price,
+            'stock': stock,
+            'ean': ean,
+            'EAN': ean,
+            'producer': self._safe_get_xml_value(product_elem, 'producer', ''),
+            'image': image
+        }
+
     def search_xml_products(self, query='', field='any'):
         """
         Wyszukuje produkty w pliku XML na podstawie zapytania.
         
+        Plik jest parsowany tylko raz dla każdej wersji (katalog XML w pamięci),
+        a wyniki ostatnich zapytań są buforowane. 'any' obejmuje nazwę, ID, kategorię,
+        EAN i producenta; opisy są przeszukiwane tylko dla field='description' (odczyt pliku).
+        
         Args:
             query (str): Zapytanie wyszukiwania
-            field (str): Pole do wyszukiwania ('any', 'name', 'id', 'description', 'category')
+            field (str): Pole do wyszukiwania ('any', 'name', 'id', 'description', 'category', 'ean', 'producer')
             
         Returns:
-            list: Lista słowników z danymi produktów pasujących do zapytania
+            list: Lista słowników z danymi produktów pasujących do zapytania (bez opisu i listy
+                zdjęć - pełne dane oferty zwraca get_product_from_xml)
         """
         try:
-            if not os.path.exists(self.xml_path):
-                self.logger.error(f"Plik XML nie istnieje: {self.xml_path}")
+            catalog = self._get_xml_catalog()
+            if catalog is None:
                 return []
-                
-            tree = ET.parse(self.xml_path)
-            root = tree.getroot()
-            
-            results = []
-            query_lower = query.lower() if query else ''
-            
-            for product_elem in root.findall('.//offer'):
-                xml_id = self._safe_get_xml_value(product_elem, 'id')
-                if not xml_id:
-                    continue
-                    
-                # Pobierz dane produktu
-                product = {
-                    'xml_id': xml_id,
-                    'id': xml_id,
-                    'name': self._safe_get_xml_value(product_elem, 'name', ''),
-                    'description': self._safe_get_xml_value(product_elem, 'description', ''),
-                    'category': self._safe_get_xml_value(product_elem, 'category', ''),
-                    'price': float(self._safe_get_xml_value(product_elem, 'price', 0) or 0),
-                    'stock': int(self._safe_get_xml_value(product_elem, 'stock', 0) or 0),
-                    'ean': self._safe_get_xml_value(product_elem, 'ean', ''),
-                    'producer': self._safe_get_xml_value(product_elem, 'producer', ''),
-                    'images': []
-                }
-                
-                # Pobierz obrazy
-                pictures_elem = product_elem.find('pictures')
-                if pictures_elem is not None:
-                    for pic in pictures_elem.findall('picture'):
-                        if pic.text:
-                            product['images'].append(pic.text.strip())
-                
-                # Ustaw główny obraz
-                product['image'] = product['images'][0] if product['images'] else None
-                
-                # Sprawdź czy produkt pasuje do wyszukiwania
-                if not query:
-                    results.append(product)
-                    continue
-                    
-                match = False
-                
-                if field == 'any':
-                    # Szukaj we wszystkich polach
-                    search_fields = [
-                        product['name'],
-                        product['description'], 
-                        product['category'],
-                        str(product['id']),
-                        product['ean'],
-                        product['producer']
-                    ]
-                    match = any(query_lower in str(field_value).lower() for field_value in search_fields if field_value)
-                    
-                elif field == 'name':
-                    match = query_lower in product['name'].lower()
-                elif field == 'id':
-                    match = query_lower in str(product['id']).lower()
-                elif field == 'description':
-                    match = query_lower in product['description'].lower()
-                elif field == 'category':
-                    match = query_lower in product['category'].lower()
-                elif field == 'ean':
-                    match = query_lower in product['ean'].lower()
-                elif field == 'producer':
-                    match = query_lower in product['producer'].lower()
-                    
-                if match:
-                    results.append(product)
             
+            results = catalog.search(query, field)
             self.logger.info(f"Znaleziono {len(results)} produktów dla zapytania: '{query}' w polu: '{field}'")
             return results
             
@@ -1372,10 +2446,83 @@ class ProductManager:
             self.logger.error(f"Błąd podczas wyszukiwania produktów w XML: {str(e)}")
             return []
     
+    def search_xml_products_page(self, query='', field='any', page=1, per_page=20):
+        """
+        Zwraca jedną stronę wyników wyszukiwania w pliku XML.
+        
+        Returns:
+            tuple: (lista produktów na stronie, łączna liczba wyników)
+        """
+        results = self.search_xml_products(query, field)
+        start_idx = (page - 1) * per_page
+        return results[start_idx:start_idx + per_page], len(results)
+    
+    def suggest_products(self, query, limit=10):
+        """
+        Zwraca podpowiedzi wyszukiwania (autouzupełnianie) spośród produktów dostępnych do sprzedaży.
+        
+        Args:
+            query (str): Wpisywany tekst (ostatnie słowo traktowane jako prefiks)
+            limit (int): Maksymalna liczba podpowiedzi
+            
+        Returns:
+            list: Lista produktów w kolejności trafności
+        """
+        try:
+            if self._suggestion_full_sync or self._suggestion_stale_ids:
+                self._sync_suggestion_index()
+            
+            return [self._products_by_id[product_id]
+                    for product_id in self._suggestion_index.suggest(query, limit)
+                    if product_id in self._products_by_id]
+        except Exception as e:
+            self.logger.error(f"Błąd podczas wyszukiwania podpowiedzi: {str(e)}")
+            return []
+    
+    def _sync_suggestion_index(self):
+        """Aktualizuje indeks podpowiedzi o produkty zmienione od ostatniego zapytania"""
+        with self._suggestion_lock:
+            index = self._suggestion_index
+            if self._suggestion_full_sync:
+                self._suggestion_full_sync = False
+                self._suggestion_stale_ids.clear()
+                products = list(self.products)
+                if not len(index):
+                    index.build((str(p.get('id')), p.get('name'), self._suggestion_categories(p))
+                                for p in products if p.get('available_for_sale', False))
+                    return
+                available_ids = set()
+                for product in products:
+                    if product.get('available_for_sale', False):
+                        available_ids.add(str(product.get('id')))
+                        self._update_suggestion(index, product)
+                for doc_id in index.doc_ids() - available_ids:
+                    index.remove(doc_id)
+                return
+            
+            stale_ids = list(self._suggestion_stale_ids)
+            self._suggestion_stale_ids.difference_update(stale_ids)
+            for product_id in stale_ids:
+                product = self._products_by_id.get(product_id)
+                if product is not None and product.get('available_for_sale', False):
+                    self._update_suggestion(index, product)
+                else:
+                    index.remove(product_id)
+    
+    @staticmethod
+    def _suggestion_categories(product):
+        return [product.get('category') or ''] + list(product.get('category_path') or [])
+    
+    def _update_suggestion(self, index, product):
+        index.update(str(product.get('id')), product.get('name'), self._suggestion_categories(product))
+    
     def find_products(self, query='', include_unavailable=True):
         """
         Wyszukuje produkty w bazie danych sklepu na podstawie zapytania.
         
+        Korzysta z indeksu pełnotekstowego: wielkość liter i polskie znaki nie mają znaczenia,
+        każde słowo zapytania musi pasować (całe lub jako początek słowa).
+        
         Args:
             query (str): Zapytanie wyszukiwania
             include_unavailable (bool): Czy uwzględnić produkty niedostępne do sprzedaży
@@ -1384,33 +2531,16 @@ class ProductManager:
             list: Lista słowników z danymi produktów pasujących do zapytania
         """
         try:
-            query_lower = query.lower() if query else ''
-            results = []
+            # Jeśli brak zapytania, zwróć wszystkie produkty
+            if not query:
+                return list(self.get_all_products(include_unavailable=include_unavailable))
             
-            for product in self.products:
+            # Indeks pełnotekstowy zwraca produkty posortowane według trafności (BM25)
+            results = []
+            for product_id, score in self.search_index.search(query):
+                product = self._products_by_id.get(product_id)
                 # Sprawdź czy produkt jest dostępny do sprzedaży (jeśli ma znaczenie)
-                if not include_unavailable and not product.get('available_for_sale', False):
-                    continue
-                    
-                # Jeśli brak zapytania, zwróć wszystkie produkty
-                if not query:
-                    results.append(product)
-                    continue
-                    
-                # Sprawdź czy produkt pasuje do wyszukiwania
-                search_fields = [
-                    product.get('name', ''),
-                    product.get('description', ''), 
-                    product.get('category', ''),
-                    str(product.get('id', '')),
-                    product.get('EAN', ''),
-                    product.get('producer', '')
-                ]
-                
-                # Szukaj we wszystkich polach
-                match = any(query_lower in str(field_value).lower() for field_value in search_fields if field_value)
-                    
-                if match:
+                if product and (include_unavailable or product.get('available_for_sale', False)):
                     results.append(product)
             
             self.logger.info(f"Znaleziono {len(results)} produktów dla zapytania: '{query}'")
@@ -0,0 +1,143 @@
+import sys
+from pricing_engine import normalize_vat_rate
+from collections.abc import Mapping, MutableMapping
+
+
+class ProductRecord(MutableMapping):
+    """
+    Rekord produktu z polami w __slots__ zamiast słownika.
+
+    Zachowuje interfejs słownika (product['name'], product.get('price'), 'slug' in product,
+    dict(product)), więc szablony i dotychczasowy kod działają bez zmian. Pola spoza FIELDS
+    trafiają do dodatkowego słownika tworzonego dopiero wtedy, gdy jest potrzebny.
+
+    Przy przypisaniu ID są zamieniane na str, nazwy kategorii i producentów są internowane
+    (wiele produktów współdzieli ten sam napis), a category_path jest krotką.
+    """
+
+    FIELDS = (
+        'id', 'xml_id', 'uuid', 'name', 'EAN', 'producer', 'url', 'images', 'image',
+        'available_for_sale', 'category', 'category_path', 'price_net_xml', 'price',
+        'original_price', 'regular_price', 'discounted_price', 'markup_percent', 'vat', 'stock',
+        'slug', 'description', 'description_blob', 'description_snippet', 'delivery_time', 'delivery_cost',
+        'shipping_time', 'shipping_cost', 'custom_name', 'custom_category', 'added_at', 'last_modified'
+    )
+    __slots__ = FIELDS + ('_extra',)
+
+    _FIELD_SET = frozenset(FIELDS)
+    _PRICE_FIELDS = ('price_net_xml', 'price', 'original_price', 'regular_price', 'discounted_price',
+                     'markup_percent', 'delivery_cost', 'shipping_cost')
+
+    def __init__(self, data=None, **kwargs):
+        self._extra = None
+        if data is not None:
+            for key, value in (data.items() if isinstance(data, Mapping) else data):
+                self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Tworzy rekord ze słownika wczytanego z magazynu, normalizując pola liczbowe
+        (ceny - float, stawka VAT - int).
+
+        Args:
+            data (dict): Dane produktu
+
+        Returns:
+            ProductRecord: Rekord produktu
+        """
+        record = cls(data)
+        for field in cls._PRICE_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None and not isinstance(value, float):
+                try:
+                    setattr(record, field, float(value))
+                except (TypeError, ValueError):
+                    pass
+        vat = getattr(record, 'vat', None)
+        if vat is not None and type(vat) is not int:
+            try:
+                record.vat = normalize_vat_rate(vat)
+            except ValueError:
+                pass
+        return record
+
+    @staticmethod
+    def _normalize(key, value):
+        if value is None:
+            return value
+        if key in ('id', 'xml_id'):
+            return str(value)
+        if key in ('category', 'producer') and isinstance(value, str):
+            return sys.intern(value)
+        if key == 'category_path':
+            return tuple(sys.intern(node) if isinstance(node, str) else node for node in value)
+        return value
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        if self._extra is not None:
+            return self._extra.get(key, default)
+        return default
+
+    def __setitem__(self, key, value):
+        if key in self._FIELD_SET:
+            setattr(self, key, self._normalize(key, value))
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        count = sum(1 for field in self.FIELDS if hasattr(self, field))
+        return count + (len(self._extra) if self._extra else 0)
+
+    def __repr__(self):
+        return f"ProductRecord({self.to_dict()!r})"
+
+    def copy(self):
+        """Zwraca płytką kopię rekordu"""
+        return ProductRecord(self)
+
+    def to_dict(self):
+        """Zwraca dane produktu jako słownik (do json.dump / jsonify)"""
+        data = {field: getattr(self, field) for field in self.FIELDS if hasattr(self, field)}
+        if self._extra:
+            data.update(self._extra)
+        return data
@@ -0,0 +1,810 @@
+"""
+Magazyny produktów używane przez ProductManager.
+
+Dostępne są dwa rodzaje magazynu:
+- 'json'   - cała lista produktów w jednym pliku (domyślny), zapisywana w formacie:
+             'json' (zwięzły JSON, domyślny) lub 'json-pretty' (JSON z wcięciami),
+- 'sqlite' - baza SQLite (tryb WAL) z jednym wierszem na produkt; zmiana pojedynczego
+             produktu to zapis jednego wiersza zamiast przepisania całego pliku.
+
+Rodzaj magazynu wybiera parametr storage_backend konstruktora ProductManager
+lub zmienna środowiskowa PRODUCT_STORE_BACKEND, a format pliku - storage_format
+lub PRODUCT_STORE_FORMAT.
+
+Magazyn przechowuje też skrót SHA-256 pliku XML, którego zawartość odzwierciedla
+(feed_digest / set_feed_digest) - podmiana magazynu (np. przywrócenie kopii zapasowej)
+nie zostawia skrótu pasującego do innych danych.
+
+Plik JSON jest zawsze przepisywany w całości, a zapisuje go kilka procesów (workery aplikacji,
+pobieranie XML, skrypty serwisowe). Zapis jest chroniony międzyprocesową blokadą plikową
+(write_lock, fcntl.flock na pliku <plik produktów>.lock), pod którą ProductManager.flush
+najpierw wczytuje zmiany zapisane przez inne procesy (sync_external_changes) - zapis jednego
+procesu nie gubi zmian drugiego. Baza SQLite zapisuje pojedyncze wiersze w transakcjach
+i takiej blokady nie potrzebuje.
+
+Długie opisy produktów są zapisywane osobno, w plikach adresowanych treścią
+(data/descriptions/<sha256>.html); rekord produktu przechowuje tylko skrót
+('description_blob'). Niezmieniony opis nie jest więc zapisywany ponownie, a magazyny
+zwracają rekordy bez długich opisów - ProductManager wczytuje je na żądanie.
+
+Skrypty serwisowe powinny czytać i zapisywać produkty przez load_products / save_products.
+Baza SQLite może być eksportowana do pliku JSON i z niego importowana:
+    python product_store.py export [plik.json] [plik.db]
+    python product_store.py import [plik.json] [plik.db]
+    python product_store.py prune  - usuwa pliki opisów, do których nie odwołuje się żaden produkt
+                                     (z pominięciem plików zapisanych w ciągu ostatniej godziny)
+"""
+import os
+import sys
+import json
+import shutil
+import hashlib
+import sqlite3
+import logging
+import time
+import threading
+import traceback
+from contextlib import contextmanager
+from product_record import ProductRecord
+from catalog_version import CatalogVersion, DEFAULT_VERSION_PATH
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+
+DEFAULT_JSON_PATH = os.path.join('data', 'products.json')
+DEFAULT_SQLITE_PATH = os.path.join('data', 'products.db')
+DESCRIPTIONS_DIR = os.path.join('data', 'descriptions')
+BACKEND_ENV_VAR = 'PRODUCT_STORE_BACKEND'
+FORMAT_ENV_VAR = 'PRODUCT_STORE_FORMAT'
+DESCRIPTION_BLOB_MIN_SIZE = 512 # Krótsze opisy zostają w rekordzie produktu
+PRUNE_GRACE_SECONDS = 3600 # Pliki opisów młodsze niż ta liczba sekund nie są usuwane przez prune
+
+
+class JsonSerializer:
+    """Zwięzły JSON (bez wcięć i zbędnych spacji)"""
+    name = 'json'
+    suffix = '.json'
+    indent = None
+    separators = (',', ':')
+
+    def dump(self, products, f):
+        # json.dumps korzysta z kodera w C (json.dump do pliku - z wolniejszego, w Pythonie)
+        f.write(json.dumps(products, ensure_ascii=False, indent=self.indent, separators=self.separators))
+
+    def load(self, f):
+        return json.load(f)
+
+
+class PrettyJsonSerializer(JsonSerializer):
+    """JSON z wcięciami - dotychczasowy format pliku products.json"""
+    name = 'json-pretty'
+    indent = 2
+    separators = None
+
+
+SERIALIZERS = {serializer.name: serializer
+               for serializer in (JsonSerializer(), PrettyJsonSerializer())}
+
+def get_serializer(storage_format=None):
+    """Zwraca serializator dla formatu (domyślnie zmienna PRODUCT_STORE_FORMAT lub 'json')"""
+    storage_format = (storage_format or os.environ.get(FORMAT_ENV_VAR) or 'json').lower()
+    if storage_format not in SERIALIZERS:
+        raise ValueError(f"Nieznany format pliku produktów: {storage_format}")
+    return SERIALIZERS[storage_format]
+
+def products_file_path(storage_format=None, json_path=DEFAULT_JSON_PATH):
+    """Zwraca ścieżkę pliku produktów dla formatu"""
+    return os.path.splitext(json_path)[0] + get_serializer(storage_format).suffix
+
+
+class DescriptionBlobStore:
+    """
+    Opisy produktów w plikach adresowanych treścią (nazwa pliku to skrót SHA-256 opisu).
+
+    Ten sam opis jest zapisywany tylko raz, a pliki nigdy nie są nadpisywane. Zapis opisu
+    i usuwanie nieużywanych plików (prune) są chronione międzyprocesową blokadą plikową
+    (fcntl.flock; na systemach bez fcntl blokada jest pomijana).
+    """
+
+    DIGEST_CACHE_SIZE = 50000
+    LOCK_FILENAME = '.lock'
+
+    def __init__(self, directory=DESCRIPTIONS_DIR):
+        self.directory = directory
+        self._digests = {}  # Opis -> skrót (kolejne zapisy nie liczą skrótu ponownie)
+
+    def path_for(self, digest):
+        return os.path.join(self.directory, digest[:2], f"{digest}.html")
+
+    @contextmanager
+    def _lock(self, exclusive=False):
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, self.LOCK_FILENAME), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def put(self, text):
+        """
+        Zapisuje opis (jeśli jeszcze go nie ma) i zwraca jego skrót.
+
+        Istniejący plik opisu ma odświeżaną datę modyfikacji - prune nie usunie opisu, który
+        został właśnie ponownie użyty, zanim rekord produktu trafi do magazynu.
+
+        Returns:
+            str: Skrót SHA-256 opisu
+        """
+        digest = self._digests.get(text)
+        data = None
+        if digest is None:
+            data = text.encode('utf-8')
+            digest = hashlib.sha256(data).hexdigest()
+            if len(self._digests) >= self.DIGEST_CACHE_SIZE:
+                self._digests.clear()
+            self._digests[text] = digest
+
+        path = self.path_for(digest)
+        with self._lock():
+            try:
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data if data is not None else text.encode('utf-8'))
+            os.replace(temp_path, path)
+        return digest
+
+    def get(self, digest):
+        """Zwraca opis o podanym skrócie lub None, jeśli pliku nie ma"""
+        try:
+            with open(self.path_for(digest), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def prune(self, referenced, grace_seconds=PRUNE_GRACE_SECONDS):
+        """
+        Usuwa pliki opisów, do których nie odwołuje się żaden produkt.
+
+        Zbiór używanych opisów jest ustalany pod wyłączną blokadą - w trakcie usuwania żaden
+        proces nie zapisuje ani nie używa ponownie opisu. Pliki młodsze niż grace_seconds są
+        pomijane: opis mógł zostać zapisany przez proces, który nie zapisał jeszcze rekordu
+        produktu do magazynu (tryby 'request' i 'delayed').
+
+        Args:
+            referenced (set | callable): Skróty używanych opisów lub funkcja, która je zwraca
+                (wywoływana dopiero pod blokadą)
+            grace_seconds (float): Minimalny wiek usuwanego pliku (w sekundach)
+
+        Returns:
+            int: Liczba usuniętych plików
+        """
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        with self._lock(exclusive=True):
+            if callable(referenced):
+                referenced = referenced()
+            cutoff = time.time() - grace_seconds
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    if not filename.endswith('.html'):
+                        continue
+                    digest = filename.split('.', 1)[0]
+                    path = os.path.join(root, filename)
+                    try:
+                        if digest in referenced or os.path.getmtime(path) > cutoff:
+                            continue
+                        os.remove(path)
+                    except FileNotFoundError:
+                        continue
+                    removed += 1
+        return removed
+
+    def externalize(self, product):
+        """Zwraca rekord do zapisu (zwykły słownik) - długi opis zastąpiony skrótem 'description_blob'"""
+        record = product.to_dict() if isinstance(product, ProductRecord) else product
+        description = record.get('description')
+        if not description or len(description) < DESCRIPTION_BLOB_MIN_SIZE:
+            return record
+        if record is product:
+            record = dict(product)
+        del record['description']
+        record['description_blob'] = self.put(description)
+        return record
+
+    def internalize(self, record):
+        """Uzupełnia rekord wczytany z magazynu o opis z pliku (w miejscu)"""
+        digest = record.pop('description_blob', None)
+        if digest is not None:
+            description = self.get(digest)
+            if description is None:
+                logging.getLogger('product_store').warning(
+                    f"Brak pliku opisu {digest} produktu ID: {record.get('id')}")
+            record['description'] = description or ''
+        return record
+
+
+def _read_products_file(path, serializer=None, with_descriptions=True):
+    serializer = serializer or get_serializer()
+    blobs = DescriptionBlobStore() if with_descriptions else None
+    with open(path, 'r', encoding='utf-8') as f:
+        products = serializer.load(f)
+    # Konwersja ID na stringi dla pewności, jeśli gdzieś były int
+    for product in products:
+        if 'id' in product and product['id'] is not None:
+            product['id'] = str(product['id'])
+        if with_descriptions:
+            blobs.internalize(product)
+    return products
+
+def load_products(db_path=None, with_descriptions=False, storage_format=None):
+    """
+    Wczytuje produkty z pliku (helper dla skryptów serwisowych).
+
+    Args:
+        db_path (str, optional): Ścieżka do pliku produktów (domyślnie wg formatu)
+        with_descriptions (bool): Czy wczytać opisy z plików opisów; bez tego rekordy
+            zachowują skrót 'description_blob' i mogą być bezpiecznie zapisane z powrotem
+        storage_format (str, optional): Format pliku (domyślnie PRODUCT_STORE_FORMAT lub 'json')
+
+    Returns:
+        list: Lista produktów
+    """
+    db_path = db_path or products_file_path(storage_format)
+    return _read_products_file(db_path, get_serializer(storage_format), with_descriptions=with_descriptions)
+
+def save_products(products, db_path=None, storage_format=None):
+    """
+    Zapisuje produkty do pliku (helper dla skryptów serwisowych).
+
+    Plik jest zapisywany w całości pod blokadą write_lock, a procesy aplikacji wczytują go
+    potem ponownie. Zmiany zapisane przez aplikację między load_products a save_products
+    zostaną nadpisane - skrypty powinny działać krótko.
+
+    Returns:
+        bool: True jeśli zapis się powiódł, False w przeciwnym razie
+    """
+    db_path = db_path or products_file_path(storage_format)
+    store = FileProductStore(db_path, serializer=get_serializer(storage_format))
+    with store.write_lock():
+        saved = store.save(products)
+        if saved:
+            # Procesy aplikacji wczytają zapisany plik ponownie (ProductManager.sync_external_changes)
+            try:
+                CatalogVersion(DEFAULT_VERSION_PATH).bump(f"script:{os.getpid()}", full=True)
+            except Exception as e:
+                logging.getLogger('product_store').error(f"Błąd podczas zapisu wersji katalogu: {str(e)}")
+    return saved
+
+def read_description(product):
+    """Zwraca opis produktu wczytanego przez load_products (także gdy jest w osobnym pliku)"""
+    if product.get('description_blob'):
+        return DescriptionBlobStore().get(product['description_blob']) or ''
+    return product.get('description', '')
+
+
+class FileProductStore:
+    """Magazyn produktów w jednym pliku (zapis zawsze przepisuje cały plik)"""
+
+    name = 'json'
+    rewrites_all = True # save() przepisuje cały plik, niezależnie od changed_ids
+
+    def __init__(self, db_path=DEFAULT_JSON_PATH, logger=None, serializer=None, blobs=None):
+        """
+        Args:
+            db_path (str): Ścieżka do pliku produktów
+            logger: Logger (domyślnie 'product_store')
+            serializer: Serializator z SERIALIZERS (domyślnie zwięzły JSON)
+            blobs (DescriptionBlobStore, optional): Magazyn plików opisów
+        """
+        self.db_path = db_path
+        self.logger = logger or logging.getLogger('product_store')
+        self.serializer = serializer or SERIALIZERS['json']
+        self.blobs = blobs or DescriptionBlobStore()
+        self.meta_path = f"{db_path}.meta"
+        self.lock_path = f"{db_path}.lock"
+        self._write_thread_lock = threading.RLock()
+        self._write_lock_depth = 0
+
+    @contextmanager
+    def write_lock(self):
+        """
+        Blokada zapisu pliku produktów - wyłączna dla wszystkich procesów (fcntl.flock).
+
+        Blokadę można zakładać wielokrotnie w tym samym wątku (save() wywołane pod blokadą
+        założoną przez ProductManager.flush nie czeka samo na siebie). Na systemach bez
+        fcntl chroni tylko przed innymi wątkami tego procesu.
+        """
+        with self._write_thread_lock:
+            self._write_lock_depth += 1
+            try:
+                if self._write_lock_depth > 1 or fcntl is None:
+                    yield
+                    return
+                os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+                with open(self.lock_path, 'a') as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            finally:
+                self._write_lock_depth -= 1
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.db_path)
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def feed_digest(self):
+        """
+        Zwraca skrót pliku XML, który odzwierciedla zawartość magazynu.
+
+        Skrót jest zapisany obok pliku produktów razem z rozmiarem i datą modyfikacji pliku -
+        jeśli plik produktów zmienił się poza tym magazynem (np. przywrócono kopię zapasową),
+        skrót jest nieważny.
+
+        Returns:
+            str: Skrót SHA-256 lub None
+        """
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('stamp') is None or meta.get('stamp') != self._file_stamp():
+            return None
+        return meta.get('feed_sha256')
+
+    def set_feed_digest(self, feed_digest):
+        """Zapamiętuje skrót pliku XML odzwierciedlonego w bieżącej zawartości pliku produktów"""
+        try:
+            temp_path = f"{self.meta_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'feed_sha256': feed_digest, 'stamp': self._file_stamp()}, f)
+            os.replace(temp_path, self.meta_path)
+        except Exception as e:
+            self.logger.warning(f"Nie udało się zapisać skrótu pliku XML: {str(e)}")
+
+    def load(self):
+        """
+        Ładuje produkty z pliku (lub z kopii zapasowej .bak, gdy plik jest uszkodzony).
+
+        Długie opisy nie są wczytywane - rekordy zawierają skrót 'description_blob'.
+
+        Returns:
+            list: Lista produktów
+        """
+        try:
+            # Sprawdź główny plik bazy danych
+            if os.path.exists(self.db_path) and os.path.getsize(self.db_path) > 0:
+                try:
+                    products = _read_products_file(self.db_path, self.serializer, with_descriptions=False)
+                    self.logger.info(f"Załadowano {len(products)} produktów z bazy danych")
+                    return products
+                except ValueError:
+                    self.logger.error(f"Plik bazy danych jest uszkodzony: {self.db_path}")
+                    # Spróbuj użyć kopii zapasowej
+
+            # Sprawdź kopię zapasową
+            backup_path = f"{self.db_path}.bak"
+            if os.path.exists(backup_path) and os.path.getsize(backup_path) > 0:
+                try:
+                    products = _read_products_file(backup_path, self.serializer, with_descriptions=False)
+                    self.logger.warning(f"Załadowano {len(products)} produktów z kopii zapasowej")
+
+                    # Przywróć główny plik z kopii zapasowej
+                    shutil.copy2(backup_path, self.db_path)
+                    self.logger.info(f"Przywrócono główny plik bazy danych z kopii zapasowej")
+                    return products
+                except ValueError:
+                    self.logger.error(f"Kopia zapasowa bazy danych jest uszkodzona: {backup_path}")
+
+            # Jeśli nie udało się załadować z głównego pliku ani kopii zapasowej
+            self.logger.warning("Nie znaleziono pliku bazy danych lub pliki są uszkodzone. Utworzono pustą listę produktów.")
+            return []
+
+        except Exception as e:
+            self.logger.error(f"Błąd podczas ładowania produktów z bazy danych: {str(e)}")
+            return []
+
+    def load_ids(self, product_ids):
+        """
+        Ładuje wybrane produkty (plik jest wczytywany w całości, ale bez przebudowy katalogu).
+
+        Args:
+            product_ids (iterable): ID produktów
+
+        Returns:
+            dict: ID produktu -> rekord (produkty, których nie ma w pliku, są pomijane)
+        """
+        wanted = set(str(product_id) for product_id in product_ids)
+        return {str(product.get('id')): product for product in self.load() if str(product.get('id')) in wanted}
+
+    def save(self, products, changed_ids=None, deleted_ids=None):
+        """
+        Zapisuje wszystkie produkty do pliku (przez plik tymczasowy i kopię .bak) pod blokadą write_lock.
+
+        Długie opisy trafiają do plików opisów - zapisywane są tylko te, których jeszcze nie ma.
+        Lista nie jest łączona z zawartością pliku - zmiany innych procesów trzeba wczytać
+        przed zapisem pod tą samą blokadą (ProductManager.flush).
+
+        Args:
+            products (list): Pełna lista produktów
+            changed_ids, deleted_ids: Ignorowane - plik jest zawsze zapisywany w całości
+
+        Returns:
+            bool: True jeśli zapis się powiódł, False w przeciwnym razie
+        """
+        with self.write_lock():
+            return self._write_file(products)
+
+    def _write_file(self, products):
+        try:
+            self.logger.info(f"Rozpoczynam zapis {len(products)} produktów do bazy danych")
+            # Najpierw zapisujemy do pliku tymczasowego
+            temp_db_path = f"{self.db_path}.tmp"
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+            # Sprawdź uprawnienia do katalogu
+            data_dir = os.path.dirname(self.db_path)
+            try:
+                perm_test_file = os.path.join(data_dir, 'perm_test.txt')
+                with open(perm_test_file, 'w') as f:
+                    f.write('test')
+                os.remove(perm_test_file)
+                self.logger.info(f"Uprawnienia do zapisu w katalogu {data_dir} są poprawne")
+            except Exception as e:
+                self.logger.error(f"Brak uprawnień do zapisu w katalogu {data_dir}: {str(e)}")
+                return False
+
+            self.logger.info(f"Zapisuję do pliku tymczasowego: {temp_db_path}")
+            records = [self.blobs.externalize(product) for product in products]
+            with open(temp_db_path, 'w', encoding='utf-8') as f:
+                self.serializer.dump(records, f)
+
+            # Sprawdzamy czy plik tymczasowy został prawidłowo utworzony
+            if not os.path.exists(temp_db_path) or os.path.getsize(temp_db_path) == 0:
+                self.logger.error(f"Nie udało się utworzyć pliku tymczasowego: {temp_db_path}")
+                return False
+
+            # Skrót pliku XML pozostaje ważny po zapisie tylko, jeśli był ważny przed nim
+            feed_digest = self.feed_digest()
+
+            # Tworzymy kopię zapasową aktualnego pliku, jeśli istnieje
+            if os.path.exists(self.db_path):
+                backup_path = f"{self.db_path}.bak"
+                try:
+                    self.logger.info(f"Tworzę kopię zapasową: {backup_path}")
+                    os.replace(self.db_path, backup_path)
+                except Exception as e:
+                    self.logger.warning(f"Nie udało się utworzyć kopii zapasowej: {str(e)}")
+
+            # Przemianowujemy plik tymczasowy na właściwy
+            self.logger.info(f"Zastępuję plik bazy danych: {self.db_path}")
+            os.replace(temp_db_path, self.db_path)
+            if feed_digest:
+                self.set_feed_digest(feed_digest)
+
+            self.logger.info(f"Zapisano {len(products)} produktów do bazy danych")
+
+            # Dodatkowa weryfikacja zapisu
+            if not os.path.exists(self.db_path):
+                self.logger.error(f"Plik bazy danych nie został utworzony: {self.db_path}")
+                return False
+
+            file_size = os.path.getsize(self.db_path)
+            if file_size == 0:
+                self.logger.error(f"Plik bazy danych jest pusty: {self.db_path}")
+                return False
+
+            self.logger.info(f"Zapis zakończony sukcesem, rozmiar pliku: {file_size} bajtów")
+            return True
+        except Exception as e:
+            self.logger.error(f"Błąd podczas zapisywania produktów do bazy danych: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            return False
+
+
+class SqliteProductStore:
+    """
+    Magazyn produktów w bazie SQLite (tryb WAL).
+
+    Każdy produkt to jeden wiersz: pełne dane w kolumnie JSON oraz indeksowane kolumny
+    id, xml_id, category i available. Kolumna position zachowuje kolejność katalogu.
+    """
+
+    name = 'sqlite'
+    rewrites_all = False # save() z changed_ids zapisuje tylko zmienione wiersze
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS products (
+            id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            xml_id TEXT,
+            category TEXT,
+            available INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_products_xml_id ON products (xml_id);
+        CREATE INDEX IF NOT EXISTS idx_products_category ON products (category);
+        CREATE INDEX IF NOT EXISTS idx_products_available ON products (available);
+        CREATE INDEX IF NOT EXISTS idx_products_position ON products (position);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, db_path=DEFAULT_SQLITE_PATH, json_path=DEFAULT_JSON_PATH, logger=None, blobs=None):
+        """
+        Args:
+            db_path (str): Ścieżka do pliku bazy SQLite
+            json_path (str): Plik JSON importowany przy pierwszym uruchomieniu (pusta baza)
+            logger: Logger (domyślnie 'product_store')
+            blobs (DescriptionBlobStore, optional): Magazyn plików opisów
+        """
+        self.db_path = db_path
+        self.json_path = json_path
+        self.logger = logger or logging.getLogger('product_store')
+        self.blobs = blobs or DescriptionBlobStore()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.SCHEMA)
+
+    @contextmanager
+    def write_lock(self):
+        """Zapisy do bazy SQLite są chronione jej własnymi transakcjami - blokada nic nie robi"""
+        yield
+
+    def _row_values(self, product):
+        return (
+            str(product.get('xml_id')) if product.get('xml_id') else None,
+            product.get('category'),
+            1 if product.get('available_for_sale') else 0,
+            json.dumps(self.blobs.externalize(product), ensure_ascii=False, separators=(',', ':'))
+        )
+
+    def load(self):
+        """
+        Ładuje produkty z bazy w kolejności katalogu.
+
+        Długie opisy nie są wczytywane - rekordy zawierają skrót 'description_blob'.
+        Pusta baza jest przy pierwszym uruchomieniu wypełniana z pliku JSON (jeśli istnieje).
+
+        Returns:
+            list: Lista produktów
+        """
+        try:
+            with self._lock:
+                rows = self._conn.execute('SELECT data FROM products ORDER BY position').fetchall()
+            if not rows and self.json_path and os.path.exists(self.json_path):
+                count = self.import_json(self.json_path)
+                self.logger.info(f"Zaimportowano {count} produktów z {self.json_path} do bazy SQLite")
+                with self._lock:
+                    rows = self._conn.execute('SELECT data FROM products ORDER BY position').fetchall()
+
+            products = [json.loads(data) for (data,) in rows]
+            self.logger.info(f"Załadowano {len(products)} produktów z bazy SQLite {self.db_path}")
+            return products
+        except Exception as e:
+            self.logger.error(f"Błąd podczas ładowania produktów z bazy SQLite: {str(e)}")
+            return []
+
+    def feed_digest(self):
+        """
+        Zwraca skrót pliku XML, który odzwierciedla zawartość bazy (tabela meta).
+
+        Skrót jest przechowywany w samej bazie, więc przywrócona kopia bazy ma skrót
+        odpowiadający swoim danym.
+
+        Returns:
+            str: Skrót SHA-256 lub None
+        """
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM meta WHERE key = 'feed_sha256'").fetchone()
+            return row[0] if row else None
+        except Exception as e:
+            self.logger.warning(f"Nie udało się odczytać skrótu pliku XML: {str(e)}")
+            return None
+
+    def set_feed_digest(self, feed_digest):
+        """Zapamiętuje skrót pliku XML odzwierciedlonego w bieżącej zawartości bazy"""
+        try:
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('feed_sha256', ?)", (feed_digest,))
+        except Exception as e:
+            self.logger.warning(f"Nie udało się zapisać skrótu pliku XML: {str(e)}")
+
+    def load_ids(self, product_ids):
+        """
+        Ładuje wybrane produkty (tylko ich wiersze).
+
+        Args:
+            product_ids (iterable): ID produktów
+
+        Returns:
+            dict: ID produktu -> rekord (produkty, których nie ma w bazie, są pomijane)
+        """
+        product_ids = [str(product_id) for product_id in product_ids]
+        products = {}
+        with self._lock:
+            for start in range(0, len(product_ids), 500):
+                chunk = product_ids[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, data FROM products WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for product_id, data in rows:
+                    products[product_id] = json.loads(data)
+        return products
+
+    def save(self, products, changed_ids=None, deleted_ids=None):
+        """
+        Zapisuje produkty w jednej transakcji.
+
+        Args:
+            products (list): Pełna lista produktów
+            changed_ids (iterable, optional): ID zmienionych lub dodanych produktów;
+                None oznacza zapis całej listy
+            deleted_ids (iterable, optional): ID usuniętych produktów
+
+        Returns:
+            bool: True jeśli zapis się powiódł, False w przeciwnym razie
+        """
+        try:
+            with self._lock, self._conn:
+                if changed_ids is None:
+                    self._replace_all(products)
+                    self.logger.info(f"Zapisano {len(products)} produktów do bazy SQLite")
+                    return True
+
+                deleted = set(str(product_id) for product_id in (deleted_ids or ()))
+                changed = set(str(product_id) for product_id in changed_ids) - deleted
+                products_by_id = {}
+                if changed:
+                    products_by_id = {str(p.get('id')): p for p in products if str(p.get('id')) in changed}
+                # Produkt oznaczony jako zmieniony, którego już nie ma na liście, został usunięty
+                deleted |= changed - set(products_by_id)
+
+                for product_id, product in products_by_id.items():
+                    self._conn.execute(
+                        'INSERT INTO products (id, position, xml_id, category, available, data) '
+                        'VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM products), ?, ?, ?, ?) '
+                        'ON CONFLICT(id) DO UPDATE SET xml_id = excluded.xml_id, category = excluded.category, '
+                        'available = excluded.available, data = excluded.data',
+                        (product_id,) + self._row_values(product)
+                    )
+                if deleted:
+                    self._conn.executemany('DELETE FROM products WHERE id = ?', [(product_id,) for product_id in deleted])
+
+            self.logger.info(f"Zapisano {len(products_by_id)} i usunięto {len(deleted)} produktów w bazie SQLite")
+            return True
+        except Exception as e:
+            self.logger.error(f"Błąd podczas zapisywania produktów do bazy SQLite: {str(e)}")
+            self.logger.error(traceback.format_exc())
+            return False
+
+    def _replace_all(self, products):
+        self._conn.execute('DELETE FROM products')
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO products (id, position, xml_id, category, available, data) VALUES (?, ?, ?, ?, ?, ?)',
+            [(str(product.get('id')), position) + self._row_values(product)
+             for position, product in enumerate(products)]
+        )
+
+    def import_json(self, json_path=None):
+        """
+        Zastępuje zawartość bazy produktami z pliku JSON.
+
+        Returns:
+            int: Liczba zaimportowanych produktów
+        """
+        products = _read_products_file(json_path or self.json_path, SERIALIZERS['json'], with_descriptions=False)
+        with self._lock, self._conn:
+            self._replace_all(products)
+            # Zaimportowane dane nie muszą odpowiadać ostatnio wczytanemu plikowi XML
+            self._conn.execute("DELETE FROM meta WHERE key = 'feed_sha256'")
+        return len(products)
+
+    def export_json(self, json_path=None):
+        """
+        Zapisuje wszystkie produkty z bazy do pliku JSON (format data/products.json).
+
+        Returns:
+            int: Liczba wyeksportowanych produktów
+        """
+        json_path = json_path or self.json_path
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM products ORDER BY position').fetchall()
+        products = [json.loads(data) for (data,) in rows]
+
+        temp_path = f"{json_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(products, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, json_path)
+        return len(products)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_product_store(backend=None, json_path=DEFAULT_JSON_PATH, sqlite_path=DEFAULT_SQLITE_PATH, logger=None,
+                         storage_format=None):
+    """
+    Tworzy magazyn produktów.
+
+    Args:
+        backend (str, optional): 'json' lub 'sqlite'; domyślnie wartość zmiennej
+            środowiskowej PRODUCT_STORE_BACKEND, a gdy jej brak - 'json'
+        json_path (str): Ścieżka do pliku JSON
+        sqlite_path (str): Ścieżka do bazy SQLite
+        logger: Logger przekazywany do magazynu
+        storage_format (str, optional): Format pliku magazynu 'json' ('json' lub 'json-pretty');
+            domyślnie zmienna PRODUCT_STORE_FORMAT, a gdy jej brak - 'json'
+
+    Returns:
+        FileProductStore | SqliteProductStore: Magazyn produktów
+    """
+    backend = (backend or os.environ.get(BACKEND_ENV_VAR) or 'json').lower()
+    if backend == 'sqlite':
+        return SqliteProductStore(sqlite_path, json_path=json_path, logger=logger)
+    if backend != 'json':
+        raise ValueError(f"Nieznany rodzaj magazynu produktów: {backend}")
+    serializer = get_serializer(storage_format)
+    return FileProductStore(products_file_path(serializer.name, json_path), logger=logger, serializer=serializer)
+
+
+def _referenced_blobs():
+    """Zwraca skróty opisów używane przez plik produktów (i jego kopię .bak) oraz bazę SQLite"""
+    referenced = set()
+    for path in (DEFAULT_JSON_PATH, f"{DEFAULT_JSON_PATH}.bak"):
+        if os.path.exists(path):
+            referenced.update(p['description_blob'] for p in load_products(path) if p.get('description_blob'))
+    if os.path.exists(DEFAULT_SQLITE_PATH):
+        store = SqliteProductStore(DEFAULT_SQLITE_PATH, json_path=None)
+        with store._lock:
+            rows = store._conn.execute('SELECT data FROM products').fetchall()
+        store.close()
+        for (data,) in rows:
+            digest = json.loads(data).get('description_blob')
+            if digest:
+                referenced.add(digest)
+    return referenced
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in ('import', 'export', 'prune'):
+        print("Użycie: python product_store.py import|export [plik.json] [plik.db]")
+        print("        python product_store.py prune")
+        sys.exit(1)
+
+    if sys.argv[1] == 'prune':
+        print(f"Usunięto {DescriptionBlobStore().prune(_referenced_blobs)} nieużywanych plików opisów")
+        sys.exit(0)
+
+    json_file = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_JSON_PATH
+    sqlite_file = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_SQLITE_PATH
+    store = SqliteProductStore(sqlite_file, json_path=json_file)
+    if sys.argv[1] == 'import':
+        print(f"Zaimportowano {store.import_json()} produktów z {json_file} do {sqlite_file}")
+    else:
+        print(f"Wyeksportowano {store.export_json()} produktów z {sqlite_file} do {json_file}")
+    store.close()
@@ -5,9 +5,9 @@ Ustawia flagę available_for_sale na False dla wszystkich produktów lub dla wyb
 """
 
 import os
-import json
 import sys
 import logging
+from product_store import products_file_path, load_products, save_products
 
 logging.basicConfig(
     level=logging.INFO,
@@ -28,7 +28,7 @@ def reset_product_availability(category=None):
     """
     try:
         # Ścieżka do pliku bazy danych produktów
-        db_path = os.path.join('data', 'products.json')
+        db_path = products_file_path()
         
         # Sprawdź czy plik istnieje
         if not os.path.exists(db_path):
@@ -36,8 +36,7 @@ def reset_product_availability(category=None):
             return 0
         
         # Wczytaj produkty z bazy danych
-        with open(db_path, 'r', encoding='utf-8') as f:
-            products = json.load(f)
+        products = load_products(db_path)
         
         count = 0
         # Resetuj dostępność produktów
@@ -48,8 +47,7 @@ def reset_product_availability(category=None):
                     count += 1
         
         # Zapisz zmiany
-        with open(db_path, 'w', encoding='utf-8') as f:
-            json.dump(products, f, ensure_ascii=False, indent=2)
+        save_products(products, db_path)
         
         logger.info(f"Zresetowano dostępność dla {count} produktów")
         return count
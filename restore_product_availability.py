@@ -33,7 +33,7 @@ def restore_availability():
         # Count products with descriptions but not available
         unavailable_with_desc_count = 0
         for product in products:
-            if not product.get('available_for_sale', False) and product.get('description'):
+            if not product.get('available_for_sale', False) and (product.get('description') or product.get('description_blob')):
                 unavailable_with_desc_count += 1
                 
         logger.info(f"Found {unavailable_with_desc_count} products with descriptions but unavailable")
@@ -49,7 +49,7 @@ def restore_availability():
             # Restore availability for products with descriptions
             restored_count = 0
             for product in products:
-                if not product.get('available_for_sale', False) and product.get('description'):
+                if not product.get('available_for_sale', False) and (product.get('description') or product.get('description_blob')):
                     # Set product as available
                     product['available_for_sale'] = True
                     restored_count += 1
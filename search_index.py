@@ -0,0 +1,405 @@
+import re
+import math
+import html
+import heapq
+import bisect
+import threading
+import unicodedata
+
+# Litery, których NFKD nie rozkłada na literę bazową + znak diakrytyczny
+# (małe litery - tekst jest zamieniany na małe litery przed ich zastąpieniem)
+_EXTRA_FOLDS = (('ł', 'l'), ('ø', 'o'), ('ß', 'ss'), ('đ', 'd'))
+# Bloki znaków łączących (diakrytyków) - po NFKD usuwane jednym wyrażeniem zamiast znak po znaku
+_COMBINING_RE = re.compile('[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]')
+_TOKEN_RE = re.compile(r'\w+')
+_TAG_RE = re.compile(r'<[^>]+>')
+_SCRIPT_RE = re.compile(r'<(script|style)[^>]*>.*?</\1>', re.IGNORECASE | re.DOTALL)
+
+def fold_text(text):
+    """Zamienia tekst na małe litery bez polskich znaków i innych diakrytyków"""
+    if not text:
+        return ''
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    text = text.lower()
+    for letter, replacement in _EXTRA_FOLDS:
+        if letter in text:
+            text = text.replace(letter, replacement)
+    return _COMBINING_RE.sub('', unicodedata.normalize('NFKD', text))
+
+def tokenize(text):
+    """Dzieli tekst na znormalizowane tokeny (słowa)"""
+    return _TOKEN_RE.findall(fold_text(text))
+
+def html_to_text(html_content):
+    """Usuwa znaczniki HTML i zamienia encje na znaki"""
+    if not html_content:
+        return ''
+    text = _SCRIPT_RE.sub(' ', html_content)
+    text = _TAG_RE.sub(' ', text)
+    return html.unescape(text)
+
+
+class SearchIndex:
+    """
+    Indeks odwrócony do wyszukiwania pełnotekstowego produktów.
+
+    Dokumenty składają się z pól tekstowych z wagami (np. nazwa waży więcej niż opis).
+    Zapytanie jest dzielone na tokeny; każdy token musi pasować do dokumentu dokładnie
+    lub jako prefiks słowa. Wyniki są sortowane według punktacji BM25.
+    Indeks można aktualizować przyrostowo (update / remove).
+    """
+
+    # Wagi pól przy liczeniu częstości termów
+    FIELD_WEIGHTS = {
+        'name': 3.0,
+        'producer': 1.5,
+        'category': 1.5,
+        'ean': 1.0,
+        'id': 1.0,
+        'description': 0.5
+    }
+    PREFIX_MATCH_FACTOR = 0.8 # Dopasowanie prefiksu punktowane nieco niżej niż całe słowo
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._postings = {}     # term -> {doc_id: ważona częstość}
+        self._doc_terms = {}    # doc_id -> {term: ważona częstość}
+        self._doc_lengths = {}  # doc_id -> ważona długość dokumentu
+        self._doc_sources = {}  # doc_id -> pola źródłowe (do pomijania niezmienionych dokumentów)
+        self._total_length = 0.0
+        self._sorted_terms = []
+        self._terms_dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def doc_ids(self):
+        """Zwraca zbiór identyfikatorów zaindeksowanych dokumentów"""
+        with self._lock:
+            return set(self._doc_terms)
+
+    def update(self, doc_id, fields, source_key=None):
+        """
+        Dodaje lub aktualizuje dokument w indeksie.
+
+        Args:
+            doc_id (str): Identyfikator dokumentu
+            fields (dict | callable): Pola tekstowe dokumentu {nazwa_pola: tekst} lub funkcja
+                zwracająca te pola - wywoływana tylko, gdy dokument się zmienił
+            source_key (hashable, optional): Wersja dokumentu; jeśli podana, do wykrywania
+                zmian przechowywany jest tylko ten klucz, a nie treść pól
+
+        Returns:
+            bool: True jeśli indeks się zmienił, False jeśli dokument był już aktualny
+        """
+        source = fields if source_key is None else source_key
+        with self._lock:
+            if self._doc_sources.get(doc_id) == source:
+                return False
+            if callable(fields):
+                fields = fields()
+            self._remove(doc_id)
+
+            term_freqs = {}
+            for field, text in fields.items():
+                weight = self.FIELD_WEIGHTS.get(field, 1.0)
+                if field == 'description':
+                    text = html_to_text(text)
+                for token in tokenize(text):
+                    term_freqs[token] = term_freqs.get(token, 0.0) + weight
+
+            for term, freq in term_freqs.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._terms_dirty = True
+                postings[doc_id] = freq
+
+            doc_length = sum(term_freqs.values())
+            self._doc_terms[doc_id] = term_freqs
+            self._doc_lengths[doc_id] = doc_length
+            self._doc_sources[doc_id] = source
+            self._total_length += doc_length
+            return True
+
+    def remove(self, doc_id):
+        """Usuwa dokument z indeksu"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        term_freqs = self._doc_terms.pop(doc_id, None)
+        if term_freqs is None:
+            return
+        for term in term_freqs:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    self._terms_dirty = True
+        self._total_length -= self._doc_lengths.pop(doc_id, 0.0)
+        self._doc_sources.pop(doc_id, None)
+
+    def _expand_term(self, token):
+        """Zwraca termy pasujące do tokenu: [(term, mnożnik punktacji)]"""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+
+        matches = []
+        start = bisect.bisect_left(self._sorted_terms, token)
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(token):
+                break
+            matches.append((term, 1.0 if term == token else self.PREFIX_MATCH_FACTOR))
+        return matches
+
+    def search(self, query, limit=None):
+        """
+        Wyszukuje dokumenty pasujące do wszystkich tokenów zapytania.
+
+        Args:
+            query (str): Zapytanie
+            limit (int, optional): Maksymalna liczba wyników
+
+        Returns:
+            list: Lista krotek (doc_id, punktacja) posortowana malejąco według punktacji
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self._lock:
+            doc_count = len(self._doc_terms)
+            if not doc_count:
+                return []
+            avg_length = (self._total_length / doc_count) or 1.0
+
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, factor in self._expand_term(token):
+                    postings = self._postings[term]
+                    idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for doc_id, freq in postings.items():
+                        if scores is not None and doc_id not in scores:
+                            continue
+                        norm = self.K1 * (1 - self.B + self.B * self._doc_lengths[doc_id] / avg_length)
+                        score = factor * idf * freq * (self.K1 + 1) / (freq + norm)
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+
+                # Każdy token zapytania musi pasować (iloczyn logiczny)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {doc_id: scores[doc_id] + score for doc_id, score in token_scores.items()}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+
+class SuggestionIndex:
+    """
+    Indeks podpowiedzi (autouzupełniania) oparty na posortowanej liście słów.
+
+    Każde słowo nazwy produktu i jego kategorii ma listę wpisów (ranga, doc_id)
+    posortowaną według rangi. Wyniki dla prefiksu to scalenie (heapq.merge) list słów
+    zaczynających się od prefiksu - bez sortowania wszystkich pasujących wpisów.
+    Najlepsze wyniki krótkich prefiksów (najczęstszych przy wpisywaniu) są dodatkowo
+    zapamiętywane do czasu zmiany dokumentu zawierającego pasujące słowo.
+    Indeks można aktualizować przyrostowo (update / remove).
+    """
+
+    PRECOMPUTED_PREFIX_LENGTH = 3 # Prefiksy do tej długości mają zapamiętane listy najlepszych wyników
+    PRECOMPUTED_RESULTS = 50      # Ile najlepszych wyników przechowywać dla krótkiego prefiksu
+
+    def __init__(self):
+        self._postings = {}    # słowo -> posortowana lista (ranga, doc_id)
+        self._doc_entries = {} # doc_id -> lista (słowo, ranga) dokumentu (do usuwania)
+        self._doc_tokens = {}  # doc_id -> zbiór słów dokumentu (do filtrowania wielowyrazowych zapytań)
+        self._doc_sources = {} # doc_id -> (nazwa, kategorie) - do pomijania niezmienionych dokumentów
+        self._top_by_prefix = {}
+        self._sorted_terms = []
+        self._terms_dirty = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def doc_ids(self):
+        """Zwraca zbiór identyfikatorów zaindeksowanych dokumentów"""
+        with self._lock:
+            return set(self._doc_tokens)
+
+    @staticmethod
+    def _document_entries(doc_id, name, categories):
+        """Zwraca (wpisy (słowo, ranga), zbiór słów) dokumentu"""
+        name_tokens = tokenize(name)
+        category_tokens = tokenize(' '.join(categories or []))
+
+        # Ranga: najpierw dopasowania w nazwie, potem wcześniejsze słowa i krótsze nazwy
+        name_length = len(name or '')
+        entries = [(token, (0, position, name_length, doc_id))
+                   for position, token in enumerate(dict.fromkeys(name_tokens))]
+        entries.extend((token, (1, 0, name_length, doc_id))
+                       for token in dict.fromkeys(category_tokens) if token not in name_tokens)
+        return entries, frozenset(name_tokens + category_tokens)
+
+    def build(self, documents):
+        """
+        Buduje indeks od nowa.
+
+        Args:
+            documents (iterable): Krotki (doc_id, nazwa, lista kategorii)
+        """
+        postings = {}
+        doc_entries = {}
+        doc_tokens = {}
+        doc_sources = {}
+        for doc_id, name, categories in documents:
+            entries, tokens = self._document_entries(doc_id, name, categories)
+            for token, rank in entries:
+                postings.setdefault(token, []).append((rank, doc_id))
+            doc_entries[doc_id] = entries
+            doc_tokens[doc_id] = tokens
+            doc_sources[doc_id] = (name, tuple(categories or ()))
+        for entries in postings.values():
+            entries.sort()
+
+        with self._lock:
+            self._postings = postings
+            self._doc_entries = doc_entries
+            self._doc_tokens = doc_tokens
+            self._doc_sources = doc_sources
+            self._top_by_prefix = {}
+            self._terms_dirty = True
+
+    def update(self, doc_id, name, categories):
+        """
+        Dodaje lub aktualizuje dokument w indeksie.
+
+        Args:
+            doc_id (str): Identyfikator dokumentu
+            name (str): Nazwa produktu
+            categories (list): Kategorie produktu
+
+        Returns:
+            bool: True jeśli indeks się zmienił, False jeśli dokument był już aktualny
+        """
+        source = (name, tuple(categories or ()))
+        with self._lock:
+            if self._doc_sources.get(doc_id) == source:
+                return False
+            self._remove(doc_id)
+
+            entries, tokens = self._document_entries(doc_id, name, categories)
+            for token, rank in entries:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = []
+                    self._terms_dirty = True
+                bisect.insort(postings, (rank, doc_id))
+                self._forget_top(token)
+            self._doc_entries[doc_id] = entries
+            self._doc_tokens[doc_id] = tokens
+            self._doc_sources[doc_id] = source
+            return True
+
+    def remove(self, doc_id):
+        """Usuwa dokument z indeksu"""
+        with self._lock:
+            self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        entries = self._doc_entries.pop(doc_id, None)
+        if entries is None:
+            return
+        for token, rank in entries:
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            position = bisect.bisect_left(postings, (rank, doc_id))
+            if position < len(postings) and postings[position] == (rank, doc_id):
+                del postings[position]
+            if not postings:
+                del self._postings[token]
+                self._terms_dirty = True
+            self._forget_top(token)
+        self._doc_tokens.pop(doc_id, None)
+        self._doc_sources.pop(doc_id, None)
+
+    def _forget_top(self, token):
+        """Usuwa zapamiętane wyniki krótkich prefiksów słowa"""
+        for length in range(1, min(len(token), self.PRECOMPUTED_PREFIX_LENGTH) + 1):
+            self._top_by_prefix.pop(token[:length], None)
+
+    def _ranked_candidates(self, prefix):
+        """Zwraca wpisy (ranga, doc_id) słów zaczynających się od prefiksu w kolejności rangi"""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        end = bisect.bisect_left(self._sorted_terms, prefix + '\uffff', lo=start)
+        return heapq.merge(*(self._postings[term] for term in self._sorted_terms[start:end]))
+
+    @staticmethod
+    def _unique_doc_ids(ranked_candidates, limit, accept=None):
+        """Zwraca pierwsze `limit` unikalnych doc_id z posortowanych wpisów (ranga, doc_id)"""
+        seen = set()
+        result = []
+        for _, doc_id in ranked_candidates:
+            if doc_id in seen or (accept and not accept(doc_id)):
+                continue
+            seen.add(doc_id)
+            result.append(doc_id)
+            if len(result) >= limit:
+                break
+        return result
+
+    def suggest(self, query, limit=10):
+        """
+        Zwraca najlepsze dopasowania dla wpisywanego zapytania.
+
+        Ostatnie słowo zapytania jest traktowane jako prefiks, poprzednie muszą być
+        początkami słów z nazwy lub kategorii produktu.
+
+        Args:
+            query (str): Wpisywany tekst
+            limit (int): Maksymalna liczba wyników
+
+        Returns:
+            list: Lista doc_id w kolejności trafności
+        """
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return []
+        prefix, required = tokens[-1], tokens[:-1]
+
+        with self._lock:
+            accept = None
+            if required:
+                doc_tokens = self._doc_tokens
+                def accept(doc_id):
+                    words = doc_tokens.get(doc_id, ())
+                    return all(any(word.startswith(token) for word in words) for token in required)
+
+            # Krótki prefiks - zapamiętana lista najlepszych wyników
+            if len(prefix) <= self.PRECOMPUTED_PREFIX_LENGTH:
+                top = self._top_by_prefix.get(prefix)
+                if top is None:
+                    top = self._top_by_prefix[prefix] = self._unique_doc_ids(
+                        self._ranked_candidates(prefix), self.PRECOMPUTED_RESULTS)
+                result = [doc_id for doc_id in top if not accept or accept(doc_id)][:limit]
+                # Lista jest przycięta - jeśli filtr odrzucił zbyt wiele, przeszukaj wszystkie wpisy
+                if len(result) >= limit or len(top) < self.PRECOMPUTED_RESULTS:
+                    return result
+
+            return self._unique_doc_ids(self._ranked_candidates(prefix), limit, accept)
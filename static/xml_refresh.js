@@ -0,0 +1,53 @@
+// Zadania w tle panelu administracyjnego (odświeżanie XML, aktualizacja cen z narzutem)
+// runAdminJob uruchamia zadanie (POST) i czeka na jego zakończenie: postęp przychodzi
+// zdarzeniem Socket.IO (tylko do zalogowanych administratorów), a niezależnie od tego
+// co 2 sekundy odpytywany jest status zadania.
+// Zwraca Promise ze stanem zakończonego zadania (success, message i pola zadania).
+function runAdminJob(startUrl, progressEvent, onProgress) {
+    return fetch(startUrl, { method: 'POST' })
+        .then(response => response.json())
+        .then(start => {
+            if (!start.success) {
+                return start;
+            }
+
+            return new Promise(resolve => {
+                let finished = false;
+                let pollTimer = null;
+                let progressSocket = null;
+
+                function handleJob(job) {
+                    if (finished || !job || job.job_id !== start.job_id) return;
+                    if (onProgress) onProgress(job);
+                    if (job.status === 'done' || job.status === 'error') {
+                        finished = true;
+                        clearInterval(pollTimer);
+                        if (progressSocket) progressSocket.off(progressEvent, handleJob);
+                        resolve(Object.assign({}, job, { success: job.status === 'done' }));
+                    }
+                }
+
+                if (typeof io !== 'undefined') {
+                    progressSocket = (typeof socket !== 'undefined' && socket) ? socket : io();
+                    progressSocket.on(progressEvent, handleJob);
+                }
+
+                pollTimer = setInterval(() => {
+                    fetch(start.status_url)
+                        .then(response => response.json())
+                        .then(handleJob)
+                        .catch(error => console.log('Błąd pobierania stanu zadania:', error));
+                }, 2000);
+            });
+        });
+}
+
+// Odświeżanie produktów z XML w tle (/admin/refresh-xml)
+function refreshXml(onProgress) {
+    return runAdminJob('/admin/refresh-xml', 'xml_refresh_progress', onProgress);
+}
+
+// Aktualizacja cen wszystkich produktów wg narzutu i cen z XML w tle (/admin/update-prices-with-markup)
+function updatePricesWithMarkup(onProgress) {
+    return runAdminJob('/admin/update-prices-with-markup', 'price_update_progress', onProgress);
+}
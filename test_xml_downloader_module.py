@@ -0,0 +1,133 @@
+"""
+Testy pobierania pliku XML (XMLDownloaderModule.download_xml_file) z lokalnym serwerem http.server:
+odpowiedź 200, odpowiedź 304 Not Modified oraz przerwane pobieranie.
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xml_downloader_module import XMLDownloaderModule
+from xml_offer_index import index_path_for
+
+FEED_V1 = (b'<?xml version="1.0" encoding="utf-8"?>\n<offers>\n'
+           b'<offer><id>1</id><name>Produkt 1</name><price>10.00</price></offer>\n'
+           b'<offer><id>2</id><name>Produkt 2</name><price>20.00</price></offer>\n'
+           b'</offers>\n')
+FEED_V2 = FEED_V1.replace(b'20.00', b'25.00')
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serwuje plik XML zgodnie z ustawieniami serwera (server.feed, server.etag, server.mode)"""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+
+        if server.mode == 'interrupted':
+            # Nagłówek zapowiada cały plik, ale połączenie zostaje zamknięte w połowie treści
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(server.feed)))
+            self.send_header('ETag', '"interrupted"')
+            self.end_headers()
+            self.wfile.write(server.feed[:len(server.feed) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.send_header('ETag', server.etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(server.feed)))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(server.feed)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def feed_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FeedHandler)
+    server.feed = FEED_V1
+    server.etag = '"v1"'
+    server.mode = 'normal'
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch, feed_server):
+    monkeypatch.setattr(XMLDownloaderModule, 'CONFIG_FILE', str(tmp_path / 'xml_config.json'))
+    monkeypatch.setattr(XMLDownloaderModule, 'DEFAULT_XML_PATH', str(tmp_path / 'products_latest.xml'))
+    module = XMLDownloaderModule()
+    module.config['url'] = f'http://127.0.0.1:{feed_server.server_address[1]}/products.xml'
+    return module
+
+
+def _temp_files(directory):
+    return [name for name in os.listdir(directory) if name.endswith('.part')]
+
+
+def test_download_200_saves_file_and_etag(downloader, feed_server, tmp_path):
+    assert downloader.download_xml_file() is True
+
+    with open(downloader.DEFAULT_XML_PATH, 'rb') as f:
+        assert f.read() == FEED_V1
+    assert downloader.config['etag'] == '"v1"'
+    assert os.path.exists(index_path_for(downloader.DEFAULT_XML_PATH))
+    # Zapisano też kopię archiwalną
+    assert [name for name in os.listdir(tmp_path) if name.startswith('products_2')]
+    assert _temp_files(tmp_path) == []
+    # Pierwsze pobranie nie jest warunkowe
+    assert 'If-None-Match' not in feed_server.requests[0]
+
+
+def test_download_304_keeps_file(downloader, feed_server, tmp_path):
+    assert downloader.download_xml_file() is True
+    stat_before = os.stat(downloader.DEFAULT_XML_PATH)
+
+    assert downloader.download_xml_file() is True
+
+    assert feed_server.requests[-1].get('If-None-Match') == '"v1"'
+    stat_after = os.stat(downloader.DEFAULT_XML_PATH)
+    assert (stat_after.st_ino, stat_after.st_mtime_ns) == (stat_before.st_ino, stat_before.st_mtime_ns)
+    with open(downloader.DEFAULT_XML_PATH, 'rb') as f:
+        assert f.read() == FEED_V1
+    assert _temp_files(tmp_path) == []
+
+
+def test_interrupted_download_keeps_previous_file(downloader, feed_server, tmp_path):
+    assert downloader.download_xml_file() is True
+
+    feed_server.feed = FEED_V2
+    feed_server.etag = '"v2"'
+    feed_server.mode = 'interrupted'
+    assert downloader.download_xml_file() is False
+
+    # Poprzednia wersja pliku i jej ETag zostają, a plik tymczasowy jest usuwany
+    with open(downloader.DEFAULT_XML_PATH, 'rb') as f:
+        assert f.read() == FEED_V1
+    assert downloader.config['etag'] == '"v1"'
+    assert _temp_files(tmp_path) == []
+
+    # Kolejne pełne pobranie zastępuje plik nową wersją
+    feed_server.mode = 'normal'
+    assert downloader.download_xml_file() is True
+    with open(downloader.DEFAULT_XML_PATH, 'rb') as f:
+        assert f.read() == FEED_V2
+    assert downloader.config['etag'] == '"v2"'
@@ -0,0 +1,111 @@
+import threading
+from collections import OrderedDict
+
+
+class XmlCatalog:
+    """
+    Zbuforowany katalog ofert z pliku XML dostawcy.
+
+    Plik jest parsowany raz dla danej wersji (version), a oferty trafiają do listy
+    krótkich rekordów (dane wyświetlane na liście wyników) z indeksem xml_id -> rekord.
+    Pełne dane oferty (opis, wszystkie zdjęcia) nie są przechowywane - czyta się je
+    przez indeks ofert (ProductManager.get_product_from_xml).
+
+    Kolumny pól zapisane małymi literami są budowane dopiero przy pierwszym wyszukiwaniu
+    w danym polu. Pola spoza rekordów (np. opis) są przeszukiwane przez funkcję
+    przekazaną w external_fields, która czyta je z pliku. Wyniki ostatnich zapytań są
+    przechowywane, więc przechodzenie między stronami wyników nie powtarza wyszukiwania.
+    """
+
+    SEARCH_FIELDS = ('name', 'id', 'category', 'ean', 'producer')
+    FIELD_ALIASES = {'EAN': 'ean'}
+    RESULT_CACHE_SIZE = 32
+
+    def __init__(self, records, version=None, external_fields=None):
+        """
+        Args:
+            records (iterable): Słowniki ofert (klucze jak w wynikach search_xml_products)
+            version: Znacznik wersji pliku XML, z którego zbudowano katalog
+            external_fields (dict, optional): Pole -> funkcja zwracająca pary (xml_id, tekst)
+                dla pól, których nie ma w rekordach (np. 'description')
+        """
+        self.version = version
+        self.records = []
+        self._by_id = {}
+        for record in records:
+            self._by_id.setdefault(str(record['id']), record)
+            self.records.append(record)
+
+        self._external_fields = dict(external_fields or {})
+        self._columns = {}
+        self._results_cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, xml_id):
+        """Zwraca ofertę o podanym ID lub None"""
+        return self._by_id.get(str(xml_id))
+
+    def _column(self, field):
+        """Zwraca kolumnę pola zapisaną małymi literami (budowaną przy pierwszym użyciu)"""
+        column = self._columns.get(field)
+        if column is not None:
+            return column
+        with self._columns_lock:
+            column = self._columns.get(field)
+            if column is None:
+                if field == 'any':
+                    # Kolumna 'any' - pola rozdzielone znakiem, który nie wystąpi w zapytaniu
+                    column = ['\x00'.join(str(record.get(name) or '') for name in self.SEARCH_FIELDS).lower()
+                              for record in self.records]
+                else:
+                    column = [str(record.get(field) or '').lower() for record in self.records]
+                self._columns[field] = column
+        return column
+
+    def search(self, query='', field='any'):
+        """
+        Wyszukuje oferty, których pole zawiera zapytanie (bez rozróżniania wielkości liter).
+
+        Args:
+            query (str): Zapytanie wyszukiwania
+            field (str): Pole do wyszukiwania ('any', jedno z SEARCH_FIELDS lub pole z external_fields);
+                'any' obejmuje pola SEARCH_FIELDS
+
+        Returns:
+            list: Lista pasujących ofert (współdzielona z pamięcią podręczną - nie modyfikować)
+        """
+        if not query:
+            return self.records
+
+        field = self.FIELD_ALIASES.get(field, field)
+        key = (query.lower(), field)
+        with self._lock:
+            results = self._results_cache.get(key)
+            if results is not None:
+                self._results_cache.move_to_end(key)
+                return results
+
+        query_lower = key[0]
+        if field == 'any' or field in self.SEARCH_FIELDS:
+            records = self.records
+            results = [records[i] for i, value in enumerate(self._column(field)) if query_lower in value]
+        elif field in self._external_fields:
+            results = []
+            seen = set()
+            for xml_id, text in self._external_fields[field]():
+                record = self._by_id.get(str(xml_id))
+                if record is not None and id(record) not in seen and query_lower in str(text or '').lower():
+                    seen.add(id(record))
+                    results.append(record)
+        else:
+            results = []
+
+        with self._lock:
+            self._results_cache[key] = results
+            while len(self._results_cache) > self.RESULT_CACHE_SIZE:
+                self._results_cache.popitem(last=False)
+        return results
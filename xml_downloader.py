@@ -1,9 +1,9 @@
-import requests
-import os
 import time
 import schedule
 import logging
 from datetime import datetime
+from product_manager import ProductManager
+from xml_downloader_module import XMLDownloaderModule
 
 # Konfiguracja logowania
 logging.basicConfig(
@@ -15,63 +15,53 @@ logging.basicConfig(
 
 logger = logging.getLogger('xml_downloader')
 
-def download_xml():
-    """Pobiera plik XML z produktami i zapisuje go na dysku"""
-    url = "https://ergo.enode.ovh/products.xml"
-    xml_dir = "data"
-    
-    # Upewnij się, że katalog istnieje
-    if not os.path.exists(xml_dir):
-        os.makedirs(xml_dir)
-        logger.info(f"Utworzono katalog {xml_dir}")
+product_manager = None # Tworzony przy pierwszym pobraniu
+downloader = XMLDownloaderModule() # Adres pliku i nagłówki ETag / Last-Modified z data/xml_config.json
+
+def parse_downloaded_xml(xml_path):
+    """
+    Parsuje pobrany plik XML i zapisuje zmiany w magazynie produktów.
     
-    # Nazwa pliku z aktualną datą i godziną
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = os.path.join(xml_dir, f"products_{timestamp}.xml")
+    Procesy aplikacji nie parsują pliku XML - wczytują tylko zapisane tutaj zmiany
+    (ProductManager.sync_external_changes).
+    """
+    global product_manager
+    if product_manager is None:
+        product_manager = ProductManager()
+    else:
+        product_manager.sync_external_changes()
     
-    # Nazwa pliku dla najnowszej wersji
-    latest_filename = os.path.join(xml_dir, "products_latest.xml")
+    # Pod blokadą międzyprocesową - odświeżanie z panelu nie parsuje równocześnie
+    with product_manager.catalog_version.feed_lock():
+        parsed = product_manager.parse_xml(xml_path)
+    if parsed and product_manager.flush():
+        logger.info(f"Sparsowano i zapisano plik XML: {xml_path}")
+    else:
+        logger.error(f"Błąd podczas parsowania pliku XML: {xml_path}")
+
+def download_xml():
+    """
+    Pobiera plik XML z produktami (XMLDownloaderModule.download_xml_file) i parsuje go.
     
+    Pobieranie jest warunkowe (ETag / If-Modified-Since), treść trafia na dysk przez plik
+    tymczasowy, a niezmieniony plik nie jest zapisywany ani archiwizowany. Parsowanie
+    pomija plik, którego skrót jest już zapisany w magazynie produktów.
+    """
     try:
-        # Pobieranie pliku
-        response = requests.get(url)
-        response.raise_for_status()  # Sprawdza, czy nie ma błędu HTTP
-        
-        # Zapisywanie pliku z timestampem
-        with open(filename, 'wb') as f:
-            f.write(response.content)
+        # Konfiguracja mogła zostać zmieniona w panelu administracyjnym
+        downloader.config = downloader.load_config()
+        if not downloader.download_xml_file():
+            logger.error("Błąd podczas pobierania pliku XML")
+            print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Błąd pobierania pliku XML")
+            return
         
-        # Zapisywanie pliku jako najnowszej wersji
-        with open(latest_filename, 'wb') as f:
-            f.write(response.content)
-            
-        logger.info(f"Pomyślnie pobrano i zapisano plik XML: {filename}")
+        # Sparsuj plik i zapisz zmiany - procesy aplikacji wczytają je z magazynu
+        parse_downloaded_xml(downloader.DEFAULT_XML_PATH)
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Pobrano plik XML")
-        
-        # Czyszczenie starych plików (pozostaw 24 ostatnie pliki - 4 godziny)
-        cleanup_old_files(xml_dir)
-        
     except Exception as e:
         logger.error(f"Błąd podczas pobierania pliku XML: {str(e)}")
         print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Błąd: {str(e)}")
 
-def cleanup_old_files(directory, keep_last=24):
-    """Usuwa stare pliki XML, zachowując określoną liczbę najnowszych"""
-    try:
-        # Pobierz wszystkie pliki XML z katalogu
-        files = [os.path.join(directory, f) for f in os.listdir(directory) 
-                if f.startswith("products_") and f.endswith(".xml") and not f == "products_latest.xml"]
-        
-        # Sortuj według daty modyfikacji
-        files.sort(key=lambda x: os.path.getmtime(x))
-        
-        # Usuń stare pliki
-        for old_file in files[:-keep_last]:
-            os.remove(old_file)
-            logger.info(f"Usunięto stary plik: {old_file}")
-    except Exception as e:
-        logger.error(f"Błąd podczas czyszczenia starych plików: {str(e)}")
-
 def main():
     # Pobierz XML od razu przy starcie
     download_xml()
@@ -1,22 +1,30 @@
 import json
 import os
+import hashlib
+import shutil
+import tempfile
 import logging
 from datetime import datetime
 import schedule
 import threading
 import time
 import requests
+from xml_offer_index import build_offer_index
 
 logger = logging.getLogger('xml_downloader_module')
 
 class XMLDownloaderModule:
     CONFIG_FILE = os.path.join('data', 'xml_config.json')
     DEFAULT_XML_PATH = os.path.join('data', 'products_latest.xml')
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
     
     def __init__(self):
         self.config = self.load_config()
         self.scheduler_thread = None
         self.stop_scheduler_event = threading.Event()
+        # Scheduled task - download only by default; the app sets it to a full refresh
+        # (download + parse, XmlRefreshJobs) so the downloading process also parses the feed
+        self.refresh_task = None
 
     def load_config(self):
         try:
@@ -67,21 +75,66 @@ class XMLDownloaderModule:
         
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         archive_filename = os.path.join(xml_dir, f"products_{timestamp}.xml")
+        temp_path = None
+        
+        # Conditional request - an unchanged feed comes back as 304 Not Modified
+        headers = {}
+        if os.path.exists(self.DEFAULT_XML_PATH):
+            if self.config.get('etag'):
+                headers['If-None-Match'] = self.config['etag']
+            if self.config.get('last_modified_header'):
+                headers['If-Modified-Since'] = self.config['last_modified_header']
         
         try:
             logger.info(f"Attempting to download XML from {url}")
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+                if response.status_code == 304:
+                    logger.info("XML not modified on server (304), skipping download.")
+                    self.config['last_download'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    self.save_config()
+                    return True
+                response.raise_for_status()
+                
+                # Stream the body to a temp file in chunks, hashing it on the way
+                fd, temp_path = tempfile.mkstemp(prefix='.products_download_', suffix='.part', dir=xml_dir)
+                content_hash = hashlib.sha256()
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            content_hash.update(chunk)
+                content_sha256 = content_hash.hexdigest()
+                
+                self.config['etag'] = response.headers.get('ETag')
+                self.config['last_modified_header'] = response.headers.get('Last-Modified')
             
-            with open(archive_filename, 'wb') as f:
-                f.write(response.content)
-            logger.info(f"XML downloaded and saved to {archive_filename}")
-
-            with open(self.DEFAULT_XML_PATH, 'wb') as f:
-                f.write(response.content)
+            self.config['last_download'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Identyczny plik jak obecny - nie zapisujemy archiwum ani nowej wersji.
+            # Porównujemy z samym plikiem (skrót wczytanego pliku przechowuje tylko magazyn produktów).
+            self.config.pop('last_sha256', None)
+            if self._same_content(self.DEFAULT_XML_PATH, temp_path, content_sha256):
+                logger.info(f"XML content unchanged (sha256 {content_sha256[:12]}), skipping save.")
+                self.save_config()
+                return True
+            
+            # Atomic swap of the latest file, then archive it as a hard link (copy as fallback)
+            os.replace(temp_path, self.DEFAULT_XML_PATH)
+            temp_path = None
             logger.info(f"XML saved as latest to {self.DEFAULT_XML_PATH}")
             
-            self.config['last_download'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            # Sidecar offer index (xml_id -> byte offset) used for single-offer lookups
+            try:
+                build_offer_index(self.DEFAULT_XML_PATH)
+            except Exception as e:
+                logger.error(f"Error building XML offer index: {e}")
+            
+            try:
+                os.link(self.DEFAULT_XML_PATH, archive_filename)
+            except OSError:
+                shutil.copyfile(self.DEFAULT_XML_PATH, archive_filename)
+            logger.info(f"XML archived to {archive_filename}")
+            
             self.save_config()
             self.cleanup_old_files(xml_dir)
             return True
@@ -89,8 +142,25 @@ class XMLDownloaderModule:
             logger.error(f"Error downloading XML: {e}")
         except Exception as e:
             logger.error(f"An unexpected error occurred during XML download: {e}")
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
         return False
 
+    @staticmethod
+    def _same_content(path, new_path, new_sha256):
+        """Checks whether the file at path has the same content as the freshly downloaded file"""
+        try:
+            if os.path.getsize(path) != os.path.getsize(new_path):
+                return False
+            content_hash = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    content_hash.update(chunk)
+            return content_hash.hexdigest() == new_sha256
+        except OSError:
+            return False
+
     def cleanup_old_files(self, directory, keep_last=24):
         try:
             files = [os.path.join(directory, f) for f in os.listdir(directory) 
@@ -105,16 +175,17 @@ class XMLDownloaderModule:
 
     def _scheduler_loop(self):
         interval = self.config.get('interval_minutes', 10)
+        task = self.refresh_task or self.download_xml_file
         logger.info(f"Scheduler started. Interval: {interval} minutes.")
         
         # Initial download if configured
         if self.config.get('download_on_start', True):
              logger.info("Performing initial XML download on start.")
-             self.download_xml_file()
+             task()
 
         # Clear any existing jobs before scheduling a new one
         schedule.clear()
-        schedule.every(interval).minutes.do(self.download_xml_file)
+        schedule.every(interval).minutes.do(task)
 
         while not self.stop_scheduler_event.is_set():
             schedule.run_pending()
@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import mmap
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger('xml_offer_index')
+
+INDEX_SUFFIX = '.idx'
+INDEX_FORMAT_VERSION = 1
+
+_OFFER_START_RE = re.compile(rb'<offer[\s>]')
+_OFFER_END = b'</offer>'
+_ID_RE = re.compile(rb'<id>\s*([^<]*?)\s*</id>')
+_ENCODING_RE = re.compile(rb'<\?xml[^>]*encoding=["\']([A-Za-z0-9._-]+)["\']')
+
+def index_path_for(xml_path):
+    """Zwraca ścieżkę pliku indeksu dla podanego pliku XML"""
+    return xml_path + INDEX_SUFFIX
+
+def _file_version(xml_path):
+    stat = os.stat(xml_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def scan_offers(xml_path):
+    """
+    Skanuje plik XML (bez parsowania drzewa) i wyznacza położenie każdej oferty.
+
+    Args:
+        xml_path (str): Ścieżka do pliku XML
+
+    Returns:
+        tuple: (kodowanie pliku, słownik xml_id -> (offset, długość) w bajtach)
+    """
+    offers = {}
+    with open(xml_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 'utf-8', offers
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            match = _ENCODING_RE.match(data[:200])
+            encoding = match.group(1).decode('ascii').lower() if match else 'utf-8'
+
+            position = 0
+            while True:
+                start_match = _OFFER_START_RE.search(data, position)
+                if not start_match:
+                    break
+                start = start_match.start()
+                end = data.find(_OFFER_END, start)
+                if end == -1:
+                    break
+                end += len(_OFFER_END)
+                position = end
+
+                chunk = data[start:end]
+                id_match = _ID_RE.search(chunk)
+                if id_match and b'&' not in id_match.group(1):
+                    xml_id = id_match.group(1).decode(encoding)
+                else:
+                    # Nietypowy zapis ID (CDATA, encje) - sparsuj ofertę, żeby go odczytać
+                    try:
+                        xml_id = (ET.fromstring(chunk.decode(encoding)).findtext('id') or '').strip()
+                    except ET.ParseError:
+                        continue
+                if xml_id:
+                    offers.setdefault(xml_id, (start, end - start))
+    return encoding, offers
+
+def build_offer_index(xml_path):
+    """
+    Buduje indeks ofert dla pliku XML i zapisuje go obok pliku (xml_path + '.idx').
+
+    Indeks przechowuje rozmiar i czas modyfikacji pliku XML, z którego powstał,
+    dzięki czemu nieaktualny indeks jest rozpoznawany przy wczytywaniu.
+
+    Args:
+        xml_path (str): Ścieżka do pliku XML
+
+    Returns:
+        OfferIndex: Zbudowany indeks
+    """
+    size, mtime_ns = _file_version(xml_path)
+    encoding, offers = scan_offers(xml_path)
+
+    index_path = index_path_for(xml_path)
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': INDEX_FORMAT_VERSION,
+            'size': size,
+            'mtime_ns': mtime_ns,
+            'encoding': encoding,
+            'offers': offers
+        }, f, separators=(',', ':'))
+    os.replace(temp_path, index_path)
+
+    logger.info(f"Zbudowano indeks ofert {index_path}: {len(offers)} ofert")
+    return OfferIndex(xml_path, (size, mtime_ns), encoding, offers)
+
+def load_offer_index(xml_path, rebuild=True):
+    """
+    Wczytuje indeks ofert dla pliku XML.
+
+    Args:
+        xml_path (str): Ścieżka do pliku XML
+        rebuild (bool): Czy zbudować indeks, gdy go brak lub jest nieaktualny
+
+    Returns:
+        OfferIndex: Indeks lub None, jeśli jest nieaktualny, a rebuild=False
+    """
+    version = _file_version(xml_path)
+    try:
+        with open(index_path_for(xml_path), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if (data.get('format') == INDEX_FORMAT_VERSION
+                and (data.get('size'), data.get('mtime_ns')) == version):
+            return OfferIndex(xml_path, version, data.get('encoding', 'utf-8'), data.get('offers', {}))
+        logger.info(f"Indeks ofert dla {xml_path} jest nieaktualny")
+    except (OSError, ValueError) as e:
+        logger.info(f"Brak poprawnego indeksu ofert dla {xml_path}: {e}")
+
+    return build_offer_index(xml_path) if rebuild else None
+
+
+class OfferIndex:
+    """
+    Indeks ofert pliku XML: xml_id -> (offset, długość) w bajtach.
+
+    Pojedyncza oferta jest odczytywana z pliku zmapowanego w pamięci (mmap)
+    i parsowana osobno, bez parsowania całego dokumentu.
+    """
+
+    def __init__(self, xml_path, version, encoding, offers):
+        self.xml_path = xml_path
+        self.version = version # (rozmiar, mtime_ns) pliku XML
+        self.encoding = encoding
+        self._offers = offers
+        self._file = None
+        self._mmap = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._offers)
+
+    def __contains__(self, xml_id):
+        return str(xml_id) in self._offers
+
+    def is_current(self):
+        """Sprawdza, czy plik XML nie zmienił się od zbudowania indeksu"""
+        try:
+            return _file_version(self.xml_path) == self.version
+        except OSError:
+            return False
+
+    def read_offer(self, xml_id):
+        """
+        Odczytuje i parsuje pojedynczą ofertę.
+
+        Args:
+            xml_id (str): ID oferty
+
+        Returns:
+            xml.etree.ElementTree.Element: Element <offer> lub None, jeśli oferty nie ma w indeksie
+        """
+        location = self._offers.get(str(xml_id))
+        if location is None:
+            return None
+        offset, length = location
+
+        with self._lock:
+            if self._mmap is None:
+                self._file = open(self.xml_path, 'rb')
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            chunk = self._mmap[offset:offset + length]
+        return ET.fromstring(chunk.decode(self.encoding))
+
+    def close(self):
+        """Zwalnia mapowanie pliku"""
+        with self._lock:
+            if self._mmap is not None:
+                self._mmap.close()
+                self._file.close()
+                self._mmap = None
+                self._file = None
@@ -0,0 +1,71 @@
+from background_jobs import BackgroundJobs
+from xml_offer_index import load_offer_index
+
+
+class XmlRefreshJobs(BackgroundJobs):
+    """
+    Odświeżanie produktów z XML (pobranie pliku i parsowanie) jako zadanie w tle.
+
+    Postęp jest rozsyłany zdarzeniem 'xml_refresh_progress'. Pobieranie i parsowanie odbywa
+    się pod międzyprocesową blokadą pliku XML, więc zadania uruchomione w różnych workerach
+    wykonują się po kolei, a nie równocześnie.
+    """
+
+    EVENT = 'xml_refresh_progress'
+    NAME = 'odświeżanie XML'
+    JOB_FIELDS = {'products_count': None, 'delta': None}
+
+    def __init__(self, xml_downloader, product_manager, emit=None):
+        """
+        Args:
+            xml_downloader: Moduł pobierania XML (XMLDownloaderModule)
+            product_manager (ProductManager): Menedżer produktów
+            emit (callable, optional): Funkcja emit(zdarzenie, dane) - np. wysyłająca do pokoju administratorów
+        """
+        super().__init__(emit)
+        self.xml_downloader = xml_downloader
+        self.product_manager = product_manager
+
+    def _execute(self, job_id):
+        self._update(job_id, status='running', stage='waiting', progress=0,
+                     message='Oczekiwanie na zakończenie odświeżania XML w innym procesie...')
+        # Pod blokadą międzyprocesową - inne workery nie pobierają ani nie parsują pliku równocześnie
+        with self.product_manager.catalog_version.feed_lock():
+            self._refresh(job_id)
+
+    def _refresh(self, job_id):
+        self._update(job_id, stage='download', progress=5, message='Pobieranie pliku XML...')
+        if not self.xml_downloader.download_xml_file():
+            self._finish(job_id, 'error', 'Wystąpił błąd podczas pobierania XML')
+            return
+
+        xml_path = self.xml_downloader.DEFAULT_XML_PATH
+        try:
+            offer_index = load_offer_index(xml_path, rebuild=False)
+            total_offers = len(offer_index) if offer_index is not None else None
+        except OSError:
+            total_offers = None
+
+        self._update(job_id, stage='parse', progress=30, message='Przetwarzanie pliku XML...')
+
+        def report_parse_progress(processed):
+            if total_offers:
+                percent = 30 + int(60 * min(processed, total_offers) / total_offers)
+                message = f"Przetworzono {processed} z {total_offers} ofert"
+            else:
+                percent = 30
+                message = f"Przetworzono {processed} ofert"
+            self._update(job_id, progress=percent, message=message)
+
+        # Katalog mógł zmienić się w innym procesie, gdy zadanie czekało na blokadę
+        self.product_manager.sync_external_changes()
+        parsed = self.product_manager.parse_xml(xml_path, progress=report_parse_progress)
+        # Zapisz zmiany od razu (także w trybach 'request' i 'delayed') - inne workery wczytają je z magazynu
+        if not parsed or not self.product_manager.flush():
+            self._finish(job_id, 'error', 'Plik XML został pobrany, ale wystąpił błąd podczas parsowania lub zapisu')
+            return
+
+        delta = self.product_manager.last_xml_delta or {}
+        self._finish(job_id, 'done', 'Plik XML został pobrany i sparsowany pomyślnie',
+                     products_count=len(self.product_manager.get_all_products()),
+                     delta={key: len(value) for key, value in delta.items()})